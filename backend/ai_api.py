@@ -3,7 +3,6 @@ AI API Server - שרת פשוט לתובנות AI
 """
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-import json
 from datetime import datetime, timedelta
 import sys
 import os
@@ -40,8 +39,9 @@ def init_ai_system():
             print("❌ חיבור למסד נתונים נכשל")
             return False
             
-        # אתחול AI
+        # אתחול AI - מהגרסה השמורה של המודל, ולמידה רק מעסקאות חדשות
         ai = SmartCategorizer(db)
+        ai.warm_start()
         
         print("✅ מערכת AI אותחלה בהצלחה")
         return True
@@ -180,22 +180,52 @@ def retrain_ai():
             
         print("🚀 מתחיל אימון מחדש...")
         
-        # כאן נוסיף את הלוגיקה האמיתית של אימון מחדש
-        # לעכשיו רק סימולציה
-        import time
-        time.sleep(2)  # סימולציה של עיבוד
-        
-        updated_count = 23  # דמה
+        # מצטבר מאז הלמידה הקודמת, או מאפס עם {"full": true}
+        full = bool((request.get_json(silent=True) or {}).get('full'))
+        result = ai.bulk_retrain_all(full=full)
         
         return jsonify({
             'success': True, 
-            'message': f'אימון הושלם! עודכנו {updated_count} עסקאות'
+            'message': f"אימון הושלם! נלמדו {result['transactions_processed']} עסקאות",
+            **result
         })
         
     except Exception as e:
         print(f"שגיאה באימון מחדש: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/model-versions', methods=['GET'])
+def get_model_versions():
+    """גרסאות המודל השמורות"""
+    try:
+        if not ai:
+            return jsonify({'error': 'AI לא מאותחל'}), 500
+            
+        return jsonify(ai.model_store.versions())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/model-rollback', methods=['POST'])
+def rollback_model():
+    """חזרה לגרסה קודמת של המודל"""
+    try:
+        if not ai:
+            return jsonify({'error': 'AI לא מאותחל'}), 500
+            
+        # הגרסה הקודמת לפעילה, או {"version": n}
+        version = (request.get_json(silent=True) or {}).get('version')
+        entry = ai.rollback_model(version)
+        if entry is None:
+            return jsonify({'error': 'אין גרסה תקינה לחזרה'}), 404
+            
+        print(f"⏪ המודל חזר לגרסה {entry['version']}")
+        return jsonify({'success': True, 'message': f"המודל חזר לגרסה {entry['version']}", **entry})
+        
+    except Exception as e:
+        print(f"❌ שגיאה בחזרה לגרסה קודמת: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """בדיקת תקינות השרת"""
@@ -214,20 +244,17 @@ def get_training_data():
             
         print("📊 שולף נתוני אימון מהמסד נתונים...")
         
-        # שליפת כל העסקים עם פרטים מלאים
-        result = db.supabase.table('transactions').select('''
+        # שליפת כל העסקים עם פרטים מלאים - בעמודים
+        transactions = db.iter_rows('transactions', '''
             description,
             categories (id, name, color),
             chargedamount
-        ''').execute()
-        
-        if not result.data:
-            return jsonify([])
+        ''')
             
         # קיבוץ לפי עסק
         business_stats = {}
         
-        for transaction in result.data:
+        for transaction in transactions:
             business_name = transaction['description']
             if not business_name:
                 continue
@@ -284,11 +311,11 @@ def approve_business_training():
         }).eq('description', description).execute()
         
         updated_count = len(result.data) if result.data else 0
+        if updated_count:
+            db.stats_cache.invalidate()
         
-        # עדכון רשימת העסקים המוכרים
-        if hasattr(db, 'known_businesses_cache'):
-            normalized_name = db.normalize_business_name(description)
-            db.known_businesses_cache[normalized_name] = category_id
+        # עדכון רשימת העסקים המוכרים - במסד ובמטמון
+        db.set_known_business(description, category_id)
         
         return jsonify({
             'success': True, 
@@ -350,6 +377,8 @@ if __name__ == '__main__':
         print("  POST /api/reject-suggestion")
         print("  POST /api/approve-business")
         print("  POST /api/retrain")
+        print("  GET  /api/model-versions")
+        print("  POST /api/model-rollback")
         print("  GET  /health")
         
         app.run(debug=True, port=5000)
@@ -0,0 +1,131 @@
+"""
+bulk_writer.py
+כתיבה מרוכזת ל-Supabase - חלוקה לחלקים, מקביליות מוגבלת וניסיונות חוזרים לכל חלק
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Optional, Tuple
+
+# שגיאות חיבור שבהן הבקשה לא הגיעה לשרת - רק בהן מותר לנסות שוב insert רגיל
+# (לפי שם המחלקה, בלי לייבא את httpx)
+NOT_SENT_ERRORS = ('ConnectError', 'ConnectTimeout')
+# שגיאות תעבורה - הבקשה אולי הגיעה לשרת; מותר לנסות שוב רק upsert שמתעלם מכפולים
+TRANSPORT_ERRORS = NOT_SENT_ERRORS + ('ReadTimeout', 'WriteTimeout', 'PoolTimeout', 'TimeoutException',
+                                      'ReadError', 'WriteError', 'RemoteProtocolError', 'NetworkError')
+# אין אילוץ UNIQUE שמתאים ל-on_conflict (42P10) או שהעמודה עצמה חסרה (42703, PGRST204)
+MISSING_CONFLICT_TARGET = ('42P10', '42703', 'PGRST204')
+
+class BulkWriter:
+    """הכנסת שורות בחלקים לפי כמות ונפח - חלק שנכשל לא מפיל את שאר הקובץ"""
+
+    def __init__(self, supabase, table: str, chunk_size: int = 500, max_bytes: int = 2_000_000,
+                 workers: int = 2, max_retries: int = 3, backoff_seconds: float = 0.5,
+                 on_conflict: Optional[str] = None):
+        self.supabase = supabase
+        self.table = table
+        # עמודת מפתח ייחודי - הכתיבה היא upsert שמתעלם מכפולים, וכל ניסיון חוזר בטוח
+        self.on_conflict = on_conflict
+        self.chunk_size = max(1, chunk_size)
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        # המיגרציה של עמודת on_conflict לא הורצה - אין טעם לשלוח עוד חלקים
+        self.conflict_target_missing = False
+
+    def insert(self, rows: List[Dict]) -> Dict:
+        """הכנסת כל השורות - מחזיר כמה נשמרו, כמה דולגו (כבר היו במסד), כמה נכשלו, בכמה חלקים,
+        ואת השורות שנשמרו (כפי שהשרת החזיר) ושנכשלו
+        retried_chunks - חלקים שנשלחו שוב; שורות שדולגו בהם אולי נשמרו בניסיון הראשון"""
+        chunks = list(self.chunks(rows))
+        result = {'saved': 0, 'skipped': 0, 'failed': 0, 'chunks': len(chunks), 'failed_chunks': 0,
+                  'retried_chunks': 0, 'saved_rows': [], 'failed_rows': []}
+
+        if len(chunks) == 1 or self.workers == 1:
+            saved_chunks = [self._insert_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(chunks))) as executor:
+                saved_chunks = list(executor.map(self._insert_chunk, chunks))
+
+        for chunk, (saved, retried) in zip(chunks, saved_chunks):
+            result['retried_chunks'] += retried
+            if saved is None:
+                result['failed'] += len(chunk)
+                result['failed_chunks'] += 1
+                result['failed_rows'].extend(chunk)
+            else:
+                result['saved'] += len(saved)
+                result['skipped'] += len(chunk) - len(saved)
+                result['saved_rows'].extend(saved)
+
+        return result
+
+    def chunks(self, rows: List[Dict]) -> Iterator[List[Dict]]:
+        """חלוקה לחלקים - עד chunk_size שורות ועד max_bytes של JSON בכל חלק"""
+        chunk = []
+        chunk_bytes = 0
+
+        for row in rows:
+            row_bytes = len(json.dumps(row, ensure_ascii=False, default=str).encode('utf-8'))
+
+            if chunk and (len(chunk) >= self.chunk_size or chunk_bytes + row_bytes > self.max_bytes):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+
+            chunk.append(row)
+            chunk_bytes += row_bytes
+
+        if chunk:
+            yield chunk
+
+    def _insert_chunk(self, chunk: List[Dict]) -> Tuple[Optional[List[Dict]], bool]:
+        """חלק אחד עם ניסיונות חוזרים בהמתנה גדלה (0.5, 1, 2 שניות...) - (השורות שנכתבו או None אם נכשל, האם נשלח שוב)
+        insert רגיל נשלח שוב רק אם ידוע שלא הגיע לשרת - אחרת timeout אחרי commit היה מכפיל את החלק"""
+        if self.conflict_target_missing:
+            return None, False
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.on_conflict:
+                    # התשובה (returning=representation) מכילה רק שורות שנוספו - כפולים שכבר במסד לא נספרים
+                    response = self.supabase.table(self.table).upsert(chunk, on_conflict=self.on_conflict,
+                                                                      ignore_duplicates=True).execute()
+                else:
+                    response = self.supabase.table(self.table).insert(chunk).execute()
+                return response.data or [], attempt > 0
+
+            except Exception as e:
+                if self.on_conflict and _error_code(e) in MISSING_CONFLICT_TARGET:
+                    if not self.conflict_target_missing:
+                        self.conflict_target_missing = True
+                        print(f"   ❌ אין אילוץ UNIQUE על {self.table}.{self.on_conflict} - "
+                              f"הרץ את המיגרציה שמוסיפה את {self.on_conflict} (ראה README): {e}")
+                    return None, attempt > 0
+
+                if attempt == self.max_retries or not self._retry_safe(e):
+                    print(f"   ❌ חלק של {len(chunk)} שורות נכשל אחרי {attempt + 1} ניסיונות: {e}")
+                    return None, attempt > 0
+
+                delay = self.backoff_seconds * (2 ** attempt)
+                print(f"   ⚠️ שגיאה בשמירת חלק ({e}) - ניסיון נוסף בעוד {delay:.1f} שניות")
+                time.sleep(delay)
+
+        return None, self.max_retries > 0
+
+    def _retry_safe(self, error: Exception) -> bool:
+        """שגיאה זמנית שמותר לשלוח בגללה שוב - שגיאות 4xx (נתונים, הרשאות, סכמה) לא ישתנו בניסיון נוסף"""
+        if type(error).__name__ in NOT_SENT_ERRORS:
+            return True
+        if not self.on_conflict:
+            return False
+        if type(error).__name__ in TRANSPORT_ERRORS or isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        code = _error_code(error)
+        return len(code) == 3 and code.startswith('5')
+
+
+def _error_code(error: Exception) -> str:
+    """קוד השגיאה של postgrest (קוד Postgres, או סטטוס HTTP כשהתשובה לא הייתה JSON)"""
+    return str(getattr(error, 'code', None) or '')
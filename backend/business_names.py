@@ -0,0 +1,58 @@
+"""
+business_names.py
+נרמול שמות עסקים - תבניות מקומפלות, מטמון LRU וגרסה עמודתית ל-pandas
+"""
+import re
+from functools import lru_cache
+import pandas as pd
+
+UNKNOWN_BUSINESS = "unknown"
+
+# מספר השמות השמורים במטמון הנרמול
+NORMALIZE_CACHE_SIZE = 8192
+
+# הסרת מספרי כרטיס ותאריכים
+CARD_NUMBER_PATTERN = re.compile(r'\d{4}[-\s]*\d{4}[-\s]*\d{4}[-\s]*\d{4}')
+SHORT_DATE_PATTERN = re.compile(r'\d{2}[/\-]\d{2}')
+# הסרת סימנים מיוחדים
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def normalize_business_name(name) -> str:
+    """נרמול שם עסק לזיהוי"""
+    if isinstance(name, str):
+        return _normalize_text(name) if name else UNKNOWN_BUSINESS
+
+    if not name or pd.isna(name):
+        return UNKNOWN_BUSINESS
+    return _normalize_text(str(name))
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_text(name: str) -> str:
+    """נרמול מחרוזת - נשמר במטמון לפי השם המקורי"""
+    normalized = name.lower().strip()
+    normalized = CARD_NUMBER_PATTERN.sub('', normalized)
+    normalized = SHORT_DATE_PATTERN.sub('', normalized)
+    normalized = SPECIAL_CHARS_PATTERN.sub(' ', normalized)
+    normalized = WHITESPACE_PATTERN.sub(' ', normalized).strip()
+
+    return normalized or UNKNOWN_BUSINESS
+
+def normalize_business_names(names: pd.Series) -> pd.Series:
+    """נרמול עמודה שלמה בפעולות .str - אותה תוצאה כמו normalize_business_name לכל ערך"""
+    # fillna לפני ההשוואה - astype(bool) נכשל על pd.NA בעמודת 'string'; eq(0) כמו `not name` על מספרים
+    filled = names.fillna('')
+    missing = (filled.eq('') | filled.eq(0)).to_numpy(dtype=bool)
+
+    # object מבטיח re של Python (\w עם אותיות עבריות) בכל backend של מחרוזות
+    normalized = names.astype(str).astype(object).str.lower().str.strip()
+    normalized = normalized.str.replace(CARD_NUMBER_PATTERN, '', regex=True)
+    normalized = normalized.str.replace(SHORT_DATE_PATTERN, '', regex=True)
+    normalized = normalized.str.replace(SPECIAL_CHARS_PATTERN, ' ', regex=True)
+    normalized = normalized.str.replace(WHITESPACE_PATTERN, ' ', regex=True).str.strip()
+
+    return normalized.where(~missing & (normalized != ''), UNKNOWN_BUSINESS)
+
+def normalize_cache_info():
+    """סטטיסטיקות מטמון הנרמול (hits/misses/currsize)"""
+    return _normalize_text.cache_info()
@@ -0,0 +1,88 @@
+"""
+category_rules.py
+כללי קטגוריזציה לפי מילות מפתח - ביטוי רגולרי מאוחד אחד לכל הכללים
+"""
+import re
+from typing import List, Tuple, Optional, Iterable
+
+# (מילות מפתח, קטגוריה, ביטחון) - לפי סדר עדיפות
+DEFAULT_CATEGORY_RULES = [
+    (['רמי לוי', 'סופר', 'שופרסל', 'מגה', 'ויקטורי', 'טיב טעם', 'אושר עד'], 'מזון ומשקאות', 0.90),
+    (['דלק', 'פז', 'סונול', 'דור אלון', 'חניה', 'פארק'], 'תחבורה', 0.90),
+    (['מקדונלד', 'בורגר', 'פיצה', 'קפה', 'מסעדה', 'רולדין', 'גרג'], 'מזון ומשקאות', 0.85),
+    (['פארם', 'מרקח', 'רופא', 'מכבי', 'כללית', 'לאומית', 'מנורה'], 'בריאות', 0.90),
+    (['חשמל', 'בזק', 'פרטנר', 'סלקום', 'הוט', 'yes'], 'שירותים', 0.90),
+    (['קולנוע', 'ספורט', 'כושר', 'חדר כושר'], 'בילוי ותרבות', 0.85),
+    (['זארה', 'קסטרו', 'אלקטרה', 'כי.אס.פי'], 'קניות', 0.80),
+    (['פנגו', 'מוביט', 'תחבורה'], 'תחבורה', 0.85),
+    (['apple', 'אפל', 'גוגל', 'microsoft', 'cursor', 'openai', 'claude'], 'קניות', 0.80),
+    (['paybox'], 'שונות', 0.70),
+    (['ליברה', 'ביטוח', 'כלל רכב', 'כלל דירה'], 'ביטוח ופיננסים', 0.85),
+    (['העברה', 'bit'], 'שונות', 0.60),
+    (['דמי כרטיס', 'מזרחי'], 'ביטוח ופיננסים', 0.80),
+]
+
+# קטגוריה כשאף כלל לא מתאים
+FALLBACK_CATEGORY = ('שונות', 0.30)
+
+class CategoryRuleMatcher:
+    """כל הכללים מקומפלים לביטוי אחד - מעבר יחיד על השם מחזיר את הכלל בעדיפות הגבוהה"""
+
+    def __init__(self, rules: Iterable[Tuple[List[str], str, float]] = DEFAULT_CATEGORY_RULES):
+        self.rules = []
+        self._pattern = None
+        self.set_rules(rules)
+
+    def set_rules(self, rules: Iterable[Tuple[List[str], str, float]]) -> bool:
+        """החלפת הכללים - קומפילציה מחדש רק אם הכללים השתנו"""
+        rules = [(tuple(keyword.lower() for keyword in keywords), category, float(confidence))
+                 for keywords, category, confidence in rules]
+        if rules == self.rules and self._pattern is not None:
+            return False
+
+        self.rules = rules
+        self._pattern = self._compile(rules)
+        return True
+
+    @staticmethod
+    def _compile(rules: List[Tuple[Tuple[str, ...], str, float]]) -> Optional[re.Pattern]:
+        """lookahead בכל מיקום, קבוצה לכל כלל לפי סדר העדיפות - בכל מיקום מנצח הכלל הראשון שמתאים"""
+        alternatives = [
+            f"(?P<rule{index}>{'|'.join(re.escape(keyword) for keyword in keywords if keyword)})"
+            for index, (keywords, _, _) in enumerate(rules) if any(keywords)
+        ]
+        if not alternatives:
+            return None
+        return re.compile(f"(?=(?:{'|'.join(alternatives)}))")
+
+    def match(self, business_name: str) -> Tuple[str, float]:
+        """(קטגוריה, ביטחון) של הכלל בעדיפות הגבוהה ביותר שמתאים לשם"""
+        if self._pattern is None:
+            return FALLBACK_CATEGORY
+
+        best = None
+        for found in self._pattern.finditer(business_name.lower()):
+            index = int(found.lastgroup[4:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+
+        if best is None:
+            return FALLBACK_CATEGORY
+
+        _, category, confidence = self.rules[best]
+        return category, confidence
+
+
+def load_category_rules(custom_rules: Optional[List[dict]] = None) -> List[Tuple[List[str], str, float]]:
+    """כללים מ-config.json לפני הכללים המובנים - כלל של המשתמש קודם לכלל מובנה"""
+    rules = []
+
+    for rule in custom_rules or []:
+        try:
+            rules.append((list(rule['keywords']), rule['category'], float(rule.get('confidence', 0.80))))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"   ⚠️ כלל קטגוריה לא תקין ב-config: {rule} ({e})")
+
+    return rules + DEFAULT_CATEGORY_RULES
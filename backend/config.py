@@ -40,14 +40,60 @@ WEB_HOST = _config.get('web', {}).get('host', 'localhost')
 AI_CONFIDENCE_THRESHOLD = _config.get('ai', {}).get('confidence_threshold', 0.6)
 AI_SIMILARITY_THRESHOLD = _config.get('ai', {}).get('similarity_threshold', 0.8)
 AI_MAX_SUGGESTIONS = _config.get('ai', {}).get('max_suggestions', 20)
+# מנוע ההצעות: keywords (מילות מפתח) או naive_bayes (n-grams של תווים + סכום)
+AI_ENGINE = _config.get('ai', {}).get('engine', 'keywords')
+# גרסאות שמורות של המודל המאומן (תת-תיקייה לכל מנוע) - טעינה מהירה בהפעלה, וכמה גרסאות לשמור לחזרה אחורה
+AI_MODEL_FOLDER = _config.get('ai', {}).get('model_folder', str(Path(__file__).parent.parent / ".cache" / "models"))
+AI_MODEL_KEEP_VERSIONS = _config.get('ai', {}).get('model_keep_versions', 5)
+# תיקוני משתמש נאספים לגרסה אחת - שמירה לכל היותר פעם בכמה שניות (וביציאה)
+AI_MODEL_SAVE_SECONDS = _config.get('ai', {}).get('model_save_seconds', 60)
 
 # 📊 הגדרות עסקאות
 DEFAULT_CURRENCY = _config.get('app', {}).get('default_currency', 'ILS')
 PAGINATION_SIZE = _config.get('app', {}).get('pagination_size', 50)
+# זמן תוקף הסטטיסטיקות במטמון לפני טעינה מחדש מהשרת
+STATS_TTL_SECONDS = _config.get('app', {}).get('stats_ttl_seconds', 300)
+# קריאת טבלאות שלמות בעמודים (keyset) - גודל עמוד ושליפה מוקדמת של העמוד הבא
+FETCH_PAGE_SIZE = _config.get('app', {}).get('fetch_page_size', 1000)
+FETCH_PREFETCH = _config.get('app', {}).get('fetch_prefetch', False)
+
+# 📥 הגדרות קליטת קבצים
+INGEST_STREAMING = _config.get('ingest', {}).get('streaming', False)
+INGEST_BATCH_SIZE = _config.get('ingest', {}).get('batch_size', 500)
+INGEST_WORKERS = _config.get('ingest', {}).get('workers', 1)
+INGEST_STORE_RAW_DATA = _config.get('ingest', {}).get('store_raw_data', True)
+BUSINESS_FLUSH_SIZE = _config.get('ingest', {}).get('business_flush_size', 200)
+BUSINESS_FLUSH_SECONDS = _config.get('ingest', {}).get('business_flush_seconds', 5.0)
+INSERT_CHUNK_SIZE = _config.get('ingest', {}).get('insert_chunk_size', 500)
+INSERT_MAX_BYTES = _config.get('ingest', {}).get('insert_max_bytes', 2_000_000)
+INSERT_WORKERS = _config.get('ingest', {}).get('insert_workers', 2)
+INSERT_RETRIES = _config.get('ingest', {}).get('insert_retries', 3)
+INSERT_BACKOFF_SECONDS = _config.get('ingest', {}).get('insert_backoff_seconds', 0.5)
+
+# ⚡ מטמון דפי חיוב מפורסרים
+PARSE_CACHE_ENABLED = _config.get('cache', {}).get('enabled', True)
+PARSE_CACHE_FOLDER = _config.get('cache', {}).get('folder', str(Path(__file__).parent.parent / ".cache" / "parsed"))
+PARSE_CACHE_MAX_MB = _config.get('cache', {}).get('max_size_mb', 200)
+# hashes של קבצים שכבר עובדו - ריק מבטל את השמירה המקומית
+PROCESSED_HASHES_FILE = _config.get('cache', {}).get('processed_hashes_file', str(Path(__file__).parent.parent / ".cache" / "processed_hashes.txt"))
+# עסקאות מחלקים שנכשלו בשמירה - נשלחות שוב בריצה הבאה; ריק מבטל
+FAILED_ROWS_FILE = _config.get('cache', {}).get('failed_rows_file', str(Path(__file__).parent.parent / ".cache" / "failed_rows.jsonl"))
+# snapshot של קטגוריות ועסקים מוכרים לעלייה מהירה - ריק מבטל
+REFERENCE_SNAPSHOT_FILE = _config.get('cache', {}).get('reference_snapshot_file', str(Path(__file__).parent.parent / ".cache" / "reference_cache.json"))
+
+# 💾 עותק מקומי (SQLite) - off / mirror (קריאות מקומיות, כתיבות לשרת) / offline (ללא Supabase)
+LOCAL_STORE_MODE = _config.get('local_store', {}).get('mode', 'off')
+LOCAL_STORE_PATH = _config.get('local_store', {}).get('path', str(Path(__file__).parent.parent / ".cache" / "local_store.db"))
+LOCAL_STORE_SYNC_PAGE_SIZE = _config.get('local_store', {}).get('sync_page_size', 1000)
+# במצב mirror - סנכרון מצטבר לפני קריאה אם עבר זמן זה מהסנכרון הקודם (0 - רק בהתחברות)
+LOCAL_STORE_SYNC_SECONDS = _config.get('local_store', {}).get('sync_seconds', 60)
 
 # 🎨 הגדרות עיצוב
 CATEGORY_COLORS = _config.get('categories', {}).get('colors', {})
 
+# 🏷️ כללי קטגוריזציה נוספים - [{"keywords": [...], "category": "...", "confidence": 0.9}]
+CATEGORY_RULES = _config.get('categories', {}).get('rules', [])
+
 # 🔧 פונקציות עזר
 def get_supabase_config():
     """קבלת הגדרות Supabase"""
@@ -62,7 +108,11 @@ def get_ai_config():
     return {
         'confidence_threshold': AI_CONFIDENCE_THRESHOLD,
         'similarity_threshold': AI_SIMILARITY_THRESHOLD,
-        'max_suggestions': AI_MAX_SUGGESTIONS
+        'max_suggestions': AI_MAX_SUGGESTIONS,
+        'engine': AI_ENGINE,
+        'model_folder': AI_MODEL_FOLDER,
+        'model_keep_versions': AI_MODEL_KEEP_VERSIONS,
+        'model_save_seconds': AI_MODEL_SAVE_SECONDS
     }
 
 def get_web_config():
@@ -73,6 +123,42 @@ def get_web_config():
         'pagination_size': PAGINATION_SIZE
     }
 
+def get_ingest_config():
+    """קבלת הגדרות קליטת קבצים"""
+    return {
+        'streaming': INGEST_STREAMING,
+        'batch_size': INGEST_BATCH_SIZE,
+        'workers': INGEST_WORKERS,
+        'store_raw_data': INGEST_STORE_RAW_DATA,
+        'business_flush_size': BUSINESS_FLUSH_SIZE,
+        'business_flush_seconds': BUSINESS_FLUSH_SECONDS,
+        'insert_chunk_size': INSERT_CHUNK_SIZE,
+        'insert_max_bytes': INSERT_MAX_BYTES,
+        'insert_workers': INSERT_WORKERS,
+        'insert_retries': INSERT_RETRIES,
+        'insert_backoff_seconds': INSERT_BACKOFF_SECONDS
+    }
+
+def get_cache_config():
+    """קבלת הגדרות מטמון"""
+    return {
+        'enabled': PARSE_CACHE_ENABLED,
+        'folder': PARSE_CACHE_FOLDER,
+        'max_size_mb': PARSE_CACHE_MAX_MB,
+        'processed_hashes_file': PROCESSED_HASHES_FILE,
+        'failed_rows_file': FAILED_ROWS_FILE,
+        'reference_snapshot_file': REFERENCE_SNAPSHOT_FILE
+    }
+
+def get_local_store_config():
+    """קבלת הגדרות העותק המקומי"""
+    return {
+        'mode': LOCAL_STORE_MODE,
+        'path': LOCAL_STORE_PATH,
+        'sync_page_size': LOCAL_STORE_SYNC_PAGE_SIZE,
+        'sync_seconds': LOCAL_STORE_SYNC_SECONDS
+    }
+
 def validate_config():
     """בדיקת תקינות הגדרות"""
     errors = []
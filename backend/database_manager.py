@@ -3,19 +3,94 @@ database_manager.py
 מנהל מסד נתונים, קטגוריזציה וכל הפעולות הקשורות לSupabase
 גרסה מלאה ומעודכנת עם AI
 """
-import re
-import hashlib
+import io
 import json
+import os
+import mmap
+import hashlib
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union, Iterable, Set
+from pathlib import Path
 from supabase import create_client
-import pandas as pd
+import numpy as np
+from transaction_model import TransactionBatch, clean_raw_record
+from business_names import normalize_business_name
+from category_rules import CategoryRuleMatcher, load_category_rules
+from bulk_writer import BulkWriter
+from stats_cache import StatsCache
+from local_store import LocalStore, MirrorClient
+from paged_reader import iter_table_rows
+from reference_cache import ReferenceCache
+from config import CATEGORY_RULES, BUSINESS_FLUSH_SIZE, BUSINESS_FLUSH_SECONDS
+from config import INSERT_CHUNK_SIZE, INSERT_MAX_BYTES, INSERT_WORKERS, INSERT_RETRIES, INSERT_BACKOFF_SECONDS
+from config import PROCESSED_HASHES_FILE, FAILED_ROWS_FILE, STATS_TTL_SECONDS, FETCH_PAGE_SIZE, FETCH_PREFETCH, REFERENCE_SNAPSHOT_FILE
+from config import LOCAL_STORE_MODE, LOCAL_STORE_PATH, LOCAL_STORE_SYNC_PAGE_SIZE, LOCAL_STORE_SYNC_SECONDS
+
+# מספר ה-hashes בכל שאילתת in_ (אורך ה-URL)
+HASH_LOOKUP_CHUNK = 100
 
 class FinancialDatabase:
-    def __init__(self, supabase_url: str, supabase_key: str):
-        self.supabase = create_client(supabase_url, supabase_key)
-        self.categories_cache = {}
-        self.known_businesses_cache = {}
+    def __init__(self, supabase_url: str, supabase_key: str, store_raw_data: bool = True,
+                 local_store_mode: str = LOCAL_STORE_MODE):
+        # עותק מקומי: offline - SQLite במקום Supabase, mirror - קריאות מהעותק וכתיבות לשרת
+        self.local_store_mode = local_store_mode
+        self.local_store = LocalStore(LOCAL_STORE_PATH) if local_store_mode in ('mirror', 'offline') else None
+        if local_store_mode == 'offline':
+            self.supabase = self.local_store
+        elif local_store_mode == 'mirror':
+            self.supabase = MirrorClient(create_client(supabase_url, supabase_key), self.local_store,
+                                         LOCAL_STORE_SYNC_PAGE_SIZE, LOCAL_STORE_SYNC_SECONDS)
+        else:
+            self.supabase = create_client(supabase_url, supabase_key)
+        # קטגוריות ועסקים מוכרים - snapshot בדיסק ורענון delta (categories_cache / known_businesses_cache)
+        self.reference_cache = ReferenceCache(
+            self.supabase, REFERENCE_SNAPSHOT_FILE, FETCH_PAGE_SIZE, FETCH_PREFETCH,
+            source=LOCAL_STORE_PATH if local_store_mode == 'offline' else supabase_url
+        )
+        # שמירת השורה המקורית מהקובץ בעמודת raw_data
+        self.store_raw_data = store_raw_data
+        # מונים לקטגוריזציה באצוות - שורות שנחסכו בזכות שמות חוזרים
+        self.categorization_stats = {'rows': 0, 'hits': 0, 'misses': 0}
+        # כללי קטגוריזציה מקומפלים פעם אחת (config.json + מובנים)
+        self.category_rules = CategoryRuleMatcher(load_category_rules(CATEGORY_RULES))
+        # עסקים חדשים שממתינים לכתיבה מרוכזת ל-known_businesses
+        self.pending_businesses = {}
+        # טיימר שכותב את המאגר BUSINESS_FLUSH_SECONDS אחרי העסק הראשון, גם אם לא נוסף עסק אחר
+        self._flush_timer = None
+        self._business_lock = threading.RLock()
+        self.business_flush_stats = {'flushes': 0, 'rows': 0, 'last_batch_size': 0,
+                                     'last_latency_ms': 0.0, 'total_latency_ms': 0.0}
+        # הכנסת עסקאות בחלקים עם ניסיונות חוזרים - upsert לפי import_key, כך שניסיון חוזר לא מכפיל
+        self.transactions_writer = BulkWriter(self.supabase, 'transactions', INSERT_CHUNK_SIZE, INSERT_MAX_BYTES,
+                                              INSERT_WORKERS, INSERT_RETRIES, INSERT_BACKOFF_SECONDS,
+                                              on_conflict='import_key')
+        # עסקאות מחלקים שנכשלו - נשלחות שוב בריצה הבאה
+        self.failed_rows_file = Path(FAILED_ROWS_FILE) if FAILED_ROWS_FILE else None
+        # hashes של קבצים שכבר עובדו - נשמרים מקומית בין ריצות
+        self.processed_hashes_file = Path(PROCESSED_HASHES_FILE) if PROCESSED_HASHES_FILE else None
+        self.known_file_hashes = self._load_known_hashes()
+        # סטטיסטיקות מהשרת, מתעדכנות מקומית בכל הכנסה
+        self.stats_cache = StatsCache(self.supabase, STATS_TTL_SECONDS)
+        
+    @property
+    def categories_cache(self) -> Dict[str, int]:
+        """שם קטגוריה -> id"""
+        return self.reference_cache.category_ids
+    
+    @categories_cache.setter
+    def categories_cache(self, categories: Dict[str, int]):
+        self.reference_cache.replace_categories(categories)
+    
+    @property
+    def known_businesses_cache(self) -> Dict[str, int]:
+        """שם עסק מנורמל -> id קטגוריה"""
+        return self.reference_cache.businesses
+    
+    @known_businesses_cache.setter
+    def known_businesses_cache(self, businesses: Dict[str, int]):
+        self.reference_cache.replace_businesses(businesses)
         
     def test_connection(self) -> bool:
         """בדיקת חיבור למסד נתונים"""
@@ -23,6 +98,7 @@ class FinancialDatabase:
             response = self.supabase.table('categories').select('id').limit(1).execute()
             print("✅ חיבור למסד הנתונים מוצלח")
             
+            self.sync_local_store()
             self._ensure_basic_categories()
             self._load_caches()
             
@@ -31,6 +107,15 @@ class FinancialDatabase:
             print(f"❌ שגיאה בחיבור: {e}")
             return False
     
+    def sync_local_store(self, full: bool = False) -> Dict[str, int]:
+        """סנכרון מצטבר של העותק המקומי - full טוען הכל מחדש (למשל אחרי מחיקות בשרת)"""
+        if self.local_store_mode != 'mirror':
+            return {}
+
+        if full:
+            self.local_store.reset_sync()
+        return self.supabase.sync(LOCAL_STORE_SYNC_PAGE_SIZE)
+    
     def _ensure_basic_categories(self):
         """יצירת קטגוריות בסיסיות אם לא קיימות"""
         try:
@@ -53,49 +138,74 @@ class FinancialDatabase:
                 ]
                 
                 self.supabase.table('categories').insert(categories).execute()
+                self.stats_cache.record_categories(len(categories))
                 print(f"   ✅ נוצרו {len(categories)} קטגוריות")
                 
         except Exception as e:
             print(f"   ⚠️ שגיאה ביצירת קטגוריות: {e}")
     
     def _load_caches(self):
-        """טעינת קטגוריות ועסקים מוכרים לזיכרון"""
+        """טעינת קטגוריות ועסקים מוכרים לזיכרון - מה-snapshot ורק השינויים מהשרת"""
         try:
-            # טעינת קטגוריות
-            response = self.supabase.table('categories').select('id, name').execute()
-            self.categories_cache = {cat['name']: cat['id'] for cat in response.data}
+            warm = self.reference_cache.load()
+            if warm:
+                print("   💾 מטמון נטען מ-snapshot ורוענן מהשרת")
             print(f"   📋 נטענו {len(self.categories_cache)} קטגוריות")
-            
-            # טעינת עסקים מוכרים
-            response = self.supabase.table('known_businesses').select('normalized_name, category_id').execute()
-            self.known_businesses_cache = {
-                business['normalized_name']: business['category_id'] 
-                for business in response.data
-            }
             print(f"   🏪 נטענו {len(self.known_businesses_cache)} עסקים מוכרים")
             
         except Exception as e:
             print(f"   ⚠️ שגיאה בטעינת מטמון: {e}")
     
+    def iter_rows(self, table: str, columns: str = '*', key: Union[str, Tuple[str, ...]] = 'id', filters=(),
+                  after=None) -> Iterable[Dict]:
+        """כל שורות הטבלה בעמודים לפי המפתח (אחרי after) - generator, בלי קיטוע בתקרת השורות של השרת"""
+        return iter_table_rows(self.supabase, table, columns, key, FETCH_PAGE_SIZE, FETCH_PREFETCH, filters, after)
+    
     def normalize_business_name(self, name: str) -> str:
         """נרמול שם עסק לזיהוי"""
-        if not name or pd.isna(name):
-            return "unknown"
-        
-        normalized = str(name).lower().strip()
-        # הסרת מספרי כרטיס ותאריכים
-        normalized = re.sub(r'\d{4}[-\s]*\d{4}[-\s]*\d{4}[-\s]*\d{4}', '', normalized)
-        normalized = re.sub(r'\d{2}[/\-]\d{2}', '', normalized)
-        # הסרת סימנים מיוחדים
-        normalized = re.sub(r'[^\w\s]', ' ', normalized)
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
-        
-        return normalized or "unknown"
+        return normalize_business_name(name)
     
     def categorize_business(self, business_name: str) -> Tuple[Optional[int], bool, float]:
         """קטגוריזציה חכמה של עסק"""
-        normalized = self.normalize_business_name(business_name)
+        return self._categorize_normalized(business_name, self.normalize_business_name(business_name))
+    
+    def categorize_businesses(self, business_names: Iterable[str]) -> List[Tuple[str, Optional[int], bool, float]]:
+        """קטגוריזציה של אצווה - כל שם ייחודי מנורמל ומסווג פעם אחת
         
+        מחזיר (שם מנורמל, קטגוריה, עסק מוכר, ביטחון) לכל שורה לפי הסדר
+        """
+        results = []
+        seen = {}
+        hits = 0
+        
+        for business_name in business_names:
+            cached = seen.get(business_name)
+            if cached is not None:
+                hits += 1
+                results.append(cached)
+                continue
+            
+            normalized = self.normalize_business_name(business_name)
+            category_id, is_known, confidence = self._categorize_normalized(business_name, normalized)
+            results.append((normalized, category_id, is_known, confidence))
+            
+            # הופעות נוספות מקבלות את מה שקריאה חוזרת הייתה מחזירה - העסק כבר נשמר כמוכר
+            if normalized in self.known_businesses_cache:
+                seen[business_name] = (normalized, self.known_businesses_cache[normalized], True, 0.95)
+            else:
+                seen[business_name] = results[-1]
+        
+        self.categorization_stats['rows'] += len(results)
+        self.categorization_stats['hits'] += hits
+        self.categorization_stats['misses'] += len(results) - hits
+        
+        if results:
+            print(f"   🏷️ קטגוריזציה: {len(results) - hits} שמות ייחודיים ל-{len(results)} עסקאות ({hits} מהמטמון)")
+        
+        return results
+    
+    def _categorize_normalized(self, business_name: str, normalized: str) -> Tuple[Optional[int], bool, float]:
+        """קטגוריזציה של עסק שהשם שלו כבר נורמל"""
         # בדיקה בעסקים מוכרים
         if normalized in self.known_businesses_cache:
             return self.known_businesses_cache[normalized], True, 0.95
@@ -115,104 +225,298 @@ class FinancialDatabase:
     
     def _auto_categorize(self, business_name: str) -> Tuple[str, float]:
         """קטגוריזציה אוטומטית לפי כללים"""
-        business_lower = business_name.lower()
-        
-        rules = [
-            (['רמי לוי', 'סופר', 'שופרסל', 'מגה', 'ויקטורי', 'טיב טעם', 'אושר עד'], 'מזון ומשקאות', 0.90),
-            (['דלק', 'פז', 'סונול', 'דור אלון', 'חניה', 'פארק'], 'תחבורה', 0.90),
-            (['מקדונלד', 'בורגר', 'פיצה', 'קפה', 'מסעדה', 'רולדין', 'גרג'], 'מזון ומשקאות', 0.85),
-            (['פארם', 'מרקח', 'רופא', 'מכבי', 'כללית', 'לאומית', 'מנורה'], 'בריאות', 0.90),
-            (['חשמל', 'בזק', 'פרטנר', 'סלקום', 'הוט', 'yes'], 'שירותים', 0.90),
-            (['קולנוע', 'ספורט', 'כושר', 'חדר כושר'], 'בילוי ותרבות', 0.85),
-            (['זארה', 'קסטרו', 'אלקטרה', 'כי.אס.פי'], 'קניות', 0.80),
-            (['פנגו', 'מוביט', 'תחבורה'], 'תחבורה', 0.85),
-            (['apple', 'אפל', 'גוגל', 'microsoft', 'cursor', 'openai', 'claude'], 'קניות', 0.80),
-            (['paybox'], 'שונות', 0.70),
-            (['ליברה', 'ביטוח', 'כלל רכב', 'כלל דירה'], 'ביטוח ופיננסים', 0.85),
-            (['העברה', 'bit'], 'שונות', 0.60),
-            (['דמי כרטיס', 'מזרחי'], 'ביטוח ופיננסים', 0.80),
-        ]
-        
-        for keywords, category, confidence in rules:
-            if any(keyword in business_lower for keyword in keywords):
-                return category, confidence
-        
-        return 'שונות', 0.30
+        return self.category_rules.match(business_name)
     
     def _save_new_business(self, original_name: str, normalized_name: str, category_id: int):
-        """שמירת עסק חדש למסד הנתונים"""
+        """רישום עסק חדש - נכנס למטמון מיד ונכתב למסד בכתיבה מרוכזת"""
+        with self._business_lock:
+            self.reference_cache.set_business(normalized_name, category_id)
+            
+            if normalized_name not in self.pending_businesses:
+                self.pending_businesses[normalized_name] = {
+                    'business_name': original_name,
+                    'normalized_name': normalized_name,
+                    'category_id': category_id,
+                    'auto_category': True
+                }
+            
+            # כתיבה כשהמאגר מתמלא, או בטיימר כשעבר מספיק זמן מהעסק הראשון שממתין
+            if len(self.pending_businesses) >= BUSINESS_FLUSH_SIZE:
+                self.flush_new_businesses()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(BUSINESS_FLUSH_SECONDS, self.flush_new_businesses)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def flush_new_businesses(self) -> int:
+        """כתיבת כל העסקים הממתינים ב-upsert אחד - עסק קיים לא נדרס"""
+        with self._business_lock:
+            return self._flush_pending_businesses()
+    
+    def _flush_pending_businesses(self) -> int:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        
+        if not self.pending_businesses:
+            return 0
+        
+        rows = list(self.pending_businesses.values())
+        start_time = time.monotonic()
+        
+        try:
+            self.supabase.table('known_businesses').upsert(
+                rows, on_conflict='normalized_name', ignore_duplicates=True
+            ).execute()
+        except Exception as e:
+            # העסקים נשארים במאגר - העסק הבא שנוסף מפעיל טיימר חדש
+            print(f"   ⚠️ שגיאה בשמירת עסקים חדשים: {e}")
+            return 0
+        
+        latency_ms = (time.monotonic() - start_time) * 1000
+        self.pending_businesses = {}
+        
+        stats = self.business_flush_stats
+        stats['flushes'] += 1
+        stats['rows'] += len(rows)
+        stats['last_batch_size'] = len(rows)
+        stats['last_latency_ms'] = latency_ms
+        stats['total_latency_ms'] += latency_ms
+        
+        print(f"   🏪 נשמרו {len(rows)} עסקים חדשים ({latency_ms:.0f}ms)")
+        self.reference_cache.save_snapshot()
+        return len(rows)
+    
+    def set_known_business(self, business_name: str, category_id: int) -> bool:
+        """קביעת קטגוריה לעסק מוכר (אישור משתמש) - במסד ובמטמון"""
+        normalized_name = self.normalize_business_name(business_name)
+        
         try:
-            business_data = {
-                'business_name': original_name,
+            self.supabase.table('known_businesses').upsert({
+                'business_name': business_name,
                 'normalized_name': normalized_name,
                 'category_id': category_id,
-                'auto_category': True
-            }
-            
-            self.supabase.table('known_businesses').insert(business_data).execute()
-            self.known_businesses_cache[normalized_name] = category_id
-            
-        except Exception:
-            pass  # אם כבר קיים, זה בסדר
+                'auto_category': False
+            }, on_conflict='normalized_name').execute()
+        except Exception as e:
+            print(f"   ⚠️ שגיאה בעדכון עסק מוכר: {e}")
+            return False
+        
+        # ההסרה מהמאגר והעדכון במטמון יחד - עסק שנרשם באותו רגע לא מחזיר את הקטגוריה האוטומטית
+        with self._business_lock:
+            self.pending_businesses.pop(normalized_name, None)
+            self.reference_cache.set_business(normalized_name, category_id)
+        self.reference_cache.save_snapshot()
+        return True
     
     def check_file_processed(self, file_hash: str) -> bool:
         """בדיקה אם קובץ כבר עובד"""
+        if file_hash in self.known_file_hashes:
+            return True
+        
         try:
             response = self.supabase.table('processed_files').select('id').eq('file_hash', file_hash).limit(1).execute()
+            if response.data:
+                self._remember_hashes({file_hash})
             return len(response.data) > 0
         except:
             return False
+    
+    def get_processed_hashes(self, file_hashes: Iterable[str], recheck: bool = False) -> Set[str]:
+        """בדיקה מרוכזת - אילו מה-hashes כבר עובדו (קודם מקומית, ואז in_ בחלקים)
+        recheck: כל ה-hashes נבדקים מול המסד, ו-hashes מקומיים שנמחקו מ-processed_files נשכחים"""
+        file_hashes = set(file_hashes)
+        processed = set() if recheck else file_hashes & self.known_file_hashes
+        missing = sorted(file_hashes - processed)
+        
+        found = set()
+        failed = False
+        for start in range(0, len(missing), HASH_LOOKUP_CHUNK):
+            chunk = missing[start:start + HASH_LOOKUP_CHUNK]
+            try:
+                response = self.supabase.table('processed_files').select('file_hash').in_('file_hash', chunk).execute()
+                found.update(row['file_hash'] for row in response.data)
+            except Exception as e:
+                failed = True
+                print(f"   ⚠️ שגיאה בבדיקת קבצים מעובדים: {e}")
+        
+        # בלי תשובה מלאה מהמסד לא שוכחים כלום - עדיף לדלג מאשר לייבא פעמיים
+        if recheck and not failed:
+            self.forget_processed_hashes(file_hashes - found)
+        elif recheck:
+            processed = file_hashes & self.known_file_hashes
+        
+        self._remember_hashes(found)
+        return processed | found
+    
+    def forget_processed_hashes(self, file_hashes: Optional[Iterable[str]] = None):
+        """הסרת hashes מהרשימה המקומית (הכל אם None) - הקבצים ייבדקו שוב מול המסד"""
+        forgotten = self.known_file_hashes if file_hashes is None else self.known_file_hashes & set(file_hashes)
+        if not forgotten:
+            return
+        
+        self.known_file_hashes = self.known_file_hashes - forgotten
+        print(f"   🔄 {len(forgotten)} קבצים הוסרו מרשימת הקבצים המעובדים המקומית")
+        if not self.processed_hashes_file:
+            return
+        
+        try:
+            temp_file = self.processed_hashes_file.with_suffix('.tmp')
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.writelines(f"{file_hash}\n" for file_hash in sorted(self.known_file_hashes))
+            os.replace(temp_file, self.processed_hashes_file)
+        except OSError as e:
+            print(f"   ⚠️ שגיאה בשמירת hashes מקומיים: {e}")
+    
+    def _load_known_hashes(self) -> Set[str]:
+        """טעינת ה-hashes המקומיים - קובץ טקסט, hash בכל שורה"""
+        if not self.processed_hashes_file or not self.processed_hashes_file.exists():
+            return set()
+        
+        try:
+            with open(self.processed_hashes_file, 'r', encoding='utf-8') as f:
+                return {line.strip() for line in f if line.strip()}
+        except OSError as e:
+            print(f"   ⚠️ שגיאה בקריאת hashes מקומיים: {e}")
+            return set()
+    
+    def _remember_hashes(self, file_hashes: Set[str]):
+        """הוספת hashes שאושרו במסד לרשימה המקומית"""
+        new_hashes = set(file_hashes) - self.known_file_hashes
+        if not new_hashes:
+            return
+        
+        self.known_file_hashes |= new_hashes
+        if not self.processed_hashes_file:
+            return
+        
+        try:
+            self.processed_hashes_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.processed_hashes_file, 'a', encoding='utf-8') as f:
+                f.writelines(f"{file_hash}\n" for file_hash in sorted(new_hashes))
+        except OSError as e:
+            print(f"   ⚠️ שגיאה בשמירת hashes מקומיים: {e}")
 
-    def save_transactions(self, transactions: List[Dict], file_hash: str) -> int:
-        """שמירת עסקאות למסד נתונים - עם מספר כרטיס"""
+    def save_transactions(self, transactions: Union[TransactionBatch, List[Dict]], file_hash: str,
+                          first_row: int = 0) -> int:
+        """שמירת עסקאות למסד נתונים - עם מספר כרטיס (first_row: מיקום האצווה בקובץ, למפתח הייבוא)"""
         if not transactions:
             return 0
         
+        # עבודה על העמודות ישירות - בלי מילון ביניים לכל עסקה
+        batch = TransactionBatch.from_transactions(transactions)
+        
+        # המרת datetime לstring - לכל העמודה בבת אחת
+        date_strings = np.datetime_as_string(batch.dates, unit='D').tolist()
+        
+        # ניקוי השורות המקוריות פעם אחת לכל האצווה
+        raw_rows = batch.serialized_raw_records() if self.store_raw_data else [None] * len(batch)
+        
+        # קטגוריזציה פעם אחת לכל שם עסק ייחודי באצווה
+        categorized = self.categorize_businesses(batch.businesses)
+        
         # הוספת מידע נוסף לכל עסקה
         processed_transactions = []
-        for transaction in transactions:
-            category_id, is_known, confidence = self.categorize_business(transaction['business'])
-            
-            # המרת datetime לstring
-            transaction_date = transaction['date']
-            if hasattr(transaction_date, 'strftime'):
-                date_str = transaction_date.strftime('%Y-%m-%d')
-            else:
-                date_str = str(transaction_date)
+        for row_number, (date_str, business_name, amount, company, card_last_four, raw_data, categorization) in enumerate(
+                zip(date_strings, batch.businesses, batch.amounts.tolist(), batch.companies,
+                    batch.cards, raw_rows, categorized), first_row):
+            normalized, category_id, is_known, confidence = categorization
             
             processed_transaction = {
                 'transaction_date': date_str,
-                'business_name': transaction['business'],
-                'normalized_business': self.normalize_business_name(transaction['business']),
-                'amount': float(transaction['amount']),
-                'original_amount': float(transaction['amount']),
+                'business_name': business_name,
+                'normalized_business': normalized,
+                'amount': amount,
+                'original_amount': amount,
                 'currency': 'ILS',
-                'company': transaction['company'],
-                'description': transaction['business'][:500],
+                'company': company,
+                'description': business_name[:500],
                 'category_id': category_id,
                 'confidence_score': float(confidence) if confidence else 0.5,
                 'file_hash': file_hash,
-                'card_last_four': transaction.get('card_last_four'),
-                'raw_data': self._clean_raw_data(transaction.get('raw_data', {})),
+                # מפתח ייבוא יציב - אותה שורה מאותו קובץ לא נשמרת פעמיים
+                'import_key': f"{file_hash}:{row_number}",
+                'card_last_four': card_last_four,
                 'needs_review': confidence < 0.50 if confidence else True
             }
+            if self.store_raw_data:
+                processed_transaction['raw_data'] = raw_data
             processed_transactions.append(processed_transaction)
         
         try:
-            response = self.supabase.table('transactions').insert(processed_transactions).execute()
+            result = self.transactions_writer.insert(processed_transactions)
+            saved_count = result['saved']
+            if result['retried_chunks'] and result['skipped']:
+                # ניסיון שנכשל אחרי commit - השורות נספרו כ"כבר במסד"; ספירה מחדש מהשרת
+                self.stats_cache.invalidate()
+            else:
+                self.stats_cache.record_transactions(result['saved_rows'])
             
-            if response.data:
-                saved_count = len(response.data)
+            if result['failed_chunks']:
+                print(f"   ⚠️ נשמרו {saved_count} מתוך {len(processed_transactions)} עסקאות "
+                      f"({result['failed_chunks']} מתוך {result['chunks']} חלקים נכשלו)")
+                self._keep_failed_rows(result['failed_rows'])
+            elif saved_count:
                 print(f"   ✅ נשמרו {saved_count} עסקאות למסד הנתונים")
-                return saved_count
+            elif result['skipped']:
+                print(f"   ⏭️ כל {result['skipped']} העסקאות כבר היו במסד הנתונים")
             else:
                 print(f"   ❌ לא נשמרו עסקאות")
-                return 0
+            
+            return saved_count
                 
         except Exception as e:
             print(f"   ❌ שגיאה בשמירה: {e}")
             return 0
         
+        finally:
+            self.flush_new_businesses()
+        
+    def _keep_failed_rows(self, rows: List[Dict]):
+        """שמירת עסקאות שנכשלו לקובץ מקומי (JSON בכל שורה) - הקובץ כבר רשום כמעובד, כך שרק מכאן הן יישלחו שוב"""
+        if not self.failed_rows_file:
+            print(f"   ⚠️ {len(rows)} עסקאות שנכשלו לא נשמרו לניסיון חוזר (failed_rows_file ריק)")
+            return
+        
+        try:
+            self.failed_rows_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.failed_rows_file, 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows)
+            print(f"   💾 {len(rows)} עסקאות שנכשלו נשמרו לניסיון חוזר")
+        except OSError as e:
+            print(f"   ❌ שגיאה בשמירת עסקאות שנכשלו: {e}")
+    
+    def retry_failed_rows(self) -> int:
+        """שליחה חוזרת של עסקאות שנכשלו בריצות קודמות - מה שנכשל שוב נשאר בקובץ"""
+        if not self.failed_rows_file or not self.failed_rows_file.exists():
+            return 0
+        
+        try:
+            with open(self.failed_rows_file, 'r', encoding='utf-8') as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            print(f"   ⚠️ שגיאה בקריאת עסקאות שנכשלו: {e}")
+            return 0
+        
+        if not rows:
+            return 0
+        
+        print(f"🔁 שולח שוב {len(rows)} עסקאות שנכשלו בריצה קודמת...")
+        result = self.transactions_writer.insert(rows)
+        # חלק מהשורות אולי נשמרו כבר בריצה הקודמת (upsert מתעלם מהן) - ספירה מחדש מהשרת
+        self.stats_cache.invalidate()
+        
+        try:
+            temp_file = self.failed_rows_file.with_suffix('.tmp')
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in result['failed_rows'])
+            os.replace(temp_file, self.failed_rows_file)
+        except OSError as e:
+            print(f"   ⚠️ שגיאה בעדכון קובץ העסקאות שנכשלו: {e}")
+        
+        print(f"   ✅ נשמרו {result['saved']} עסקאות, {result['failed']} עדיין ממתינות")
+        return result['saved']
+    
     def save_processed_file(self, filename: str, file_hash: str, company: str, count: int, processing_time: float = 0):
         """שמירת מידע על קובץ מעובד"""
         try:
@@ -226,63 +530,40 @@ class FinancialDatabase:
             }
             
             result = self.supabase.table('processed_files').insert(file_data).execute()
+            self._remember_hashes({file_hash})
+            self.stats_cache.record_processed_file()
             print(f"   📝 קובץ נרשם כמעובד: {filename}")
             
         except Exception as e:
             print(f"   ⚠️ שגיאה בשמירת מידע קובץ: {e}")
         
+    def update_processed_file(self, file_hash: str, count: int, processing_time: float = 0):
+        """עדכון מספר העסקאות וזמן העיבוד של קובץ שנרשם מראש"""
+        try:
+            self.supabase.table('processed_files').update({
+                'transactions_count': count,
+                'processing_time_seconds': processing_time
+            }).eq('file_hash', file_hash).execute()
+            
+        except Exception as e:
+            print(f"   ⚠️ שגיאה בעדכון מידע קובץ: {e}")
+        
     def _clean_raw_data(self, raw_data: Dict) -> Dict:
         """ניקוי raw_data מobjects שלא ניתנים לserialization"""
-        cleaned = {}
-        
-        for key, value in raw_data.items():
-            try:
-                # המרת datetime לstring
-                if hasattr(value, 'strftime'):
-                    cleaned[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                # המרת pandas objects לסוגי נתונים פשוטים  
-                elif hasattr(value, 'item'):  # numpy/pandas scalar
-                    cleaned[key] = value.item()
-                # המרת NaN לNone
-                elif str(value).lower() == 'nan':
-                    cleaned[key] = None
-                # אם זה כבר JSON serializable
-                else:
-                    json.dumps(value)  # בדיקה שזה ניתן לserialization
-                    cleaned[key] = value
-            except:
-                # אם לא ניתן לserialization - המר לstring
-                cleaned[key] = str(value) if value is not None else None
-        
-        return cleaned
+        return clean_raw_record(raw_data)
     
     def get_stats(self) -> Dict:
-        """קבלת סטטיסטיקות מהמסד"""
-        try:
-            stats = {}
-            
-            # סה"כ עסקאות
-            response = self.supabase.table('transactions').select('count', count='exact').execute()
-            stats['total_transactions'] = response.count
-            
-            # סה"כ קטגוריות
-            response = self.supabase.table('categories').select('count', count='exact').execute()
-            stats['total_categories'] = response.count
-            
-            # קבצים מעובדים
-            response = self.supabase.table('processed_files').select('count', count='exact').execute()
-            stats['processed_files'] = response.count
-            
-            # סכום כולל
-            response = self.supabase.table('transactions').select('amount').execute()
-            total_amount = sum(float(t['amount']) for t in response.data if t['amount'])
-            stats['total_amount'] = f"{total_amount:,.2f} ₪"
-            
-            return stats
-            
-        except Exception as e:
-            print(f"❌ שגיאה בקבלת סטטיסטיקות: {e}")
+        """קבלת סטטיסטיקות מהמסד - צבירה בשרת ומטמון מקומי"""
+        stats = self.stats_cache.get()
+        if not stats:
             return {}
+        
+        return {
+            'total_transactions': stats['total_transactions'],
+            'total_categories': stats['total_categories'],
+            'processed_files': stats['processed_files'],
+            'total_amount': f"{stats['total_amount']:,.2f} ₪" if stats['total_amount'] is not None else 'לא זמין'
+        }
 
     # 🤖 פונקציות AI
     def categorize_business_with_ai(self, business_name: str, amount: float = 0) -> Tuple[Optional[int], bool, float]:
@@ -323,7 +604,8 @@ class FinancialDatabase:
                 new_category_name = self._get_category_name(new_category_id)
                 
                 self.ai_categorizer.retrain_on_correction(
-                    business_name, old_category_name, new_category_name
+                    business_name, old_category_name, new_category_name,
+                    transaction_id=transaction_id, amount=transaction['amount']
                 )
                 
                 # עדכון עסקים דומים
@@ -331,6 +613,7 @@ class FinancialDatabase:
                     business_name, new_category_id, threshold=0.85
                 )
                 
+                # התיקון נשמר בגרסה הבאה של המודל (schedule_save) - לא גרסה לכל תיקון
                 print(f"🤖 AI עדכן {updated_count} עסקאות דומות")
                 return updated_count
             
@@ -340,13 +623,13 @@ class FinancialDatabase:
             print(f"שגיאה בלמידת תיקון: {e}")
             return 0
 
-    def bulk_retrain_ai(self):
-        """אימון מחדש של כל מערכת הAI"""
+    def bulk_retrain_ai(self, full: bool = False):
+        """אימון מחדש של כל מערכת הAI - מצטבר, או מאפס (full)"""
         if not hasattr(self, 'ai_categorizer'):
             from smart_ai import SmartCategorizer
             self.ai_categorizer = SmartCategorizer(self)
         
-        return self.ai_categorizer.bulk_retrain_all()
+        return self.ai_categorizer.bulk_retrain_all(full)
 
     def get_ai_suggestions(self, limit: int = 20):
         """קבלת הצעות שיפור מהAI"""
@@ -357,11 +640,12 @@ class FinancialDatabase:
     def initialize_ai(self):
         """אתחול מערכת AI"""
         try:
-            from smart_ai import SmartCategorizer
-            self.ai_categorizer = SmartCategorizer(self)
+            # מערכת קיימת ממשיכה מהעסקה האחרונה שלמדה, חדשה מהגרסה השמורה של המודל
+            if not hasattr(self, 'ai_categorizer'):
+                from smart_ai import SmartCategorizer
+                self.ai_categorizer = SmartCategorizer(self)
             
-            # למידה ראשונית מהנתונים הקיימים
-            transactions_count = self.ai_categorizer.learn_from_existing_data()
+            transactions_count = self.ai_categorizer.warm_start()
             
             print(f"🤖 AI אותחל בהצלחה עם {transactions_count} עסקאות")
             return True
@@ -372,10 +656,7 @@ class FinancialDatabase:
 
     def _get_category_name(self, category_id: int) -> str:
         """קבלת שם קטגוריה לפי ID"""
-        for name, cat_id in self.categories_cache.items():
-            if cat_id == category_id:
-                return name
-        return 'לא מוגדר'
+        return self.reference_cache.category_name(category_id)
 
 
 def get_file_hash(filepath) -> str:
@@ -387,6 +668,95 @@ def get_file_hash(filepath) -> str:
         return None
 
 
+# גודל מקטע לחישוב hash מצטבר
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class MappedFile:
+    """קובץ ממופה לזיכרון - קריאה אחת מהדיסק ל-hash ולפרסור"""
+    
+    def __init__(self, filepath, file_hash: Optional[str] = None):
+        self._file = open(filepath, 'rb')
+        self._mapping = None
+        
+        try:
+            if os.fstat(self._file.fileno()).st_size:
+                self._mapping = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mapping)
+            else:
+                # אי אפשר למפות קובץ ריק
+                self._view = memoryview(b'')
+            
+            # hash מצטבר על גבי המיפוי - בלי להעתיק את הקובץ (אלא אם כבר חושב)
+            if file_hash is None:
+                digest = hashlib.sha256()
+                for offset in range(0, len(self._view), HASH_CHUNK_SIZE):
+                    digest.update(self._view[offset:offset + HASH_CHUNK_SIZE])
+                file_hash = digest.hexdigest()
+            self.file_hash = file_hash
+            
+        except Exception:
+            self.close()
+            raise
+    
+    def reader(self) -> io.BufferedReader:
+        """קורא חדש מתחילת הקובץ על אותו buffer"""
+        return io.BufferedReader(_MemoryViewReader(self._view))
+    
+    def close(self):
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _MemoryViewReader(io.RawIOBase):
+    """קורא קבצים מעל memoryview - מעתיק רק את המקטעים שנקראים"""
+    
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(offset, 0)
+        return self._position
+    
+    def readinto(self, buffer) -> int:
+        size = max(min(len(buffer), len(self._view) - self._position), 0)
+        buffer[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+
+def map_file(filepath, file_hash: Optional[str] = None) -> Optional[MappedFile]:
+    """מיפוי קובץ לזיכרון וחישוב hash (אם לא ידוע) - None אם לא ניתן לקרוא"""
+    try:
+        return MappedFile(filepath, file_hash)
+    except:
+        return None
+
+
 if __name__ == "__main__":
     # בדיקה של מנהל המסד
     from config import get_supabase_config, validate_config
@@ -3,47 +3,85 @@ financial_app.py
 האפליקציה הראשית - עם תיקון סדר השמירה
 """
 from pathlib import Path
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
 
 # Import הקבצים שלנו
-from smart_parsers import parse_file
-from database_manager import FinancialDatabase, get_file_hash
-from config import get_supabase_config, validate_config, EXCEL_FILES_FOLDER
+from smart_parsers import parse_file, iter_file_transactions, iter_batches
+from database_manager import FinancialDatabase, MappedFile, map_file
+from parse_cache import ParsedStatementCache
+from transaction_model import TransactionBatch
+from config import get_supabase_config, validate_config, EXCEL_FILES_FOLDER, INGEST_STREAMING, INGEST_BATCH_SIZE, INGEST_WORKERS
+from config import INGEST_STORE_RAW_DATA
+from config import PARSE_CACHE_ENABLED, PARSE_CACHE_FOLDER, PARSE_CACHE_MAX_MB
 
 # ==========================================
 # הגדרות מרכזיות מconfig.py
 # ==========================================
-def process_single_file(filepath: Path, db: FinancialDatabase) -> int:
-    """עיבוד קובץ בודד - עם תיקון סדר השמירה"""
+parse_cache = ParsedStatementCache(PARSE_CACHE_FOLDER, PARSE_CACHE_MAX_MB * 1024 * 1024) if PARSE_CACHE_ENABLED else None
+
+def process_single_file(filepath: Path, db: FinancialDatabase, checked: bool = False,
+                        file_hash: Optional[str] = None) -> int:
+    """עיבוד קובץ בודד - עם תיקון סדר השמירה (checked: כבר נבדק שלא עובד, file_hash: כבר חושב)"""
     filename = filepath.name
     print(f"\n📄 מפרסר: {filename}")
     
     start_time = datetime.now()
     
-    # בדיקת hash
-    file_hash = get_file_hash(filepath)
-    if not file_hash:
+    # מיפוי הקובץ לזיכרון - קריאה אחת לחישוב hash ולפרסור (בלי hash אם כבר ידוע)
+    mapped_file = map_file(filepath, file_hash)
+    if not mapped_file:
         print(f"   ❌ לא ניתן לחשב hash")
         return 0
     
-    if db.check_file_processed(file_hash):
+    with mapped_file:
+        return ingest_mapped_file(filepath, mapped_file, db, start_time, checked)
+
+def ingest_mapped_file(filepath: Path, mapped_file: MappedFile, db: FinancialDatabase, start_time: datetime,
+                       checked: bool = False) -> int:
+    """פרסור ושמירה של קובץ ממופה"""
+    file_hash = mapped_file.file_hash
+    
+    if not checked and db.check_file_processed(file_hash):
         print(f"   ⏭️ קובץ כבר עובד - מדלג")
         return 0
     
+    # קובץ שכבר פורסר בריצה קודמת עובר דרך המטמון גם במצב זורם
+    if INGEST_STREAMING and not (parse_cache and file_hash in parse_cache):
+        return process_file_streaming(filepath, file_hash, db, start_time, mapped_file.reader())
+    
+    transactions = parse_with_cache(filepath, file_hash, mapped_file.reader())
+    processing_time = int((datetime.now() - start_time).total_seconds())
+    
+    return save_parsed_file(filepath, file_hash, transactions, db, processing_time)
+
+def parse_with_cache(filepath: Path, file_hash: str, source=None) -> TransactionBatch:
+    """פרסור קובץ - מהמטמון אם כבר פורסר בריצה קודמת (למשל שמירה שנכשלה)"""
+    transactions = parse_cache.get(file_hash) if parse_cache else None
+    
     # פרסור עם הפרסר החכם
-    transactions = parse_file(filepath)
+    if transactions is None:
+        transactions = parse_file(filepath, source)
+        if parse_cache:
+            parse_cache.put(file_hash, transactions)
     
+    return transactions
+
+def save_parsed_file(filepath: Path, file_hash: str, transactions: TransactionBatch, db: FinancialDatabase, processing_time: int) -> int:
+    """שמירת קובץ מפורסר - רישום הקובץ ואז העסקאות"""
     if not transactions:
         print(f"   ⚠️ לא נמצאו עסקאות")
         return 0
     
     # 🔧 תיקון: שמירת הקובץ קודם!
     company = transactions[0]['company']
-    processing_time = int((datetime.now() - start_time).total_seconds())
     
     try:
         # שלב 1: שמירת הקובץ ב-processed_files
-        db.save_processed_file(filename, file_hash, company, len(transactions), processing_time)
+        db.save_processed_file(filepath.name, file_hash, company, len(transactions), processing_time)
         print(f"   📝 רושם קובץ כמעובד...")
         
         # שלב 2: שמירת העסקאות (עכשיו יש קשר ל-processed_files)
@@ -58,8 +96,132 @@ def process_single_file(filepath: Path, db: FinancialDatabase) -> int:
         print(f"   ❌ שגיאה כללית: {e}")
         return 0
 
-def process_all_files(EXCEL_FILES_FOLDER: Path, db: FinancialDatabase):
-    """עיבוד כל הקבצים בתיקייה"""
+def process_file_streaming(filepath: Path, file_hash: str, db: FinancialDatabase, start_time: datetime, source=None) -> int:
+    """עיבוד קובץ בקריאה זורמת - השמירה מתחילה לפני שהקובץ נקרא עד הסוף"""
+    return save_transaction_stream(filepath, file_hash, iter_file_transactions(filepath, source), db, start_time)
+
+def save_transaction_stream(filepath: Path, file_hash: str, transactions: Iterator, db: FinancialDatabase,
+                            start_time: datetime) -> int:
+    """שמירה באצוות של INGEST_BATCH_SIZE - רישום הקובץ, העסקאות, ועדכון הכמות בסוף"""
+    first = next(transactions, None)
+    if first is None:
+        print(f"   ⚠️ לא נמצאו עסקאות")
+        return 0
+    
+    try:
+        # שלב 1: שמירת הקובץ ב-processed_files (הכמות מתעדכנת בסוף)
+        db.save_processed_file(filepath.name, file_hash, first['company'], 0)
+        print(f"   📝 רושם קובץ כמעובד...")
+        
+        # שלב 2: שמירת העסקאות באצוות תוך כדי קריאה
+        parsed_count = 0
+        saved_count = 0
+        for batch in iter_batches(chain([first], transactions), INGEST_BATCH_SIZE):
+            saved_count += db.save_transactions(batch, file_hash, first_row=parsed_count)
+            parsed_count += len(batch)
+        
+        processing_time = int((datetime.now() - start_time).total_seconds())
+        db.update_processed_file(file_hash, parsed_count, processing_time)
+        
+        if saved_count > 0:
+            print(f"   🎉 הושלם: {saved_count} עסקאות")
+        
+        return saved_count
+        
+    except Exception as e:
+        print(f"   ❌ שגיאה כללית: {e}")
+        return 0
+
+def parse_file_worker(filepath: Path, file_hash: str) -> Tuple[TransactionBatch, int]:
+    """פרסור בתהליך נפרד - ללא גישה למסד הנתונים"""
+    start_time = datetime.now()
+    
+    # ה-hash כבר חושב בתהליך הראשי - המיפוי כאן רק לפרסור
+    mapped_file = map_file(filepath, file_hash)
+    if not mapped_file:
+        return TransactionBatch.empty(), 0
+    
+    with mapped_file:
+        transactions = parse_with_cache(filepath, file_hash, mapped_file.reader())
+    
+    return transactions, int((datetime.now() - start_time).total_seconds())
+
+def filter_processed_files(excel_files: List[Path], db: FinancialDatabase, recheck: bool = False) -> List[Tuple[Path, str]]:
+    """hash לכל הקבצים ובדיקה מרוכזת אחת מול processed_files - מחזיר רק קבצים חדשים
+    (כל מיפוי נסגר מיד אחרי ה-hash - מיפוי פתוח לכל קובץ היה מכלה את ה-file descriptors בתיקייה גדולה)"""
+    hashed = []
+    for file_path in excel_files:
+        mapped_file = map_file(file_path)
+        if not mapped_file:
+            print(f"   ❌ לא ניתן לחשב hash: {file_path.name}")
+            continue
+        with mapped_file:
+            hashed.append((file_path, mapped_file.file_hash))
+    
+    processed_hashes = db.get_processed_hashes((file_hash for _, file_hash in hashed), recheck)
+    
+    pending = []
+    seen_hashes = set()
+    for file_path, file_hash in hashed:
+        # קובץ כפול בתיקייה או קובץ שכבר עובד
+        if file_hash in seen_hashes or file_hash in processed_hashes:
+            print(f"   ⏭️ קובץ כבר עובד - מדלג: {file_path.name}")
+            continue
+        
+        seen_hashes.add(file_hash)
+        pending.append((file_path, file_hash))
+    
+    return pending
+
+def process_files_parallel(excel_files: List[Path], db: FinancialDatabase, workers: int,
+                           recheck: bool = False) -> Tuple[int, int]:
+    """פרסור מקבילי ב-ProcessPoolExecutor עם כותב יחיד למסד הנתונים"""
+    # שלב 1: hash וסינון קבצים שכבר עובדו - בתהליך הראשי; התהליכים מקבלים את ה-hash ולא מחשבים שוב
+    pending = filter_processed_files(excel_files, db, recheck)
+    
+    print(f"⚙️ מפרסר {len(pending)} קבצים ב-{workers} תהליכים")
+    
+    total_transactions = 0
+    successful_files = 0
+    
+    # שלב 2: פרסור במקביל, שמירה לפי סדר הקבצים בתהליך הראשי בלבד
+    # עד 2*workers קבצים בדרך - קובץ חדש נשלח כשקודם נשמר, כך שתוצאות לא נערמות בזיכרון
+    files = iter(pending)
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit_next():
+            item = next(files, None)
+            if item:
+                in_flight.append((*item, executor.submit(parse_file_worker, *item)))
+        
+        for _ in range(2 * workers):
+            submit_next()
+        
+        while in_flight:
+            file_path, file_hash, future = in_flight.popleft()
+            print(f"\n📄 שומר: {file_path.name}")
+            
+            try:
+                transactions, processing_time = future.result()
+                if INGEST_STREAMING:
+                    # הקובץ פורסר כולו בתהליך - אבל נשמר באצוות כמו בקריאה זורמת
+                    start_time = datetime.now() - timedelta(seconds=processing_time)
+                    transactions_count = save_transaction_stream(file_path, file_hash, iter(transactions), db, start_time)
+                else:
+                    transactions_count = save_parsed_file(file_path, file_hash, transactions, db, processing_time)
+                if transactions_count > 0:
+                    total_transactions += transactions_count
+                    successful_files += 1
+            except Exception as e:
+                print(f"   ❌ שגיאה: {e}")
+            finally:
+                submit_next()
+    
+    return total_transactions, successful_files
+
+def process_all_files(EXCEL_FILES_FOLDER: Path, db: FinancialDatabase, workers: int = INGEST_WORKERS,
+                      recheck: bool = False):
+    """עיבוד כל הקבצים בתיקייה (recheck: בדיקה מחדש מול המסד במקום הרשימה המקומית)"""
     # חיפוש קבצי Excel
     excel_files = list(EXCEL_FILES_FOLDER.rglob("*.xlsx")) + list(EXCEL_FILES_FOLDER.rglob("*.xls"))
     
@@ -68,19 +230,27 @@ def process_all_files(EXCEL_FILES_FOLDER: Path, db: FinancialDatabase):
         return
     
     print(f"📁 נמצאו {len(excel_files)} קבצי Excel")
+    
+    # עסקאות שנכשלו בריצה קודמת - הקבצים שלהן כבר רשומים כמעובדים
+    db.retry_failed_rows()
+    
     print(f"\n🚀 מתחיל עיבוד...")
     
     total_transactions = 0
     successful_files = 0
     
-    for file_path in excel_files:
-        try:
-            transactions_count = process_single_file(file_path, db)
-            if transactions_count > 0:
-                total_transactions += transactions_count
-                successful_files += 1
-        except Exception as e:
-            print(f"   ❌ שגיאה: {e}")
+    if workers > 1:
+        total_transactions, successful_files = process_files_parallel(excel_files, db, workers, recheck)
+    else:
+        for file_path, file_hash in filter_processed_files(excel_files, db, recheck):
+            try:
+                # מיפוי מחדש של קובץ אחד בכל פעם, עם ה-hash שכבר חושב
+                transactions_count = process_single_file(file_path, db, checked=True, file_hash=file_hash)
+                if transactions_count > 0:
+                    total_transactions += transactions_count
+                    successful_files += 1
+            except Exception as e:
+                print(f"   ❌ שגיאה: {e}")
     
     print(f"\n📊 סיכום:")
     print(f"✅ קבצים שהצליחו: {successful_files}/{len(excel_files)}")
@@ -94,7 +264,8 @@ def show_menu(excel_count: int):
     print(f"\n📋 בחר פעולה:")
     print(f"1. עיבוד כל הקבצים ({excel_count} קבצים)")
     print(f"2. הצגת סטטיסטיקות")
-    print(f"3. יציאה")
+    print(f"3. עיבוד כל הקבצים - בדיקה מחדש מול המסד (אחרי מחיקת קבצים מעובדים)")
+    print(f"4. יציאה")
 
 def main():
     # בדיקת הגדרות
@@ -105,7 +276,7 @@ def main():
     config = get_supabase_config()
     
     # חיבור למסד נתונים
-    db = FinancialDatabase(config['url'], config['service_key'])
+    db = FinancialDatabase(config['url'], config['service_key'], store_raw_data=INGEST_STORE_RAW_DATA)
     
     if not db.test_connection():
         return
@@ -123,7 +294,7 @@ def main():
     # תפריט ראשי
     while True:
         show_menu(len(excel_files))
-        choice = input("\nבחר (1-3): ").strip()
+        choice = input("\nבחר (1-4): ").strip()
         
         if choice == "1":
             process_all_files(EXCEL_FILES_FOLDER, db)
@@ -141,6 +312,9 @@ def main():
                 print(f"   {key_hebrew}: {value}")
                 
         elif choice == "3":
+            process_all_files(EXCEL_FILES_FOLDER, db, recheck=True)
+            
+        elif choice == "4":
             print("👋 יציאה...")
             break
             
@@ -0,0 +1,131 @@
+"""
+issuer_layouts.py
+רישום מבני דפי החיוב של חברות האשראי - זיהוי חברה לפי שם קובץ ומבנה לפי השורות הראשונות
+"""
+from typing import List, Dict, Optional, Tuple
+import pandas as pd
+
+# זיהוי חברה לפי שם קובץ - לפי סדר בדיקה
+COMPANY_FILENAME_MARKERS = [
+    ('דיינרס', ('דיינרס', 'diners')),
+    ('ישראכרט', ('ישראכרט', 'isracard')),
+    ('כאל', ('כאל', 'cal')),
+    ('ויזה', ('ויזה', 'visa')),
+    ('מסטרקארד', ('מסטרקארד', 'mastercard')),
+    ('אמריקן_אקספרס', ('אמריקן', 'american')),
+]
+UNKNOWN_COMPANY = 'לא_ידוע'
+
+# מילות מפתח לזיהוי תפקיד עמודה בשורת כותרות - לפי סדר עדיפות
+COLUMN_ROLE_KEYWORDS = {
+    'amount': ['סכום חיוב', 'סכום'],
+    'date': ['תאריך רכישה', 'תאריך עסקה', 'תאריך'],
+    'business': ['שם בית עסק', 'בית עסק', 'שם', 'עסק'],
+}
+
+# כמות השורות והעמודות שנקראות לזיהוי מבנה לפני טעינה מלאה
+SNIFF_ROWS = 30
+SNIFF_COLUMNS = 12
+
+class IssuerLayout:
+    """מבנה דף חיוב - הגדרה הצהרתית בלבד, הפרסור עצמו משותף לכל המבנים"""
+    __slots__ = ('key', 'companies', 'header_markers', 'columns', 'header_rows',
+                 'stop_at_blank', 'date_format', 'section_label', 'column_keywords')
+
+    def __init__(self, key: str, companies: Tuple[str, ...], header_markers: Tuple[str, ...],
+                 columns: Tuple[int, int, int], header_rows: Tuple[int, ...], stop_at_blank: bool,
+                 date_format: Optional[str], section_label: str = 'קטע',
+                 column_keywords: Optional[Dict[str, List[str]]] = None):
+        self.key = key
+        self.companies = companies                  # חברות שהקבצים שלהן במבנה הזה
+        self.header_markers = header_markers        # טקסט שמופיע רק בשורות הראשונות של המבנה
+        self.columns = columns                      # עמודות ברירת מחדל: (תאריך, שם בית עסק, סכום חיוב)
+        self.header_rows = header_rows              # שורות כותרות קבועות - כשהכותרות לא זוהו
+        self.stop_at_blank = stop_at_blank          # קבוצות שנגמרות בשורה ריקה
+        self.date_format = date_format              # None: הסקה מהנתונים
+        self.section_label = section_label
+        self.column_keywords = column_keywords or COLUMN_ROLE_KEYWORDS
+
+    def __repr__(self) -> str:
+        return f"IssuerLayout({self.key!r})"
+
+
+# רישום המבנים - לפי סדר בדיקה בזיהוי
+LAYOUTS: Dict[str, IssuerLayout] = {}
+
+def register_layout(layout: IssuerLayout) -> IssuerLayout:
+    """הוספת מבנה לרישום - חברה חדשה לא דורשת שינוי בפרסר"""
+    LAYOUTS[layout.key] = layout
+    return layout
+
+ISRACARD_LAYOUT = register_layout(IssuerLayout(
+    key='isracard',
+    companies=('ישראכרט',),
+    header_markers=('תאריך רכישה',),
+    columns=(0, 1, 4),
+    header_rows=(8, 25),
+    stop_at_blank=True,
+    date_format='%d.%m.%y',
+    section_label='קבוצה'
+))
+
+DINERS_CAL_LAYOUT = register_layout(IssuerLayout(
+    key='diners_cal',
+    companies=('דיינרס', 'כאל'),
+    header_markers=('תאריך עסקה',),
+    columns=(0, 1, 3),
+    header_rows=(2,),
+    stop_at_blank=False,
+    date_format=None
+))
+
+def get_layout(key: str) -> Optional[IssuerLayout]:
+    return LAYOUTS.get(key)
+
+def layout_for_company(company: str) -> Optional[IssuerLayout]:
+    """המבנה של חברה מוכרת - None אם אין לה מבנה רשום"""
+    for layout in LAYOUTS.values():
+        if company in layout.companies:
+            return layout
+    return None
+
+def detect_company_from_filename(filename: str) -> str:
+    """זיהוי חברת כרטיס אשראי מתוך שם הקובץ"""
+    filename_lower = filename.lower()
+
+    for company, markers in COMPANY_FILENAME_MARKERS:
+        if any(marker in filename_lower for marker in markers):
+            return company
+
+    return UNKNOWN_COMPANY
+
+def sniff_layout(source, nrows: int = SNIFF_ROWS) -> Optional[IssuerLayout]:
+    """זיהוי מבנה לפי השורות הראשונות בלבד - בלי לטעון את כל הגיליון"""
+    try:
+        head = pd.read_excel(source, header=None, nrows=nrows,
+                             usecols=lambda column: column < SNIFF_COLUMNS)
+    except Exception as e:
+        print(f"   ⚠️ שגיאה בזיהוי מבנה: {e}")
+        return None
+    finally:
+        # החזרת buffer פתוח להתחלה לקראת הטעינה המלאה
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+    cells = {str(value).strip() for value in head.to_numpy().ravel() if not pd.isna(value)}
+
+    for layout in LAYOUTS.values():
+        if any(marker in cell for marker in layout.header_markers for cell in cells):
+            return layout
+    return None
+
+def resolve_layout(company: str, source) -> Optional[IssuerLayout]:
+    """מבנה הקובץ - לפי החברה, ואם היא לא מוכרת לפי השורות הראשונות"""
+    layout = layout_for_company(company)
+    if layout:
+        return layout
+
+    layout = sniff_layout(source)
+    if layout:
+        print(f"   🔎 זוהה מבנה: {layout.key}")
+    return layout
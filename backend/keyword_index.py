@@ -0,0 +1,81 @@
+"""
+keyword_index.py
+אינדקס הפוך למילות המפתח של SmartCategorizer - מילה -> {קטגוריה: משקל}
+התאמה לפי תת-מחרוזות של השם עצמו, כך שהעלות תלויה באורך השם ולא בגודל אוצר המילים
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+# מילות המפתח נלמדות רק מרצפי אותיות - תת-מחרוזת עם תו אחר לא יכולה להתאים
+LETTER_RUN_PATTERN = re.compile(r'[א-תa-z]+')
+
+class KeywordIndex:
+    """מילת מפתח -> {קטגוריה: משקל}, עם סדר ההכנסה לכל קטגוריה (לסכימה באותו סדר כמו המילון)"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.positions: Dict[tuple, int] = {}
+        self._next_position: Dict[str, int] = defaultdict(int)
+        self._lengths = Counter()
+
+    def build(self, category_keywords: Dict[str, Dict[str, float]]):
+        """בנייה מחדש מ-category_keywords (אחרי למידה מלאה)"""
+        self.postings = {}
+        self.positions = {}
+        self._next_position = defaultdict(int)
+        self._lengths = Counter()
+
+        for category, keywords in category_keywords.items():
+            for keyword, weight in keywords.items():
+                self.set_weight(category, keyword, weight)
+
+    def set_weight(self, category: str, keyword: str, weight: float):
+        """עדכון מצטבר של משקל אחד - מילה חדשה נכנסת בסוף סדר הקטגוריה"""
+        categories = self.postings.get(keyword)
+        if categories is None:
+            categories = self.postings[keyword] = {}
+            self._lengths[len(keyword)] += 1
+
+        if category not in categories:
+            self.positions[(category, keyword)] = self._next_position[category]
+            self._next_position[category] += 1
+        categories[category] = weight
+
+    def remove(self, category: str, keyword: str):
+        """מילה שירדה מתחת לסף בקטגוריה"""
+        categories = self.postings.get(keyword)
+        if categories is None or category not in categories:
+            return
+
+        del categories[category]
+        del self.positions[(category, keyword)]
+        if not categories:
+            del self.postings[keyword]
+            self._lengths[len(keyword)] -= 1
+            if not self._lengths[len(keyword)]:
+                del self._lengths[len(keyword)]
+
+    def match(self, text: str) -> Dict[str, List[float]]:
+        """קטגוריה -> משקלי מילות המפתח שמופיעות בטקסט (כל מילה פעם אחת, לפי סדר ההכנסה)"""
+        if not self._lengths:
+            return {}
+
+        min_length = min(self._lengths)
+        max_length = max(self._lengths)
+        found = set()
+
+        for run in LETTER_RUN_PATTERN.findall(text):
+            run_length = len(run)
+            for length in range(min_length, min(max_length, run_length) + 1):
+                for start in range(run_length - length + 1):
+                    keyword = run[start:start + length]
+                    if keyword in self.postings:
+                        found.add(keyword)
+
+        hits = defaultdict(list)
+        for keyword in found:
+            for category, weight in self.postings[keyword].items():
+                hits[category].append((self.positions[(category, keyword)], weight))
+
+        return {category: [weight for _, weight in sorted(weights)] for category, weights in hits.items()}
@@ -0,0 +1,721 @@
+"""
+local_store.py
+עותק מקומי (SQLite) של transactions, categories ו-known_businesses
+סנכרון מצטבר לפי watermark, וממשק שאילתות בסגנון Supabase - לקריאות מקומיות ולעבודה ללא רשת
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+# טבלאות שמשוכפלות מ-Supabase (processed_files נשאר תמיד בשרת במצב mirror)
+MIRRORED_TABLES = ('transactions', 'categories', 'known_businesses')
+
+# עמודות לכל טבלה - המפתח הראשי ראשון
+TABLE_COLUMNS = {
+    'categories': ['id', 'name', 'description', 'color', 'icon', 'created_at', 'updated_at'],
+    'transactions': ['id', 'transaction_date', 'business_name', 'normalized_business', 'amount', 'original_amount',
+                     'currency', 'company', 'description', 'category_id', 'confidence_score', 'file_hash',
+                     'import_key', 'card_last_four', 'needs_review', 'raw_data', 'user_email', 'created_at', 'updated_at'],
+    'known_businesses': ['normalized_name', 'business_name', 'category_id', 'auto_category', 'created_at', 'updated_at'],
+    'processed_files': ['id', 'filename', 'file_hash', 'company', 'processing_status', 'transactions_count',
+                        'processing_time_seconds', 'created_at'],
+}
+AUTO_ID_TABLES = ('categories', 'transactions', 'processed_files')
+UNIQUE_COLUMNS = {'categories': ['name'], 'transactions': ['import_key'], 'processed_files': ['file_hash']}
+JSON_COLUMNS = ('raw_data',)
+BOOLEAN_COLUMNS = ('needs_review', 'auto_category')
+
+# טבלאות מקושרות בשאילתה: categories(name, color) -> דרך category_id
+EMBEDDED_TABLES = {'categories': 'category_id'}
+
+# סנכרון לפי (updated_at, id) - None: טעינה מלאה (טבלה קטנה)
+SYNC_WATERMARKS = {'categories': 'updated_at', 'transactions': 'updated_at', 'known_businesses': None}
+
+FILTER_OPERATORS = {'eq': '=', 'neq': '!=', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+# פעולות כתיבה בשאילתה - כל השאר קריאה
+WRITE_ACTIONS = ('insert', 'upsert', 'update', 'delete')
+# מאפייני בונה השאילתה שאינם מתודות
+PROPERTY_MODIFIERS = ('not_',)
+
+
+class LocalStore:
+    """מסד SQLite מקומי - גם לקוח בסגנון Supabase (table / rpc) לעבודה ללא רשת"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # BulkWriter כותב מכמה threads - חיבור משותף עם נעילה
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.lock, self.conn:
+            for table, columns in TABLE_COLUMNS.items():
+                key = columns[0]
+                definitions = [f'"{key}" INTEGER PRIMARY KEY' if table in AUTO_ID_TABLES else f'"{key}" TEXT PRIMARY KEY']
+                definitions += [f'"{column}"' for column in columns[1:]]
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(definitions)})')
+
+                # עותק שנוצר בגרסה קודמת - הוספת העמודות החדשות
+                existing = {row['name'] for row in self.conn.execute(f'PRAGMA table_info("{table}")')}
+                for column in columns:
+                    if column not in existing:
+                        self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}"')
+
+                for column in UNIQUE_COLUMNS.get(table, []):
+                    self.conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}_{column}" ON "{table}" ("{column}")')
+
+            self.conn.execute('CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category_id)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS sync_state '
+                              '(table_name TEXT PRIMARY KEY, watermark TEXT, last_id INTEGER)')
+
+    # ==========================================
+    # ממשק בסגנון Supabase
+    # ==========================================
+    def table(self, name: str) -> 'LocalQuery':
+        if name not in TABLE_COLUMNS:
+            raise LocalStoreError(f'relation "{name}" does not exist')
+        return LocalQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict] = None, **kwargs) -> 'LocalRpc':
+        return LocalRpc(self, name)
+
+    def transaction_stats(self) -> Dict:
+        """אותן סטטיסטיקות כמו פונקציית get_transaction_stats בשרת"""
+        with self.lock:
+            row = self.conn.execute('''
+                SELECT count(*) AS total_transactions,
+                       coalesce(sum(amount), 0) AS total_amount,
+                       sum(confidence_score >= 0.8) AS high_confidence,
+                       sum(confidence_score >= 0.5 AND confidence_score < 0.8) AS medium_confidence,
+                       sum(confidence_score < 0.5) AS low_confidence,
+                       (SELECT count(*) FROM categories) AS total_categories,
+                       (SELECT count(*) FROM processed_files) AS processed_files
+                FROM transactions
+            ''').fetchone()
+        return {key: row[key] or 0 for key in row.keys()}
+
+    # ==========================================
+    # סנכרון מצטבר מ-Supabase
+    # ==========================================
+    def sync(self, remote, page_size: int = 1000) -> Dict[str, int]:
+        """משיכת שורות חדשות/מעודכנות מאז ה-watermark של כל טבלה"""
+        synced = {}
+
+        for table in MIRRORED_TABLES:
+            try:
+                if SYNC_WATERMARKS[table]:
+                    synced[table] = self._sync_incremental(remote, table, page_size)
+                else:
+                    synced[table] = self._sync_full(remote, table, page_size)
+            except Exception as e:
+                print(f"   ⚠️ שגיאה בסנכרון {table}: {e}")
+                synced[table] = 0
+
+        print(f"   🔄 סנכרון מקומי: " + ", ".join(f"{table} {count}" for table, count in synced.items()))
+        return synced
+
+    def _sync_incremental(self, remote, table: str, page_size: int) -> int:
+        """keyset על (updated_at, id) - כולל עדכונים, לא רק הכנסות"""
+        watermark, last_id = self._get_watermark(table)
+        total = 0
+
+        while True:
+            query = remote.table(table).select('*').order('updated_at').order('id').limit(page_size)
+            if watermark:
+                query = query.or_(f'updated_at.gt."{watermark}",and(updated_at.eq."{watermark}",id.gt.{last_id})')
+
+            rows = query.execute().data or []
+            if not rows:
+                break
+
+            self.upsert_rows(table, rows)
+            watermark, last_id = rows[-1]['updated_at'], rows[-1]['id']
+            self._set_watermark(table, watermark, last_id)
+            total += len(rows)
+
+            if len(rows) < page_size:
+                break
+
+        return total
+
+    def _sync_full(self, remote, table: str, page_size: int) -> int:
+        """טעינה מלאה בעמודים - לטבלאות קטנות בלי updated_at"""
+        key = TABLE_COLUMNS[table][0]
+        rows = []
+        while True:
+            page = remote.table(table).select('*').order(key).range(len(rows), len(rows) + page_size - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                break
+
+        with self.lock, self.conn:
+            self.conn.execute(f'DELETE FROM "{table}"')
+        self.upsert_rows(table, rows)
+        return len(rows)
+
+    def _get_watermark(self, table: str) -> Tuple[Optional[str], int]:
+        with self.lock:
+            row = self.conn.execute('SELECT watermark, last_id FROM sync_state WHERE table_name = ?', (table,)).fetchone()
+        return (row['watermark'], row['last_id'] or 0) if row else (None, 0)
+
+    def _set_watermark(self, table: str, watermark: str, last_id: int):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT INTO sync_state (table_name, watermark, last_id) VALUES (?, ?, ?) '
+                              'ON CONFLICT(table_name) DO UPDATE SET watermark = excluded.watermark, last_id = excluded.last_id',
+                              (table, watermark, last_id))
+
+    def reset_sync(self):
+        """ריקון הטבלאות המשוכפלות וה-watermarks - הסנכרון הבא טוען הכל מחדש (למשל אחרי מחיקות בשרת)"""
+        with self.lock, self.conn:
+            for table in MIRRORED_TABLES:
+                self.conn.execute(f'DELETE FROM "{table}"')
+            self.conn.execute('DELETE FROM sync_state')
+
+    # ==========================================
+    # כתיבה
+    # ==========================================
+    def upsert_rows(self, table: str, rows: List[Dict], on_conflict: Optional[str] = None,
+                    ignore_duplicates: bool = False) -> List[Dict]:
+        """הכנסה או עדכון לפי מפתח - מחזיר את השורות כפי שנשמרו"""
+        columns = TABLE_COLUMNS[table]
+        conflict = on_conflict or columns[0]
+        saved = []
+        # כמו הטריגר touch_updated_at בשרת - חותמת אחת לכל הכתיבה
+        stamp = _now() if 'updated_at' in columns else None
+
+        with self.lock, self.conn:
+            for row in rows:
+                row = {column: _encode(column, value) for column, value in row.items() if column in columns}
+                if stamp:
+                    row['updated_at'] = stamp
+                names = list(row)
+                sql = (f'INSERT INTO "{table}" ({", ".join(f"{_quote(n)}" for n in names)}) '
+                       f'VALUES ({", ".join("?" for _ in names)})')
+
+                updates = [name for name in names if name != conflict]
+                if conflict in row and (ignore_duplicates or not updates):
+                    sql += f' ON CONFLICT({_quote(conflict)}) DO NOTHING'
+                elif conflict in row:
+                    sql += (f' ON CONFLICT({_quote(conflict)}) DO UPDATE SET '
+                            + ", ".join(f'{_quote(name)} = excluded.{_quote(name)}' for name in updates))
+
+                cursor = self.conn.execute(sql, [row[name] for name in names])
+                if cursor.rowcount:
+                    key = columns[0]
+                    key_value = row.get(key, cursor.lastrowid) if conflict == key else None
+                    saved.append(self._fetch_one(table, key, key_value) if key_value is not None
+                                 else self._fetch_one(table, conflict, row[conflict]))
+
+        return saved
+
+    def _fetch_one(self, table: str, column: str, value) -> Dict:
+        row = self.conn.execute(f'SELECT * FROM "{table}" WHERE {_quote(column)} = ?', (value,)).fetchone()
+        return _decode_row(row)
+
+
+class LocalQuery:
+    """בונה שאילתה בסגנון postgrest - select/insert/upsert/update/delete עם מסננים"""
+
+    def __init__(self, store: LocalStore, table: str):
+        self.store = store
+        self.table = table
+        self.action = 'select'
+        self.columns = '*'
+        self.count_mode = None
+        self.head = False
+        self.filters = []
+        self.order_by = []
+        self.limit_count = None
+        self.offset = 0
+        self.single_row = False
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.negate_next = False
+
+    def select(self, *columns, count: Optional[str] = None, head: bool = False, **kwargs) -> 'LocalQuery':
+        self.action = 'select'
+        self.columns = ','.join(columns) if columns else '*'
+        self.count_mode = count
+        self.head = head
+        return self
+
+    def insert(self, rows, **kwargs) -> 'LocalQuery':
+        self.action = 'insert'
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = '', ignore_duplicates: bool = False, **kwargs) -> 'LocalQuery':
+        self.action = 'upsert'
+        self.payload = rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict or None
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: Dict, **kwargs) -> 'LocalQuery':
+        self.action = 'update'
+        self.payload = values
+        return self
+
+    def delete(self, **kwargs) -> 'LocalQuery':
+        self.action = 'delete'
+        return self
+
+    def _filter(self, column: str, operator: str, value) -> 'LocalQuery':
+        # העמודות נבדקות ב-execute - כמו השגיאה מהשרת
+        self.filters.append(('filter', column, operator, value, self.negate_next))
+        self.negate_next = False
+        return self
+
+    @property
+    def not_(self) -> 'LocalQuery':
+        """שלילת המסנן הבא - query.not_.eq(...)"""
+        self.negate_next = True
+        return self
+
+    def eq(self, column, value): return self._filter(column, 'eq', value)
+    def neq(self, column, value): return self._filter(column, 'neq', value)
+    def gt(self, column, value): return self._filter(column, 'gt', value)
+    def gte(self, column, value): return self._filter(column, 'gte', value)
+    def lt(self, column, value): return self._filter(column, 'lt', value)
+    def lte(self, column, value): return self._filter(column, 'lte', value)
+    def in_(self, column, values): return self._filter(column, 'in', list(values))
+    def is_(self, column, value): return self._filter(column, 'is', value)
+    def like(self, column, pattern): return self._filter(column, 'like', pattern)
+    def ilike(self, column, pattern): return self._filter(column, 'ilike', pattern)
+
+    def or_(self, filters: str, reference_table: Optional[str] = None) -> 'LocalQuery':
+        """מסנני postgrest שמספיק שאחד מהם מתקיים - 'id.gt.5,and(name.eq."x",id.lt.3)'"""
+        self.filters.append(_parse_logic(filters))
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> 'LocalQuery':
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> 'LocalQuery':
+        self.limit_count = size
+        return self
+
+    def range(self, start: int, end: int, **kwargs) -> 'LocalQuery':
+        self.offset = start
+        self.limit_count = end - start + 1
+        return self
+
+    def single(self) -> 'LocalQuery':
+        self.single_row = True
+        return self
+
+    def execute(self) -> 'LocalResponse':
+        with self.store.lock:
+            if self.action == 'select':
+                return self._execute_select()
+            if self.action in ('insert', 'upsert'):
+                on_conflict = self.on_conflict if self.action == 'upsert' else None
+                rows = self.store.upsert_rows(self.table, self.payload, on_conflict,
+                                              self.ignore_duplicates or self.action == 'insert')
+                if self.action == 'insert' and len(rows) < len(self.payload):
+                    raise LocalStoreError(f'duplicate key value violates unique constraint on "{self.table}"')
+                return LocalResponse(rows)
+            if self.action == 'update':
+                return self._execute_update()
+            return self._execute_delete()
+
+    def _execute_select(self) -> 'LocalResponse':
+        plain_columns, embedded = self._parse_columns()
+        where, params = self._where()
+
+        # head - רק הספירה, בלי שורות (כמו HEAD ב-PostgREST)
+        if self.head:
+            count = self.store.conn.execute(f'SELECT count(*) FROM "{self.table}"{where}', params).fetchone()[0]
+            return LocalResponse([], count if self.count_mode else None)
+
+        selected = list(plain_columns) if plain_columns else []
+        for embed_table in embedded:
+            if EMBEDDED_TABLES[embed_table] not in selected:
+                selected.append(EMBEDDED_TABLES[embed_table])
+
+        sql = f'SELECT {", ".join(_quote(c) for c in selected) if selected else "*"} FROM "{self.table}"{where}'
+        for column, _ in self.order_by:
+            self._check_column(column)
+        if self.order_by:
+            sql += ' ORDER BY ' + ', '.join(f'{_quote(c)}{" DESC" if desc else ""}' for c, desc in self.order_by)
+        if self.limit_count is not None or self.offset:
+            sql += f' LIMIT {int(self.limit_count) if self.limit_count is not None else -1} OFFSET {int(self.offset)}'
+
+        rows = [_decode_row(row) for row in self.store.conn.execute(sql, params).fetchall()]
+
+        for embed_table, embed_columns in embedded.items():
+            self._embed(rows, embed_table, embed_columns)
+
+        # עמודות שנוספו רק לצורך הקישור לא מוחזרות
+        if plain_columns is not None:
+            keep = set(plain_columns) | set(embedded)
+            rows = [{key: value for key, value in row.items() if key in keep} for row in rows]
+
+        count = None
+        if self.count_mode:
+            count = self.store.conn.execute(f'SELECT count(*) FROM "{self.table}"{where}', params).fetchone()[0]
+
+        if self.single_row:
+            if len(rows) != 1:
+                raise LocalStoreError(f'JSON object requested, multiple (or no) rows returned ({len(rows)})')
+            return LocalResponse(rows[0], count)
+        return LocalResponse(rows, count)
+
+    def _execute_update(self) -> 'LocalResponse':
+        key = TABLE_COLUMNS[self.table][0]
+        where, params = self._where()
+        keys = [row[0] for row in self.store.conn.execute(f'SELECT {_quote(key)} FROM "{self.table}"{where}', params)]
+
+        values = {column: _encode(column, value) for column, value in self.payload.items()}
+        for column in values:
+            self._check_column(column)
+        if 'updated_at' in TABLE_COLUMNS[self.table]:
+            values['updated_at'] = _now()
+
+        with self.store.conn:
+            self.store.conn.execute(
+                f'UPDATE "{self.table}" SET {", ".join(f"{_quote(c)} = ?" for c in values)}{where}',
+                list(values.values()) + params
+            )
+
+        return LocalResponse([self.store._fetch_one(self.table, key, value) for value in keys])
+
+    def _execute_delete(self) -> 'LocalResponse':
+        where, params = self._where()
+        rows = [_decode_row(row) for row in self.store.conn.execute(f'SELECT * FROM "{self.table}"{where}', params)]
+        with self.store.conn:
+            self.store.conn.execute(f'DELETE FROM "{self.table}"{where}', params)
+        return LocalResponse(rows)
+
+    def _where(self) -> Tuple[str, List]:
+        clauses, params = [], []
+
+        for node in self.filters:
+            clause, node_params = self._condition(node)
+            clauses.append(clause)
+            params.extend(node_params)
+
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _condition(self, node: tuple) -> Tuple[str, List]:
+        """מסנן אחד, או קבוצת and/or/not מ-or_, כתנאי SQL"""
+        if node[0] == 'not':
+            clause, params = self._condition(node[1])
+            return f'NOT ({clause})', params
+        if node[0] in ('and', 'or'):
+            parts = [self._condition(child) for child in node[1]]
+            if not parts:
+                return ('1' if node[0] == 'and' else '0'), []
+            clause = f' {node[0].upper()} '.join(f'({part})' for part, _ in parts)
+            return clause, [param for _, part_params in parts for param in part_params]
+
+        _, column, operator, value, negate = node
+        self._check_column(column)
+
+        if operator == 'in':
+            clause = f'{_quote(column)} IN ({", ".join("?" for _ in value)})' if value else '0'
+            params = [_encode(column, item) for item in value]
+        elif operator == 'is':
+            clause = f'{_quote(column)} IS {IS_VALUES.get(str(value).lower(), "NOT NULL")}'
+            params = []
+        elif operator in ('like', 'ilike'):
+            # like תלוי רישיות (GLOB), ilike לא (LIKE של SQLite)
+            clause = f'{_quote(column)} GLOB ?' if operator == 'like' else f'{_quote(column)} LIKE ?'
+            params = [_like_to_glob(value) if operator == 'like' else value.replace('*', '%')]
+        else:
+            clause = f'{_quote(column)} {FILTER_OPERATORS[operator]} ?'
+            params = [_encode(column, value)]
+
+        return (f'NOT ({clause})' if negate else clause), params
+
+    def _parse_columns(self) -> Tuple[Optional[List[str]], Dict[str, List[str]]]:
+        """'id, name, categories(name, color)' -> עמודות רגילות וטבלאות מקושרות"""
+        plain, embedded = [], {}
+
+        for part in _split_top_level(self.columns):
+            if '(' in part:
+                name, inner = part.split('(', 1)
+                name = name.strip()
+                if name not in EMBEDDED_TABLES:
+                    raise LocalStoreError(f'could not find a relationship between "{self.table}" and "{name}"')
+                embedded[name] = [column.strip() for column in inner.rstrip(')').split(',') if column.strip()]
+            elif part == '*':
+                return None, embedded
+            else:
+                self._check_column(part)
+                plain.append(part)
+
+        return plain, embedded
+
+    def _embed(self, rows: List[Dict], embed_table: str, embed_columns: List[str]):
+        """הוספת השורה המקושרת לכל שורה (או None) - כמו embedding של postgrest"""
+        foreign_key = EMBEDDED_TABLES[embed_table]
+        ids = {row[foreign_key] for row in rows if row.get(foreign_key) is not None}
+        if not ids:
+            for row in rows:
+                row[embed_table] = None
+            return
+
+        columns = ', '.join(_quote(c) for c in (embed_columns or ['*']) if c == '*' or c in TABLE_COLUMNS[embed_table])
+        linked = {
+            row['id']: row for row in (
+                _decode_row(item) for item in self.store.conn.execute(
+                    f'SELECT id, {columns} FROM "{embed_table}" WHERE id IN ({", ".join("?" for _ in ids)})', list(ids)
+                )
+            )
+        }
+
+        for row in rows:
+            match = linked.get(row.get(foreign_key))
+            row[embed_table] = {column: match.get(column) for column in embed_columns} if match else None
+
+    def _check_column(self, column: str):
+        if column not in TABLE_COLUMNS[self.table]:
+            raise LocalStoreError(f'column {self.table}.{column} does not exist')
+
+
+class LocalRpc:
+    """פונקציות השרת שיש להן מקבילה מקומית"""
+
+    def __init__(self, store: LocalStore, name: str):
+        self.store = store
+        self.name = name
+
+    def execute(self) -> 'LocalResponse':
+        if self.name == 'get_transaction_stats':
+            return LocalResponse(self.store.transaction_stats())
+        raise LocalStoreError(f'function {self.name} does not exist')
+
+
+class MirrorClient:
+    """קריאות מהעותק המקומי, כתיבות ל-Supabase ומשם גם לעותק - במקום לקוח ה-Supabase"""
+
+    def __init__(self, remote, store: LocalStore, page_size: int = 1000, sync_seconds: float = 60):
+        self.remote = remote
+        self.store = store
+        self.page_size = page_size
+        # תהליך ארוך (שרת ה-API) מסתנכרן שוב לפני קריאה, לכל היותר פעם ב-sync_seconds (0 - רק ידנית)
+        self.sync_seconds = sync_seconds
+        self.synced_at = None
+        self._sync_lock = threading.Lock()
+
+    def table(self, name: str):
+        if name not in MIRRORED_TABLES:
+            return self.remote.table(name)
+        return _MirrorQuery(self, name)
+
+    def rpc(self, *args, **kwargs):
+        return self.remote.rpc(*args, **kwargs)
+
+    def sync(self, page_size: Optional[int] = None) -> Dict[str, int]:
+        with self._sync_lock:
+            synced = self.store.sync(self.remote, page_size or self.page_size)
+            self.synced_at = time.monotonic()
+        return synced
+
+    def sync_if_stale(self):
+        """סנכרון מצטבר אם עבר sync_seconds מהקודם - thread אחד מסנכרן, השאר קוראים מהעותק"""
+        if not self.sync_seconds:
+            return
+        if self.synced_at is not None and time.monotonic() - self.synced_at < self.sync_seconds:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.synced_at = time.monotonic()
+            self.store.sync(self.remote, self.page_size)
+        finally:
+            self._sync_lock.release()
+
+
+class _MirrorQuery:
+    """קריאות השרשור נרשמות ומופעלות רק ב-execute - על העותק (קריאה) או על השרת ומשם לעותק (כתיבה)"""
+
+    def __init__(self, client: MirrorClient, table: str):
+        self.client = client
+        self.table = table
+        self.remote_query = client.remote.table(table)
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        # not_ הוא מאפיין (query.not_.eq) - נרשם כגישה, לא כקריאה
+        if name in PROPERTY_MODIFIERS:
+            self.calls.append((name, None, None))
+            return self
+
+        def chained(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+
+        return chained
+
+    def execute(self):
+        if not any(name in WRITE_ACTIONS for name, _, _ in self.calls):
+            self.client.sync_if_stale()
+            try:
+                local_query = _replay(self.client.store.table(self.table), self.calls)
+                return local_query.execute()
+            except (AttributeError, LocalStoreError):
+                # שאילתה שהעותק לא יודע לבצע (מתודה או עמודה חסרה) - השרת עונה
+                return _replay(self.remote_query, self.calls).execute()
+
+        response = _replay(self.remote_query, self.calls).execute()
+
+        # השורות כפי שחזרו מהשרת (עם id) - ואם לא חזרו, אותה פעולה מקומית
+        rows = response.data if isinstance(response.data, list) else []
+        if rows and TABLE_COLUMNS[self.table][0] in rows[0]:
+            self.client.store.upsert_rows(self.table, rows)
+        else:
+            try:
+                _replay(self.client.store.table(self.table), self.calls).execute()
+            except (AttributeError, LocalStoreError) as e:
+                print(f"   ⚠️ העותק המקומי לא עודכן: {e}")
+
+        return response
+
+
+def _replay(query, calls: List[tuple]):
+    """הפעלת קריאות השרשור שנרשמו על בונה שאילתה"""
+    for name, args, kwargs in calls:
+        attribute = getattr(query, name)
+        query = attribute if args is None else attribute(*args, **kwargs)
+    return query
+
+
+class LocalResponse:
+    """תשובה בסגנון APIResponse של postgrest"""
+
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class LocalStoreError(Exception):
+    """שגיאת שאילתה מקומית - מקבילה לשגיאת postgrest"""
+
+
+def _quote(column: str) -> str:
+    return f'"{column}"'
+
+def _now() -> str:
+    """חותמת updated_at בפורמט של PostgREST (UTC, מיקרו-שניות)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat(timespec='microseconds')
+
+# is.null / is.true / is.false
+IS_VALUES = {'none': 'NULL', 'null': 'NULL', 'true': '1', 'false': '0'}
+
+def _like_to_glob(pattern: str) -> str:
+    """תבנית LIKE (% / * ו-_) כתבנית GLOB תלוית רישיות"""
+    special = {'%': '*', '*': '*', '_': '?', '?': '[?]', '[': '[[]'}
+    return ''.join(special.get(char, char) for char in pattern)
+
+def _parse_logic(text: str) -> tuple:
+    """מחרוזת or_ של postgrest כעץ: ('or', [('filter', column, operator, value, negate), ('and', [...]), ...])"""
+    return ('or', [_parse_condition(part) for part in _split_logic(text)])
+
+def _parse_condition(text: str) -> tuple:
+    text = text.strip()
+    negate = text.startswith('not.')
+    if negate:
+        text = text[len('not.'):]
+
+    for group in ('and', 'or'):
+        if text.startswith(f'{group}(') and text.endswith(')'):
+            node = (group, [_parse_condition(part) for part in _split_logic(text[len(group) + 1:-1])])
+            return ('not', node) if negate else node
+
+    column, operator, value = text.split('.', 2)
+    if operator == 'not':
+        negate = not negate
+        operator, value = value.split('.', 1)
+    if operator not in FILTER_OPERATORS and operator not in ('in', 'is', 'like', 'ilike'):
+        raise LocalStoreError(f'unknown operator "{operator}" in "{text}"')
+
+    if operator == 'in':
+        value = [_logic_value(item) for item in _split_logic(value.strip()[1:-1])]
+    else:
+        value = _logic_value(value)
+    return ('filter', column, operator, value, negate)
+
+def _logic_value(text: str):
+    """ערך במחרוזת מסננים - במרכאות: מחרוזת, אחרת מספר אם אפשר"""
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1].replace('\\"', '"')
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+def _split_logic(text: str) -> List[str]:
+    """פיצול לפי פסיקים שלא בתוך סוגריים או מרכאות"""
+    parts, depth, quoted, current = [], 0, False, ''
+
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        elif not quoted:
+            depth += char == '('
+            depth -= char == ')'
+        current += char
+
+    if current.strip():
+        parts.append(current)
+    return [part.strip() for part in parts]
+
+def _encode(column: str, value):
+    """ערך לעמודת SQLite - JSON ל-dict/list"""
+    if column in JSON_COLUMNS and value is not None and not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _decode_row(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+    if row is None:
+        return None
+
+    data = dict(row)
+    for column in JSON_COLUMNS:
+        if isinstance(data.get(column), str):
+            try:
+                data[column] = json.loads(data[column])
+            except ValueError:
+                pass
+    for column in BOOLEAN_COLUMNS:
+        if data.get(column) is not None:
+            data[column] = bool(data[column])
+    return data
+
+def _split_top_level(columns: str) -> List[str]:
+    """פיצול רשימת עמודות לפי פסיקים שלא בתוך סוגריים"""
+    parts, depth, current = [], 0, ''
+
+    for char in columns:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        depth += char == '('
+        depth -= char == ')'
+        current += char
+
+    if current.strip():
+        parts.append(current.strip())
+    return [' '.join(part.split()) for part in parts]
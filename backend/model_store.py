@@ -0,0 +1,224 @@
+"""
+model_store.py
+גרסאות שמורות של מודל הקטגוריזציה - קובץ npz לכל גרסה, manifest עם checksum ו-watermark, טעינה וחזרה לגרסה קודמת
+מה שכל עסקה תרמה נשמר בנפרד ביומן SQLite (RowLedger) - הגרסה עצמה מכילה רק מונים מצטברים והשינויים מהגרסה הקודמת
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# גרסת מבנה הקובץ - קובץ במבנה אחר לא נטען
+MODEL_FORMAT = 3
+MANIFEST_NAME = 'manifest.json'
+LEDGER_NAME = 'learned_rows.db'
+
+class ModelStore:
+    """תיקיית גרסאות: categorizer-v0001.npz ... ו-manifest.json שמצביע על הגרסה הפעילה"""
+
+    def __init__(self, folder, keep_versions: int = 5):
+        self.folder = Path(folder)
+        self.keep_versions = max(1, keep_versions)
+        self.manifest_file = self.folder / MANIFEST_NAME
+
+    def save(self, state: Dict, arrays: Dict[str, np.ndarray], watermark: List, parent: Optional[int] = None) -> Dict:
+        """גרסה חדשה שהופכת לפעילה - מצב כ-JSON ומערכים כ-npz באותו קובץ
+        parent - הגרסה שממנה נמשכה הלמידה (None - גרסת בסיס שאי אפשר לעבור דרכה)"""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        manifest = self._read_manifest()
+        version = max([entry['version'] for entry in manifest['versions']], default=0) + 1
+
+        filename = f'categorizer-v{version:04d}.npz'
+        state_bytes = json.dumps({'format': MODEL_FORMAT, **state}, ensure_ascii=False).encode('utf-8')
+        temp_file = self.folder / f'{filename}.tmp'
+        with open(temp_file, 'wb') as f:
+            np.savez_compressed(f, state=np.frombuffer(state_bytes, dtype=np.uint8), **arrays)
+        os.replace(temp_file, self.folder / filename)
+
+        entry = {
+            'version': version,
+            # השינויים בשורות שבגרסה הם ביחס אליה
+            'parent': parent,
+            'file': filename,
+            'sha256': _file_checksum(self.folder / filename),
+            'watermark': watermark,
+            'created_at': datetime.now().isoformat(),
+            'size_bytes': (self.folder / filename).stat().st_size,
+        }
+        manifest['versions'].append(entry)
+        manifest['active'] = version
+        self._prune(manifest)
+        self._write_manifest(manifest)
+        return entry
+
+    def load(self, version: Optional[int] = None) -> Optional[Tuple[Dict, Dict[str, np.ndarray], Dict]]:
+        """הגרסה הפעילה (או version) - גרסה פגומה מדלגת לקודמת לה"""
+        manifest = self._read_manifest()
+        target = version if version is not None else manifest.get('active')
+        candidates = [entry for entry in reversed(manifest['versions'])
+                      if target is None or entry['version'] <= target]
+
+        for entry in candidates:
+            loaded = self._load_entry(entry)
+            if loaded is not None:
+                return loaded[0], loaded[1], entry
+            if version is not None:
+                return None
+
+        return None
+
+    def rollback_target(self, version: Optional[int] = None) -> Optional[Dict]:
+        """הגרסה שחזרה אחורה תגיע אליה - הקודמת לפעילה, או version - אם היא שלמה; ה-manifest לא משתנה"""
+        manifest = self._read_manifest()
+        active = manifest.get('active')
+        if version is None:
+            older = [entry['version'] for entry in manifest['versions'] if active is None or entry['version'] < active]
+            version = max(older, default=None)
+
+        entry = next((entry for entry in manifest['versions'] if entry['version'] == version), None)
+        if entry is None or self._load_entry(entry) is None:
+            return None
+        return entry
+
+    def activate(self, version: int):
+        """הגרסה הופכת לפעילה - הגרסאות החדשות ממנה נשארות בתיקייה"""
+        manifest = self._read_manifest()
+        manifest['active'] = version
+        self._write_manifest(manifest)
+
+    def change_path(self, from_version: Optional[int], to_version: int) -> Optional[Tuple[List[int], List[int]]]:
+        """הגרסאות שהשינויים שלהן מבוטלים (undo) ואז מוחלים (redo) כדי לעבור מ-from_version ל-to_version
+        לאורך שרשרת ה-parent - None אם אין אב משותף בגרסאות שנשמרו"""
+        if from_version is None:
+            return None
+        manifest = self._read_manifest()
+        parents = {entry['version']: entry.get('parent') for entry in manifest['versions']}
+
+        def ancestors(version):
+            chain = []
+            while version is not None and version in parents and version not in chain:
+                chain.append(version)
+                version = parents[version]
+            return chain
+
+        target_chain = ancestors(to_version)
+        common = next((version for version in ancestors(from_version) if version in target_chain), None)
+        if common is None:
+            return None
+
+        undo = ancestors(from_version)
+        undo = undo[:undo.index(common)]
+        redo = list(reversed(target_chain[:target_chain.index(common)]))
+        return undo, redo
+
+    def versions(self) -> List[Dict]:
+        manifest = self._read_manifest()
+        return [{**entry, 'active': entry['version'] == manifest.get('active')} for entry in manifest['versions']]
+
+    def _load_entry(self, entry: Dict) -> Optional[Tuple[Dict, Dict[str, np.ndarray]]]:
+        path = self.folder / entry['file']
+        try:
+            if _file_checksum(path) != entry['sha256']:
+                print(f"   ⚠️ checksum לא תואם בגרסה {entry['version']} - מדלג")
+                return None
+
+            with np.load(path, allow_pickle=False) as data:
+                state = json.loads(data['state'].tobytes().decode('utf-8'))
+                arrays = {name: data[name] for name in data.files if name != 'state'}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"   ⚠️ לא ניתן לטעון גרסה {entry['version']}: {e}")
+            return None
+
+        if state.get('format') != MODEL_FORMAT:
+            return None
+        return state, arrays
+
+    def _prune(self, manifest: Dict):
+        """מחיקת הגרסאות הישנות מעבר ל-keep_versions - הגרסה הפעילה תמיד נשארת"""
+        while len(manifest['versions']) > self.keep_versions:
+            oldest = manifest['versions'][0]
+            if oldest['version'] == manifest['active']:
+                break
+            manifest['versions'].pop(0)
+            try:
+                (self.folder / oldest['file']).unlink()
+            except OSError:
+                pass
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {'active': None, 'versions': []}
+
+        manifest.setdefault('versions', [])
+        manifest.setdefault('active', None)
+        return manifest
+
+    def _write_manifest(self, manifest: Dict):
+        temp_file = self.manifest_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.manifest_file)
+
+
+class RowLedger:
+    """יומן SQLite של מה שכל עסקה תרמה (קטגוריה, שם, סכום) ושל שמות העסקים לאינדקס הדומים
+    כל שמירה כותבת רק את השורות שהשתנו - ה-version מציין לאיזו גרסת מודל היומן תואם"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS rows '
+                              '(id INTEGER PRIMARY KEY, category TEXT, business_name TEXT, amount REAL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS names (name TEXT PRIMARY KEY)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    @property
+    def version(self) -> Optional[int]:
+        value = self._meta('version')
+        return int(value) if value is not None else None
+
+    @property
+    def similar_last_id(self) -> int:
+        return int(self._meta('similar_last_id') or 0)
+
+    def rows(self) -> Dict[int, Tuple]:
+        return {row[0]: tuple(row[1:]) for row in self.conn.execute('SELECT id, category, business_name, amount FROM rows')}
+
+    def names(self) -> List[str]:
+        return [row[0] for row in self.conn.execute('SELECT name FROM names')]
+
+    def apply(self, changes: Dict[int, Optional[Tuple]], names: Iterable[str], version: int,
+              similar_last_id: int, replace: bool = False):
+        """שינויים בשורות (None - השורה יצאה מהלמידה) ושמות חדשים בטרנזקציה אחת; replace - היומן נבנה מחדש"""
+        with self.conn:
+            if replace:
+                self.conn.execute('DELETE FROM rows')
+                self.conn.execute('DELETE FROM names')
+            self.conn.executemany('DELETE FROM rows WHERE id = ?',
+                                  [(row_id,) for row_id, row in changes.items() if row is None])
+            self.conn.executemany('INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?)',
+                                  [(row_id, *row) for row_id, row in changes.items() if row is not None])
+            self.conn.executemany('INSERT OR IGNORE INTO names VALUES (?)', [(name,) for name in names])
+            self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                  [('version', str(version)), ('similar_last_id', str(similar_last_id))])
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+
+def _file_checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,267 @@
+"""
+naive_bayes.py
+מסווג naive Bayes רב-מונחי על n-grams של תווים משם העסק, עם סכום כמאפיין נוסף
+המודל כולו במטריצות NumPy - חיזוי של אלפי שמות בפעולה וקטורית אחת
+"""
+from typing import List, Dict, Iterable, Tuple, Optional
+import numpy as np
+from business_names import normalize_business_name
+
+# אורכי ה-n-grams של התווים
+NGRAM_RANGE = (2, 4)
+
+# טמפרטורות לכיול הביטחון - נבחרת זו עם ה-log loss הנמוך על דוגמאות שהוחזקו בצד
+# הרצפה מונעת מנתונים מופרדים לגמרי לדחוף את הביטחון ל-1.0 על כל הבדל קטן
+MIN_TEMPERATURE = 0.1
+TEMPERATURE_GRID = tuple(float(t) for t in np.geomspace(MIN_TEMPERATURE, 10, 21))
+# שם שפחות מחלק זה מה-n-grams שלו מוכרים - המודל לא מציע לו קטגוריה
+MIN_NGRAM_COVERAGE = 0.5
+# כל דוגמה חמישית בלמידה מלאה משמשת לכיול לפני שהיא נכנסת למודל
+HOLDOUT_EVERY = 5
+
+# שונות מינימלית של log(1+סכום) בקטגוריה - קטגוריה עם סכומים זהים לא "נועלת" סכום
+MIN_AMOUNT_VARIANCE = 0.25
+
+def char_ngrams(name: str, ngram_range: Tuple[int, int] = NGRAM_RANGE) -> List[str]:
+    """n-grams של השם המנורמל, עם רווח בקצוות (תחילת וסוף מילה)"""
+    text = f' {normalize_business_name(name)} '
+    low, high = ngram_range
+    return [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+
+class NaiveBayesCategorizer:
+    """מונים לכל (קטגוריה, n-gram) ו-log(1+סכום) לכל קטגוריה - למידה מצטברת, חיזוי לאצווה"""
+
+    def __init__(self, alpha: float = 1.0, ngram_range: Tuple[int, int] = NGRAM_RANGE):
+        self.alpha = alpha
+        self.ngram_range = tuple(ngram_range)
+        self.reset()
+
+    def reset(self):
+        """מודל ריק - אותם alpha ו-n-grams"""
+        self.categories: List[str] = []
+        self.category_index: Dict[str, int] = {}
+        self.vocabulary: Dict[str, int] = {}
+        self.feature_counts = np.zeros((0, 0))
+        self.class_counts = np.zeros(0)
+        # לכל קטגוריה: מספר סכומים, סכום ו-סכום ריבועים של log(1+|סכום|)
+        self.amount_stats = np.zeros((0, 3))
+        self.temperature = 1.0
+        self._model = None
+
+    @property
+    def trained(self) -> bool:
+        return bool(self.class_counts.sum() > 0)
+
+    # ==========================================
+    # למידה
+    # ==========================================
+    def fit(self, examples: Iterable[Tuple[str, float, str]], chunk_size: int = 5000) -> int:
+        """למידה מלאה מ-(שם, סכום, קטגוריה) בזרם - בחלקים, עם כיול על דוגמאות שהוחזקו בצד"""
+        self.reset()
+        chunk, holdout = [], []
+        total = 0
+
+        for index, example in enumerate(examples):
+            total += 1
+            (holdout if index % HOLDOUT_EVERY == HOLDOUT_EVERY - 1 else chunk).append(example)
+            if len(chunk) >= chunk_size:
+                self.add_batch(*zip(*chunk))
+                chunk = []
+
+        if chunk:
+            self.add_batch(*zip(*chunk))
+        if holdout:
+            names, amounts, categories = zip(*holdout)
+            if self.trained:
+                self.calibrate(names, amounts, categories)
+            self.add_batch(names, amounts, categories)
+
+        return total
+
+    def add_batch(self, names: Iterable[str], amounts: Iterable[Optional[float]],
+                  categories: Iterable[str], weight: float = 1.0):
+        """הוספת דוגמאות למונים (weight=-1 מוריד דוגמה) - n-grams וקטגוריות חדשים מרחיבים את המטריצות"""
+        names, amounts, categories = list(names), list(amounts), list(categories)
+        if not names:
+            return
+
+        category_ids = np.array([self._category_id(category) for category in categories], dtype=np.int64)
+        grams = [char_ngrams(name, self.ngram_range) for name in names]
+
+        for name_grams in grams:
+            for gram in name_grams:
+                if gram not in self.vocabulary:
+                    self.vocabulary[gram] = len(self.vocabulary)
+        self._grow()
+
+        lengths = np.array([len(name_grams) for name_grams in grams], dtype=np.int64)
+        feature_ids = np.fromiter((self.vocabulary[gram] for name_grams in grams for gram in name_grams),
+                                  dtype=np.int64, count=int(lengths.sum()))
+        np.add.at(self.feature_counts, (np.repeat(category_ids, lengths), feature_ids), weight)
+        np.add.at(self.class_counts, category_ids, weight)
+
+        values, known = _amount_values(amounts)
+        np.add.at(self.amount_stats, (category_ids[known], 0), weight)
+        np.add.at(self.amount_stats, (category_ids[known], 1), weight * values[known])
+        np.add.at(self.amount_stats, (category_ids[known], 2), weight * values[known] ** 2)
+
+        if weight < 0:
+            np.maximum(self.feature_counts, 0, out=self.feature_counts)
+            np.maximum(self.class_counts, 0, out=self.class_counts)
+            np.maximum(self.amount_stats, 0, out=self.amount_stats)
+
+        self._model = None
+
+    def calibrate(self, names: Iterable[str], amounts: Iterable[Optional[float]], categories: Iterable[str]) -> float:
+        """בחירת טמפרטורה שממזערת את ה-log loss - הביטחון תואם את שיעור הפגיעה בפועל"""
+        labels = np.array([self.category_index.get(category, -1) for category in categories])
+        joint, coverage = self._joint_log_likelihood(list(names), list(amounts))
+        # רק שמות שהמודל יציע להם קטגוריה בפועל
+        known = (labels >= 0) & (coverage >= MIN_NGRAM_COVERAGE)
+        if not known.any():
+            return self.temperature
+
+        joint, labels = joint[known], labels[known]
+        best_loss = None
+        for temperature in TEMPERATURE_GRID:
+            posterior = _softmax(joint / temperature)
+            loss = -np.log(np.maximum(posterior[np.arange(len(labels)), labels], 1e-12)).mean()
+            if best_loss is None or loss < best_loss:
+                best_loss, self.temperature = loss, temperature
+
+        return self.temperature
+
+    def export_state(self) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        """המודל לשמירה - פרמטרים ושמות כ-dict, והמונים כמערכים"""
+        state = {
+            'alpha': self.alpha,
+            'ngram_range': list(self.ngram_range),
+            'categories': list(self.categories),
+            # סדר ההכנסה הוא סדר העמודות במטריצה
+            'vocabulary': list(self.vocabulary),
+            'temperature': float(self.temperature)
+        }
+        arrays = {
+            'feature_counts': self.feature_counts,
+            'class_counts': self.class_counts,
+            'amount_stats': self.amount_stats
+        }
+        return state, arrays
+
+    def load_state(self, state: Dict, arrays: Dict[str, np.ndarray]):
+        """טעינת מודל שנשמר ב-export_state"""
+        self.reset()
+        self.alpha = state['alpha']
+        self.ngram_range = tuple(state['ngram_range'])
+        self.categories = list(state['categories'])
+        self.category_index = {category: index for index, category in enumerate(self.categories)}
+        self.vocabulary = {gram: index for index, gram in enumerate(state['vocabulary'])}
+        self.temperature = state['temperature']
+        self.feature_counts = np.array(arrays['feature_counts'], dtype=np.float64)
+        self.class_counts = np.array(arrays['class_counts'], dtype=np.float64)
+        self.amount_stats = np.array(arrays['amount_stats'], dtype=np.float64)
+
+    # ==========================================
+    # חיזוי
+    # ==========================================
+    def predict_batch(self, names: Iterable[str], amounts: Optional[Iterable[Optional[float]]] = None) -> Tuple[List[str], np.ndarray]:
+        """קטגוריה וביטחון מכויל לכל שם - כל האצווה בפעולה וקטורית אחת
+        
+        שם שרוב ה-n-grams שלו לא מוכרים מקבל (None, 0) - אין עליו מידע, רק ה-prior והסכום
+        """
+        names = list(names)
+        amounts = list(amounts) if amounts is not None else [None] * len(names)
+        if not names or not self.trained:
+            return [None] * len(names), np.zeros(len(names))
+
+        joint, coverage = self._joint_log_likelihood(names, amounts)
+        posterior = _softmax(joint / self.temperature)
+        best = posterior.argmax(axis=1)
+        covered = coverage >= MIN_NGRAM_COVERAGE
+        categories = [self.categories[index] if is_covered else None for index, is_covered in zip(best, covered)]
+        return categories, np.where(covered, posterior[np.arange(len(names)), best], 0.0)
+
+    def predict(self, name: str, amount: Optional[float] = None) -> Tuple[Optional[str], float]:
+        categories, confidences = self.predict_batch([name], [amount])
+        return categories[0], float(confidences[0])
+
+    def _joint_log_likelihood(self, names: List[str], amounts: List[Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """log P(קטגוריה) + ממוצע log P(n-gram|קטגוריה) + log P(סכום|קטגוריה) - מטריצה (שמות × קטגוריות)
+        וחלק ה-n-grams המוכרים בכל שם
+
+        ממוצע ולא סכום: n-grams חופפים אינם בלתי תלויים, וסכום מלא נותן ביטחון קיצוני גם לשם לא מוכר
+        """
+        log_prior, log_feature, amount_mean, amount_variance = self._fitted()
+
+        # ייצוג דליל: אינדקסים של ה-n-grams המוכרים לכל שם, ועמודת אפס אחת לכל שם כדי שאף שורה לא תהיה ריקה
+        dummy = log_feature.shape[1] - 1
+        indices, starts, totals = [], [], []
+        for name in names:
+            grams = char_ngrams(name, self.ngram_range)
+            starts.append(len(indices))
+            totals.append(len(grams))
+            indices.append(dummy)
+            indices.extend(feature for feature in map(self.vocabulary.get, grams) if feature is not None)
+
+        counts = np.diff(starts + [len(indices)]) - 1
+        coverage = counts / np.maximum(totals, 1)
+        joint = np.add.reduceat(log_feature[:, indices], starts, axis=1).T / np.maximum(counts, 1)[:, None] + log_prior
+
+        values, known = _amount_values(amounts)
+        if known.any():
+            deviation = values[known, None] - amount_mean
+            joint[known] += -0.5 * (np.log(2 * np.pi * amount_variance) + deviation ** 2 / amount_variance)
+
+        return joint, coverage
+
+    def _fitted(self):
+        """הסתברויות log מהמונים - מחושבות מחדש רק אחרי שינוי"""
+        if self._model is not None:
+            return self._model
+
+        alpha = self.alpha
+        vocabulary_size = self.feature_counts.shape[1]
+        log_prior = np.log((self.class_counts + alpha) / (self.class_counts.sum() + alpha * len(self.categories)))
+        log_feature = np.log((self.feature_counts + alpha) /
+                             (self.feature_counts.sum(axis=1, keepdims=True) + alpha * vocabulary_size))
+        log_feature = np.hstack([log_feature, np.zeros((len(self.categories), 1))])
+
+        count, total, squares = self.amount_stats.T
+        overall_count = max(count.sum(), 1)
+        overall_mean = total.sum() / overall_count
+        overall_variance = max(squares.sum() / overall_count - overall_mean ** 2, MIN_AMOUNT_VARIANCE)
+        # קטגוריה עם מעט סכומים נמשכת לממוצע והשונות הכלליים
+        amount_mean = (total + overall_mean) / (count + 1)
+        amount_variance = np.maximum((squares + overall_variance + overall_mean ** 2) / (count + 1) - amount_mean ** 2,
+                                     MIN_AMOUNT_VARIANCE)
+
+        self._model = (log_prior, log_feature, amount_mean, amount_variance)
+        return self._model
+
+    def _category_id(self, category: str) -> int:
+        if category not in self.category_index:
+            self.category_index[category] = len(self.categories)
+            self.categories.append(category)
+        return self.category_index[category]
+
+    def _grow(self):
+        """הרחבת המטריצות לקטגוריות ול-n-grams שנוספו"""
+        rows, columns = len(self.categories), len(self.vocabulary)
+        old_rows, old_columns = self.feature_counts.shape
+        if (rows, columns) != (old_rows, old_columns):
+            self.feature_counts = np.pad(self.feature_counts, ((0, rows - old_rows), (0, columns - old_columns)))
+        if rows != len(self.class_counts):
+            self.class_counts = np.pad(self.class_counts, (0, rows - len(self.class_counts)))
+            self.amount_stats = np.pad(self.amount_stats, ((0, rows - len(self.amount_stats)), (0, 0)))
+
+
+def _amount_values(amounts: List[Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """log(1+|סכום|) ומסכה של סכומים קיימים"""
+    values = np.array([np.nan if amount is None else float(amount) for amount in amounts], dtype=np.float64)
+    known = ~np.isnan(values)
+    return np.log1p(np.abs(np.nan_to_num(values))), known
+
+def _softmax(scores: np.ndarray) -> np.ndarray:
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    return exp / exp.sum(axis=1, keepdims=True)
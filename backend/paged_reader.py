@@ -0,0 +1,79 @@
+"""
+paged_reader.py
+קריאת טבלה שלמה בעמודים - keyset על עמודת מפתח (או כמה עמודות), בלי תקרת השורות של PostgREST
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Iterable, Tuple, Union
+
+def iter_table_rows(supabase, table: str, columns: str = '*', key: Union[str, Tuple[str, ...]] = 'id',
+                    page_size: int = 1000, prefetch: bool = False,
+                    filters: Iterable[Tuple[str, str, object]] = (), after=None) -> Iterator[Dict]:
+    """כל השורות בטבלה לפי סדר המפתח - עמוד אחרי עמוד, כ-generator
+
+    key: עמודה, או כמה עמודות כמו ('updated_at', 'id') - keyset מורכב
+    filters: (אופרטור, עמודה, ערך) כמו ('eq', 'category_id', 3)
+    after: להתחיל אחרי ערך המפתח הזה (tuple במפתח מורכב)
+    prefetch: העמוד הבא נשלף ברקע בזמן שהצרכן מעבד את הנוכחי
+    """
+    keys = (key,) if isinstance(key, str) else tuple(key)
+    columns = _with_keys(columns, keys)
+    filters = list(filters)
+    page_size = max(1, page_size)
+
+    def position(row: Dict):
+        return row[keys[0]] if len(keys) == 1 else tuple(row[k] for k in keys)
+
+    def fetch(after):
+        query = supabase.table(table).select(columns)
+        for operator, column, value in filters:
+            query = getattr(query, operator)(column, value)
+        if after is not None:
+            query = query.gt(keys[0], after) if len(keys) == 1 else query.or_(_keyset_filter(keys, after))
+        for k in keys:
+            query = query.order(k)
+        return query.limit(page_size).execute().data or []
+
+    if not prefetch:
+        page = fetch(after)
+        while page:
+            yield from page
+            if len(page) < page_size:
+                return
+            page = fetch(position(page[-1]))
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page = fetch(after)
+        while page:
+            # המפתח האחרון ידוע מיד - העמוד הבא נשלף במקביל לעיבוד
+            upcoming = executor.submit(fetch, position(page[-1])) if len(page) == page_size else None
+            yield from page
+            page = upcoming.result() if upcoming else []
+
+def _keyset_filter(keys: Tuple[str, ...], after: Tuple) -> str:
+    """(a, b) > (x, y) כמסנן or_: a.gt.x,and(a.eq.x,b.gt.y)"""
+    conditions = []
+    for index, k in enumerate(keys):
+        parts = [f'{keys[i]}.eq.{_filter_value(after[i])}' for i in range(index)]
+        parts.append(f'{k}.gt.{_filter_value(after[index])}')
+        conditions.append(parts[0] if len(parts) == 1 else f'and({",".join(parts)})')
+    return ','.join(conditions)
+
+def _filter_value(value) -> str:
+    """ערך במחרוזת מסננים של postgrest - מחרוזות במרכאות (תאריכים עם נקודות ופסיקים)"""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '\\"') + '"'
+    return str(value)
+
+def _with_keys(columns: str, keys: Tuple[str, ...]) -> str:
+    """הוספת עמודות המפתח לבחירה אם חסרות - נדרשות ל-keyset"""
+    if columns.strip() == '*':
+        return columns
+
+    top_level = re.sub(r'\([^)]*\)', '', columns)
+    names = {name.strip() for name in top_level.split(',')}
+    if '*' in names:
+        return columns
+    missing = [k for k in keys if k not in names]
+    return f'{", ".join(missing)}, {columns.strip()}' if missing else columns
@@ -0,0 +1,108 @@
+"""
+parse_cache.py
+מטמון דיסק לדפי חיוב מפורסרים - לפי ה-SHA-256 של הקובץ וגרסת הפרסור
+"""
+import os
+import json
+from pathlib import Path
+from typing import List, Dict, Optional, Union
+import numpy as np
+from transaction_model import TransactionBatch
+from smart_parsers import PARSER_VERSION
+
+# גרסת מבנה קובץ המטמון - להעלות בכל שינוי בעמודות שנשמרות
+CACHE_FORMAT = 1
+
+class ParsedStatementCache:
+    """מטמון עמודתי (.npz) לעסקאות מפורסרות עם פינוי LRU לפי גודל"""
+
+    def __init__(self, folder: Path, max_bytes: int):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+
+    def _path(self, file_hash: str) -> Path:
+        # רשומות מגרסה קודמת של הפרסור לא נמצאות ומתפנות ב-LRU
+        return self.folder / f"{file_hash}-p{PARSER_VERSION}-f{CACHE_FORMAT}.npz"
+
+    def __contains__(self, file_hash: str) -> bool:
+        return self._path(file_hash).exists()
+
+    def get(self, file_hash: str) -> Optional[TransactionBatch]:
+        """שליפת עסקאות מהמטמון - None אם לא קיים"""
+        path = self._path(file_hash)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path) as data:
+                cards = data['card_last_four'].astype(object)
+                cards[cards == ''] = None
+
+                transactions = TransactionBatch(
+                    data['date'].astype('datetime64[us]'),
+                    data['business'].astype(object),
+                    data['amount'],
+                    data['company'].astype(object),
+                    cards,
+                    [json.loads(raw_data) for raw_data in data['raw_data'].tolist()]
+                )
+
+            # עדכון זמן גישה לצורך פינוי LRU
+            os.utime(path)
+
+        except Exception as e:
+            print(f"   ⚠️ שגיאה בקריאת מטמון: {e}")
+            return None
+
+        print(f"   ⚡ נטען מהמטמון: {len(transactions)} עסקאות")
+        return transactions
+
+    def put(self, file_hash: str, transactions: Union[TransactionBatch, List[Dict]]) -> bool:
+        """שמירת עסקאות למטמון בפורמט עמודתי"""
+        if not len(transactions):
+            return False
+
+        try:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            transactions = TransactionBatch.from_transactions(transactions)
+
+            columns = {
+                'date': transactions.dates.astype('datetime64[us]'),
+                'business': transactions.businesses.astype(str),
+                'amount': transactions.amounts,
+                'company': transactions.companies.astype(str),
+                'card_last_four': np.array([card or '' for card in transactions.cards], dtype=str),
+                'raw_data': np.array([
+                    json.dumps(raw_data, ensure_ascii=False, default=str)
+                    for raw_data in transactions.raw_records()
+                ], dtype=str)
+            }
+
+            # כתיבה לקובץ זמני והחלפה אטומית
+            path = self._path(file_hash)
+            temp_path = path.with_suffix('.tmp')
+            with open(temp_path, 'wb') as f:
+                np.savez_compressed(f, **columns)
+            os.replace(temp_path, path)
+
+            self._evict()
+            return True
+
+        except Exception as e:
+            print(f"   ⚠️ שגיאה בשמירת מטמון: {e}")
+            return False
+
+    def _evict(self):
+        """פינוי הקבצים שנגישו הכי מזמן עד שהמטמון חוזר לגודל המותר"""
+        entries = [(path, path.stat()) for path in self.folder.glob('*.npz')]
+        total_bytes = sum(stat.st_size for _, stat in entries)
+
+        for path, stat in sorted(entries, key=lambda entry: entry[1].st_mtime):
+            if total_bytes <= self.max_bytes:
+                break
+
+            try:
+                path.unlink()
+                total_bytes -= stat.st_size
+            except OSError:
+                pass
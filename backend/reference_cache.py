@@ -0,0 +1,205 @@
+"""
+reference_cache.py
+מטמון קטגוריות ועסקים מוכרים - מיפוי דו-כיווני, snapshot בדיסק לעלייה מהירה ורענון delta לפי updated_at
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from paged_reader import iter_table_rows
+
+# גרסת מבנה ה-snapshot - snapshot בגרסה אחרת נזרק
+SNAPSHOT_FORMAT = 1
+
+# קוד השגיאה של Postgres לעמודה שלא קיימת (undefined_column)
+UNDEFINED_COLUMN = '42703'
+
+# טבלה -> (עמודות, מפתח לעימוד)
+REFERENCE_TABLES = {
+    'categories': ('id, name', 'id'),
+    'known_businesses': ('normalized_name, category_id', 'normalized_name'),
+}
+
+class ReferenceCache:
+    """שם↔id של קטגוריות ושם מנורמל->קטגוריה של עסקים - כל שינוי מעלה את הגרסה"""
+
+    def __init__(self, supabase, snapshot_file: Optional[str] = None, page_size: int = 1000,
+                 prefetch: bool = False, source: str = ''):
+        self.supabase = supabase
+        self.snapshot_file = Path(snapshot_file) if snapshot_file else None
+        self.page_size = page_size
+        self.prefetch = prefetch
+        # snapshot של מסד אחר לא נטען
+        self.source = source
+        self.category_ids: Dict[str, int] = {}
+        self.category_names: Dict[int, str] = {}
+        self.businesses: Dict[str, int] = {}
+        self.watermarks: Dict[str, Optional[str]] = {table: None for table in REFERENCE_TABLES}
+        # טבלאות בלי עמודת updated_at נטענות במלואן בכל רענון
+        self.delta_supported = {table: True for table in REFERENCE_TABLES}
+        self.version = 0
+        self._saved_version = 0
+        # עדכונים מ-threads של בקשות וה-snapshot מטיימר הכתיבה - כל שינוי והעתקה למטמון תחת אותה נעילה
+        self.lock = threading.RLock()
+        # כתיבה אחת לקובץ הזמני בכל רגע
+        self._snapshot_lock = threading.Lock()
+
+    def load(self) -> bool:
+        """snapshot מהדיסק ואז רק השינויים מאז - או טעינה מלאה אם אין snapshot"""
+        warm = self._load_snapshot()
+        self.refresh(full=not warm)
+        return warm
+
+    def refresh(self, full: bool = False):
+        """רענון מהשרת - שורות שעודכנו מאז ה-watermark, או הכל (full, למשל אחרי מחיקות)"""
+        for table in REFERENCE_TABLES:
+            self._refresh_table(table, full)
+        self.save_snapshot()
+
+    def _refresh_table(self, table: str, full: bool):
+        columns, key = REFERENCE_TABLES[table]
+        watermark = None if full or not self.delta_supported[table] else self.watermarks[table]
+        filters = [('gte', 'updated_at', watermark)] if watermark else []
+
+        rows = None
+        if self.delta_supported[table]:
+            try:
+                rows = list(iter_table_rows(self.supabase, table, f'{columns}, updated_at', key,
+                                            self.page_size, self.prefetch, filters))
+            except Exception as e:
+                # רק עמודה חסרה מבטלת את ה-delta לצמיתות - שגיאת רשת וכו' עולה למעלה
+                if not _missing_column(e, 'updated_at'):
+                    raise
+                print(f"   ⚠️ אין updated_at ב-{table} ({e}) - טעינה מלאה בכל רענון")
+                self.delta_supported[table] = False
+
+        if rows is None:
+            watermark = None
+            rows = list(iter_table_rows(self.supabase, table, columns, key, self.page_size, self.prefetch))
+
+        with self.lock:
+            if not watermark:
+                self._clear(table)
+
+            for row in rows:
+                if table == 'categories':
+                    self.set_category(row['id'], row['name'])
+                else:
+                    self.set_business(row['normalized_name'], row['category_id'])
+
+            stamps = [row['updated_at'] for row in rows if row.get('updated_at')]
+            if stamps:
+                self.watermarks[table] = max(stamps + [self.watermarks[table] or ''])
+
+    def _clear(self, table: str):
+        if table == 'categories':
+            self.category_ids.clear()
+            self.category_names.clear()
+        else:
+            self.businesses.clear()
+        self.watermarks[table] = None
+        self.version += 1
+
+    # ==========================================
+    # עדכונים - מעלים את הגרסה
+    # ==========================================
+    def set_category(self, category_id: int, name: str):
+        with self.lock:
+            old_name = self.category_names.get(category_id)
+            if old_name == name:
+                return
+            if old_name is not None and self.category_ids.get(old_name) == category_id:
+                del self.category_ids[old_name]
+
+            self.category_ids[name] = category_id
+            self.category_names[category_id] = name
+            self.version += 1
+
+    def set_business(self, normalized_name: str, category_id: int):
+        with self.lock:
+            if normalized_name in self.businesses and self.businesses[normalized_name] == category_id:
+                return
+            self.businesses[normalized_name] = category_id
+            self.version += 1
+
+    def replace_categories(self, categories: Dict[str, int]):
+        """החלפת כל הקטגוריות (שם -> id)"""
+        with self.lock:
+            self.category_ids = dict(categories)
+            self.category_names = {category_id: name for name, category_id in categories.items()}
+            self.version += 1
+
+    def replace_businesses(self, businesses: Dict[str, int]):
+        with self.lock:
+            self.businesses = dict(businesses)
+            self.version += 1
+
+    def category_name(self, category_id: int, default: str = 'לא מוגדר') -> str:
+        return self.category_names.get(category_id, default)
+
+    # ==========================================
+    # snapshot בדיסק
+    # ==========================================
+    def save_snapshot(self) -> bool:
+        """כתיבה אטומית (קובץ זמני והחלפה) - רק אם משהו השתנה מאז השמירה האחרונה
+        העתק של המילונים נלקח תחת הנעילה, כך שעדכון במקביל לא משנה אותם באמצע הכתיבה"""
+        if not self.snapshot_file:
+            return False
+
+        with self._snapshot_lock:
+            with self.lock:
+                if self.version == self._saved_version:
+                    return False
+                snapshot = {
+                    'format': SNAPSHOT_FORMAT,
+                    'source': self.source,
+                    'version': self.version,
+                    'saved_at': datetime.now().isoformat(),
+                    'watermarks': dict(self.watermarks),
+                    'categories': [[category_id, name] for category_id, name in self.category_names.items()],
+                    'businesses': dict(self.businesses),
+                }
+
+            try:
+                self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+                temp_file = self.snapshot_file.with_suffix('.tmp')
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(temp_file, self.snapshot_file)
+                self._saved_version = snapshot['version']
+                return True
+            except (OSError, TypeError, ValueError) as e:
+                print(f"   ⚠️ לא ניתן לשמור snapshot של המטמון: {e}")
+                return False
+
+    def _load_snapshot(self) -> bool:
+        if not self.snapshot_file or not self.snapshot_file.exists():
+            return False
+
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"   ⚠️ snapshot פגום ({e}) - טעינה מלאה")
+            return False
+
+        if snapshot.get('format') != SNAPSHOT_FORMAT or snapshot.get('source') != self.source:
+            return False
+
+        with self.lock:
+            self.category_ids = {name: category_id for category_id, name in snapshot['categories']}
+            self.category_names = {category_id: name for category_id, name in snapshot['categories']}
+            self.businesses = dict(snapshot['businesses'])
+            self.watermarks.update(snapshot.get('watermarks') or {})
+            self.version = self._saved_version = snapshot.get('version', 0)
+        return True
+
+
+def _missing_column(error: Exception, column: str) -> bool:
+    """האם השגיאה היא "עמודה לא קיימת" על column (PostgREST מחזיר את קוד Postgres ב-code)"""
+    message = str(error)
+    if column not in message:
+        return False
+    return getattr(error, 'code', None) == UNDEFINED_COLUMN or 'does not exist' in message
@@ -0,0 +1,94 @@
+"""
+similarity_index.py
+אינדקס trigrams על שמות עסקים ייחודיים - מועמדים לפי trigrams משותפים ודירוג מדויק ב-SequenceMatcher
+"""
+import difflib
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+def trigrams(text: str) -> set:
+    """trigrams עם ריפוד בקצוות - גם שמות קצרים מקבלים כמה trigrams"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SimilarityIndex:
+    """שם עסק (באותיות קטנות) -> השמות המקוריים, ו-trigram -> שמות"""
+
+    def __init__(self, max_candidates: int = 200, refresh_seconds: float = 30):
+        # כמה מועמדים (עם הכי הרבה trigrams משותפים) מדורגים ב-SequenceMatcher
+        self.max_candidates = max_candidates
+        self.refresh_seconds = refresh_seconds
+        self.names: Dict[str, set] = {}
+        self.grams: Dict[str, set] = defaultdict(set)
+        # id העסקה האחרונה שנכנסה - רענון מצטבר מעבר לו
+        self.last_id = 0
+        self.refreshed_at = None
+        # שמות מקוריים שנוספו מאז השמירה האחרונה - רק הם נכתבים ליומן
+        self.unsaved_names = set()
+
+    def add(self, business_name: str):
+        """עסק חדש נכנס לאינדקס - עסק קיים לא משנה דבר"""
+        if not business_name:
+            return
+
+        key = business_name.lower()
+        originals = self.names.get(key)
+        if originals is None:
+            originals = self.names[key] = set()
+            for gram in trigrams(key):
+                self.grams[gram].add(key)
+
+        if business_name not in originals:
+            originals.add(business_name)
+            self.unsaved_names.add(business_name)
+
+    def add_row(self, row: Dict):
+        """שורת עסקה (id, business_name) - מקדמת את ה-watermark"""
+        self.add(row['business_name'])
+        self.last_id = max(self.last_id, row['id'])
+
+    def add_rows(self, rows: Iterable[Dict]) -> int:
+        added = 0
+        for row in rows:
+            self.add_row(row)
+            added += 1
+
+        self.mark_refreshed()
+        return added
+
+    def mark_refreshed(self):
+        self.refreshed_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.refresh_seconds
+
+    def search(self, business_name: str, threshold: float) -> List[Tuple[str, float]]:
+        """(שם, דמיון) לכל השמות עם דמיון >= threshold, מהדומה ביותר - בלי השם עצמו"""
+        query = business_name.lower()
+
+        shared = Counter()
+        for gram in trigrams(query):
+            for other in self.grams.get(gram, ()):
+                shared[other] += 1
+
+        results = []
+        matcher = difflib.SequenceMatcher(None, query)
+        for other, _ in shared.most_common(self.max_candidates):
+            if other == query:
+                continue
+
+            matcher.set_seq2(other)
+            # חסמים עליונים זולים לפני החישוב המלא
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+
+            similarity = matcher.ratio()
+            if similarity >= threshold:
+                results.append((other, similarity))
+
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results
+
+    def originals(self, key: str) -> List[str]:
+        return sorted(self.names[key])
@@ -3,108 +3,445 @@ smart_ai.py
 מערכת AI למידה חכמה לקטגוריזציה אוטומטית
 """
 import re
-import difflib
+import atexit
+import itertools
+import threading
+from pathlib import Path
 from collections import defaultdict, Counter
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Set
 from database_manager import FinancialDatabase
+from keyword_index import KeywordIndex
+from similarity_index import SimilarityIndex
+from naive_bayes import NaiveBayesCategorizer
+from model_store import ModelStore, RowLedger, LEDGER_NAME
+from config import AI_ENGINE, AI_MODEL_FOLDER, AI_MODEL_KEEP_VERSIONS, AI_MODEL_SAVE_SECONDS
 
 class SmartCategorizer:
-    def __init__(self, db: FinancialDatabase):
+    def __init__(self, db: FinancialDatabase, engine: str = AI_ENGINE, model_store: Optional[ModelStore] = None):
         self.db = db
-        self.business_patterns = {}
-        self.category_keywords = {}
-        self.amount_patterns = {}
+        # keywords - מילות מפתח לכל קטגוריה, naive_bayes - n-grams של תווים וסכום (חיזוי לאצווה)
+        self.engine = engine
+        self.naive_bayes = NaiveBayesCategorizer()
+        # גרסאות שמורות של המודל (תיקייה לכל מנוע) - הפעלה מהגרסה האחרונה במקום למידה מלאה
+        self.model_store = model_store or ModelStore(Path(AI_MODEL_FOLDER) / engine, AI_MODEL_KEEP_VERSIONS)
+        # מה שכל עסקה תרמה - ביומן לצד הגרסאות, כך שגרסה נשמרת בעלות של השינויים בלבד
+        self.ledger = RowLedger(self.model_store.folder / LEDGER_NAME)
+        self.model_version = None
+        # ערך השורות ביומן לפני שהשתנו מאז השמירה האחרונה (None - השורה לא נלמדה)
+        self._row_undo = {}
+        # learned_rows נטענו מהיומן - אחרת השמירה הבאה בונה את היומן מחדש
+        self._ledger_synced = False
+        # למידה, תיקונים ושמירה מכמה threads (טיימר השמירה, בקשות API)
+        self._model_lock = threading.RLock()
+        self._save_timer = None
+        self._reset_model()
+        # תיקון שעדיין ממתין לטיימר נשמר ביציאה
+        atexit.register(self.flush_model)
         
-    def learn_from_existing_data(self):
-        """למידה מכל הנתונים הקיימים"""
-        print("🧠 מתחיל למידה מהנתונים הקיימים...")
+    def learn_from_existing_data(self, incremental: bool = False):
+        """למידה מכל הנתונים הקיימים - או רק מעסקאות שנוספו או השתנו מאז הלמידה הקודמת (incremental)"""
+        with self._model_lock:
+            return self._learn_existing_data(incremental)
+    
+    def _learn_existing_data(self, incremental: bool) -> int:
+        incremental = incremental and self.last_learned_at is not None
+        if incremental:
+            print(f"🧠 לומד מעסקאות חדשות ומעודכנות (אחרי {self.last_learned_at})...")
+            after = (self.last_learned_at, self.last_learned_id)
+        else:
+            print("🧠 מתחיל למידה מהנתונים הקיימים...")
+            # היומן עדיין מכיל את השורות הקודמות - הגרסה הבאה שומרת רק את מה שבאמת השתנה
+            self._row_undo = {**self.learned_rows, **self._row_undo}
+            self._reset_model()
+            after = None
         
-        # שליפת כל העסקאות
-        result = self.db.supabase.table('transactions').select('''
+        # שליפת העסקאות בעמודים לפי (updated_at, id) - גם עסקאות ששונו, לא רק חדשות
+        transactions = self.db.iter_rows('transactions', '''
+            id,
+            updated_at,
             business_name, 
             normalized_business, 
             amount, 
             category_id,
             categories(name)
-        ''').execute()
-        
-        transactions = result.data
-        print(f"📊 נמצאו {len(transactions)} עסקאות ללמידה")
+        ''', key=('updated_at', 'id'), after=after)
         
-        # למידת תבניות
-        self._learn_business_patterns(transactions)
-        self._learn_category_keywords(transactions)
-        self._learn_amount_patterns(transactions)
+        transactions_count = self._learn_rows(self._advance_watermark(transactions), incremental)
         
         print("✅ למידה הושלמה!")
-        return len(transactions)
+        return transactions_count
+    
+    def _advance_watermark(self, transactions: Iterable[Dict]) -> Iterable[Dict]:
+        """כל עסקה מקדמת את ה-watermark ונכנסת לאינדקס העסקים הדומים"""
+        for t in transactions:
+            self.last_learned_at, self.last_learned_id = t['updated_at'], t['id']
+            self.similarity_index.add_row(t)
+            yield t
     
-    def _learn_business_patterns(self, transactions):
-        """למידת תבניות שמות עסקים"""
-        category_businesses = defaultdict(list)
+    def _learn_rows(self, transactions: Iterable[Dict], incremental: bool, quiet: bool = False) -> int:
+        """מעבר אחד שצובר מילים וסכומים לכל קטגוריה - עסקה שכבר נלמדה מורידה קודם את התרומה הקודמת שלה"""
+        # המילים שהמונים שלהן השתנו בכל קטגוריה, לפי סדר הופעתן
+        touched_words = defaultdict(dict)
+        # קטגוריות שעסקה יצאה מהן - הסכומים שלהן מחושבים מחדש
+        recount_amounts = set()
+        naive_bayes_added, naive_bayes_removed = [], []
+        transactions_count = 0
         
         for t in transactions:
-            if t['categories']:
-                category_name = t['categories']['name']
-                business_name = t['business_name'].lower()
-                category_businesses[category_name].append(business_name)
-        
-        # חילוץ מילות מפתח לכל קטגוריה
-        for category, businesses in category_businesses.items():
-            words = []
-            for business in businesses:
-                # חילוץ מילים (ללא מספרים וסימנים)
-                business_words = re.findall(r'[א-תa-z]{2,}', business)
-                words.extend(business_words)
+            transactions_count += 1
+            category_name = t['categories']['name'] if t['categories'] else None
+            current = (category_name, t['business_name'], t['amount'])
+            previous = self.learned_rows.get(t['id'])
+            if previous == current:
+                continue
+            
+            self._row_undo.setdefault(t['id'], previous)
+            if previous:
+                self._count_words(previous, -1, touched_words)
+                recount_amounts.add(previous[0])
+                naive_bayes_removed.append(previous)
+            
+            self.model_dirty = True
+            if category_name:
+                self.learned_rows[t['id']] = current
+                self._count_words(current, 1, touched_words)
+                self._add_amount(category_name, t['amount'])
+                naive_bayes_added.append(current)
+            else:
+                self.learned_rows.pop(t['id'], None)
+        
+        if not quiet:
+            print(f"📊 נמצאו {transactions_count} עסקאות ללמידה")
+        
+        # למידת תבניות - רק מה שהשתנה
+        self._recount_amounts(recount_amounts)
+        self._learn_business_patterns(touched_words, announce=not incremental and not quiet)
+        self._learn_category_keywords(touched_words)
+        self._learn_amount_patterns(touched_words.keys() | recount_amounts)
+        self.similarity_index.mark_refreshed()
+        if self.engine == 'naive_bayes':
+            # דוגמאות (שם, סכום, קטגוריה)
+            added = [(name, amount, category) for category, name, amount in naive_bayes_added]
+            removed = [(name, amount, category) for category, name, amount in naive_bayes_removed]
+            if incremental and self.naive_bayes.trained:
+                if removed:
+                    self.naive_bayes.add_batch(*zip(*removed), weight=-1)
+                if added:
+                    self.naive_bayes.add_batch(*zip(*added))
+            else:
+                self.naive_bayes.fit(added)
+                print(f"   🧮 naive Bayes: {len(self.naive_bayes.categories)} קטגוריות, "
+                      f"{len(self.naive_bayes.vocabulary)} n-grams (טמפרטורה {self.naive_bayes.temperature})")
+        
+        return transactions_count
+    
+    def _count_words(self, row: Tuple[str, str, Optional[float]], sign: int, touched_words: Dict[str, Dict[str, None]]):
+        """הוספה (1) או הורדה (-1) של מילות שם העסק במוני הקטגוריה"""
+        category, business_name, _ = row
+        # חילוץ מילים (ללא מספרים וסימנים)
+        words = re.findall(r'[א-תa-z]{2,}', business_name.lower())
+        if sign > 0:
+            self.word_counts[category].update(words)
+        else:
+            self.word_counts[category].subtract(words)
+        touched_words[category].update(dict.fromkeys(words))
+    
+    def warm_start(self) -> int:
+        """הפעלה מהגרסה השמורה ולמידה רק מעסקאות שנוספו או השתנו אחריה - גרסה חדשה נשמרת אם משהו השתנה"""
+        # מערכת שכבר למדה ממשיכה מהמודל שבזיכרון
+        if self.last_learned_at is None:
+            self.load_model()
+        transactions_count = self.learn_from_existing_data(incremental=True)
+        self.flush_model()
+        return transactions_count
+    
+    def schedule_save(self):
+        """שמירה מושהית - כל התיקונים שמגיעים בתוך AI_MODEL_SAVE_SECONDS נכנסים לגרסה אחת"""
+        with self._model_lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(AI_MODEL_SAVE_SECONDS, self.flush_model)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+    
+    def flush_model(self) -> Optional[Dict]:
+        """שמירת גרסה אם יש שינוי שלא נשמר - מהטיימר, אחרי אימון וביציאה"""
+        with self._model_lock:
+            if self.model_dirty:
+                return self.save_model()
+            return None
+    
+    def save_model(self) -> Optional[Dict]:
+        """שמירת המודל כגרסה חדשה - מונים מצטברים, (updated_at, id) של העסקה האחרונה שנלמדה,
+        והשורות שהשתנו מאז הגרסה הקודמת (לחזרה אחורה); היומן מתעדכן רק בשורות האלה"""
+        with self._model_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            
+            try:
+                # יומן שגרסה אחרת (תהליך אחר) קידמה חוזר קודם לגרסה שממנה המודל הזה נמשך
+                base = not self._ledger_synced or not self._move_ledger(self.model_version)
+                if base:
+                    changes, undo = dict(self.learned_rows), None
+                    names = [original for originals in self.similarity_index.names.values() for original in originals]
+                else:
+                    changes = {row_id: self.learned_rows.get(row_id) for row_id, before in self._row_undo.items()
+                               if self.learned_rows.get(row_id) != before}
+                    undo = {row_id: self._row_undo[row_id] for row_id in changes}
+                    names = self.similarity_index.unsaved_names
+                
+                naive_bayes_state, naive_bayes_arrays = self.naive_bayes.export_state()
+                state = {
+                    'engine': self.engine,
+                    'last_learned_id': self.last_learned_id,
+                    'last_learned_at': self.last_learned_at,
+                    'business_patterns': self.business_patterns,
+                    'category_keywords': self.category_keywords,
+                    'amount_patterns': self.amount_patterns,
+                    'word_counts': {category: dict(counts) for category, counts in self.word_counts.items()},
+                    'amount_totals': self.amount_totals,
+                    # None - גרסת בסיס: היומן נבנה בה מחדש ואי אפשר לעבור דרכה
+                    'row_changes': None if base else {'redo': _pack_rows(changes), 'undo': _pack_rows(undo)},
+                    'naive_bayes': naive_bayes_state
+                }
+                arrays = {f'naive_bayes_{name}': array for name, array in naive_bayes_arrays.items()}
+                
+                entry = self.model_store.save(state, arrays, watermark=[self.last_learned_at, self.last_learned_id],
+                                              parent=None if base else self.model_version)
+                self.ledger.apply(changes, names, entry['version'], self.similarity_index.last_id, replace=base)
+                
+                self.similarity_index.unsaved_names = set()
+                self._row_undo = {}
+                self._ledger_synced = True
+                self.model_version = entry['version']
+                self.model_dirty = False
+                print(f"💾 מודל נשמר: גרסה {entry['version']} (עד עסקה {self.last_learned_id}, "
+                      f"{len(changes)} שורות השתנו)")
+                return entry
+                
+            except Exception as e:
+                print(f"⚠️ שגיאה בשמירת המודל: {e}")
+                return None
+    
+    def load_model(self, version: Optional[int] = None) -> bool:
+        """טעינת הגרסה הפעילה (או version) - אם הטעינה נכשלת המודל הנוכחי נשאר כמו שהוא"""
+        with self._model_lock:
+            try:
+                loaded = self.model_store.load(version)
+                if loaded is None:
+                    return False
+                
+                state, arrays, entry = loaded
+                if state['engine'] != self.engine:
+                    print(f"⚠️ גרסה {entry['version']} אומנה במנוע {state['engine']} - לא נטענת")
+                    return False
+                
+                # השורות שנלמדו כפי שהיו בגרסה - מהיומן, אחרי ביטול/החלת השינויים שבדרך אליה
+                ledger_path = self._ledger_path(entry['version'])
+                if ledger_path is None:
+                    print(f"⚠️ יומן השורות לא תואם לגרסה {entry['version']} - נדרשת למידה מלאה")
+                    return False
+                learned_rows, ledger_changes = ledger_path
+                
+                # בנייה מלאה בצד - המודל הנוכחי מוחלף רק אחרי שהכל נטען
+                category_keywords = state['category_keywords']
+                keyword_index = KeywordIndex()
+                keyword_index.build(category_keywords)
+                similarity_index = SimilarityIndex()
+                for original in self.ledger.names():
+                    similarity_index.add(original)
+                similarity_index.unsaved_names = set()
+                similarity_index.last_id = self.ledger.similar_last_id
+                naive_bayes = NaiveBayesCategorizer()
+                naive_bayes.load_state(state['naive_bayes'], {
+                    name[len('naive_bayes_'):]: array for name, array in arrays.items() if name.startswith('naive_bayes_')
+                })
+                word_counts = defaultdict(Counter, {category: Counter(counts) for category, counts in state['word_counts'].items()})
+                
+                if self.ledger.version != entry['version']:
+                    self.ledger.apply(ledger_changes, [], entry['version'], similarity_index.last_id)
+                
+                self.business_patterns = state['business_patterns']
+                self.category_keywords = category_keywords
+                self.amount_patterns = state['amount_patterns']
+                self.word_counts = word_counts
+                self.amount_totals = state['amount_totals']
+                self.keyword_index = keyword_index
+                self.similarity_index = similarity_index
+                self.naive_bayes = naive_bayes
+                self.learned_rows = learned_rows
+                self.last_learned_id = state['last_learned_id']
+                self.last_learned_at = state['last_learned_at']
+                self.model_version = entry['version']
+                self._row_undo = {}
+                self._ledger_synced = True
+                self.model_dirty = False
+                
+                print(f"📦 מודל נטען: גרסה {entry['version']} (עד עסקה {self.last_learned_id})")
+                return True
+                
+            except Exception as e:
+                print(f"⚠️ שגיאה בטעינת המודל: {e}")
+                return False
+    
+    def _ledger_path(self, version: int) -> Optional[Tuple[Dict[int, Tuple], Dict[int, Optional[Tuple]]]]:
+        """השורות שנלמדו כפי שהיו בגרסה version, והשינויים מהיומן הנוכחי - None אם אין דרך אליה"""
+        rows = self.ledger.rows()
+        if self.ledger.version == version:
+            return rows, {}
+        
+        path = self.model_store.change_path(self.ledger.version, version)
+        if path is None:
+            return None
+        
+        changes = {}
+        for direction, versions in (('undo', path[0]), ('redo', path[1])):
+            for step in versions:
+                loaded = self.model_store.load(step)
+                row_changes = loaded[0].get('row_changes') if loaded else None
+                if row_changes is None:
+                    return None
+                for row_id, row in _unpack_rows(row_changes[direction]).items():
+                    changes[row_id] = row
+                    if row is None:
+                        rows.pop(row_id, None)
+                    else:
+                        rows[row_id] = row
+        
+        return rows, changes
+    
+    def _move_ledger(self, version: Optional[int]) -> bool:
+        """היומן חוזר לגרסה version (אם תהליך אחר שמר גרסה בינתיים) - False אם אין דרך"""
+        if version is None:
+            return False
+        if self.ledger.version == version:
+            return True
+        
+        ledger_path = self._ledger_path(version)
+        if ledger_path is None:
+            return False
+        self.ledger.apply(ledger_path[1], [], version, self.ledger.similar_last_id)
+        return True
+    
+    def rollback_model(self, version: Optional[int] = None) -> Optional[Dict]:
+        """חזרה לגרסה הקודמת (או ל-version) - הגרסה נטענת קודם, ורק אז הופכת לפעילה"""
+        with self._model_lock:
+            entry = self.model_store.rollback_target(version)
+            if entry is None or not self.load_model(entry['version']):
+                return None
+            
+            self.model_store.activate(entry['version'])
+            return entry
+    
+    def _reset_model(self):
+        """איפוס כל מה שנלמד - לפני למידה מלאה"""
+        self.business_patterns = {}
+        self.category_keywords = {}
+        self.amount_patterns = {}
+        # מונים מלאים (גם מתחת לסף) וסכומים מצטברים - הבסיס ללמידה מצטברת
+        self.word_counts = defaultdict(Counter)
+        self.amount_totals = {}
+        # אינדקס הפוך על category_keywords - מתעדכן בכל למידה ותיקון
+        self.keyword_index = KeywordIndex()
+        # שמות עסקים ייחודיים לחיפוש עסקים דומים - מתעדכן מעסקאות חדשות
+        self.similarity_index = SimilarityIndex()
+        # מה שכל עסקה תרמה (קטגוריה, שם, סכום) - עסקה שהשתנתה מורידה אותו לפני שהגרסה החדשה נספרת
+        self.learned_rows = {}
+        # (updated_at, id) של העסקה האחרונה שנלמדה - למידה מצטברת ממנה והלאה
+        self.last_learned_at = None
+        self.last_learned_id = 0
+        # שינוי שעדיין לא נשמר כגרסה (למידה או תיקון)
+        self.model_dirty = False
+    
+    def _learn_business_patterns(self, touched_words: Dict[str, Dict[str, None]], announce: bool = True):
+        """למידת תבניות שמות עסקים - מילים שעברו את סף ההופעות נכנסות למילות המפתח"""
+        for category, words in touched_words.items():
+            counts = self.word_counts[category]
             
-            # ספירת מילים נפוצות
-            word_counts = Counter(words)
             # שמירת המילים הנפוצות ביותר (מעל 2 הופעות)
-            common_words = {word: count for word, count in word_counts.items() if count >= 2}
+            for word in words:
+                if counts[word] >= 2:
+                    self.category_keywords.setdefault(category, {})[word] = counts[word]
+                    self.keyword_index.set_weight(category, word, counts[word])
+                else:
+                    # מילה שירדה מתחת לסף אחרי שעסקה עברה קטגוריה
+                    if counts[word] <= 0:
+                        del counts[word]
+                    keywords = self.category_keywords.get(category)
+                    if keywords is not None and word in keywords:
+                        del keywords[word]
+                        self.keyword_index.remove(category, word)
+                        if not keywords:
+                            del self.category_keywords[category]
             
-            if common_words:
-                self.category_keywords[category] = common_words
-                print(f"   📝 {category}: {list(common_words.keys())[:5]}")
+            if announce and category in self.category_keywords:
+                print(f"   📝 {category}: {list(self.category_keywords[category].keys())[:5]}")
     
-    def _learn_category_keywords(self, transactions):
+    def _learn_category_keywords(self, touched_words: Dict[str, Dict[str, None]]):
         """למידת מילות מפתח לקטגוריות"""
         # זה כבר נעשה ב-_learn_business_patterns
         pass
     
-    def _learn_amount_patterns(self, transactions):
-        """למידת תבניות סכומים"""
-        category_amounts = defaultdict(list)
+    def _add_amount(self, category: str, amount: Optional[float]):
+        """צבירת סכום לקטגוריה - מספר, סכום, מינימום ומקסימום"""
+        if amount is None:
+            return
         
-        for t in transactions:
-            if t['categories']:
-                category_name = t['categories']['name']
-                category_amounts[category_name].append(t['amount'])
+        totals = self.amount_totals.setdefault(category, {'count': 0, 'sum': 0, 'min': amount, 'max': amount})
+        totals['count'] += 1
+        totals['sum'] += amount
+        totals['min'] = min(totals['min'], amount)
+        totals['max'] = max(totals['max'], amount)
+    
+    def _recount_amounts(self, categories: Set[str]):
+        """סכומי הקטגוריות מחדש מהעסקאות שנלמדו - מינימום ומקסימום לא ניתנים להורדה"""
+        if not categories:
+            return
         
+        for category in categories:
+            self.amount_totals.pop(category, None)
+        for category, _, amount in self.learned_rows.values():
+            if category in categories:
+                self._add_amount(category, amount)
+    
+    def _learn_amount_patterns(self, categories: Iterable[str]):
+        """למידת תבניות סכומים - מהסכומים המצטברים של הקטגוריות שהשתנו"""
         # חישוב ממוצע וטווח לכל קטגוריה
-        for category, amounts in category_amounts.items():
-            avg_amount = sum(amounts) / len(amounts)
-            min_amount = min(amounts)
-            max_amount = max(amounts)
+        for category in categories:
+            totals = self.amount_totals.get(category)
+            if not totals:
+                self.amount_patterns.pop(category, None)
+                continue
             
             self.amount_patterns[category] = {
-                'avg': avg_amount,
-                'min': min_amount,
-                'max': max_amount,
-                'count': len(amounts)
+                'avg': totals['sum'] / totals['count'],
+                'min': totals['min'],
+                'max': totals['max'],
+                'count': totals['count']
             }
     
     def suggest_category(self, business_name: str, amount: float) -> Tuple[str, float]:
         """הצעת קטגוריה לעסק חדש"""
+        if self.engine == 'naive_bayes' and self.naive_bayes.trained:
+            category, confidence = self.naive_bayes.predict(business_name, amount)
+            # שם שהמודל לא מכיר - מילות המפתח מחליטות
+            if category is not None:
+                return category, min(confidence, 0.95)  # מקסימום 95%
+        
+        return self._suggest_by_keywords(business_name, amount)
+    
+    def _suggest_by_keywords(self, business_name: str, amount: float) -> Tuple[str, float]:
+        """ניקוד לפי מילות המפתח הנלמדות ותבניות הסכומים"""
         business_lower = business_name.lower()
         scores = {}
         
-        # ניקוד לפי מילות מפתח
-        for category, keywords in self.category_keywords.items():
+        # ניקוד לפי מילות מפתח - רק המילים שמופיעות בשם, דרך האינדקס
+        matches = self.keyword_index.match(business_lower)
+        for category in self.category_keywords:
             score = 0
-            for keyword, frequency in keywords.items():
-                if keyword in business_lower:
-                    # ניקוד גבוה יותר למילים נפוצות יותר
-                    score += frequency * 0.1
+            for frequency in matches.get(category, ()):
+                # ניקוד גבוה יותר למילים נפוצות יותר
+                score += frequency * 0.1
             scores[category] = score
         
         # ניקוד לפי סכום (בונוס קטן)
@@ -123,24 +460,34 @@ class SmartCategorizer:
         
         return 'שונות', 0.3
     
-    def find_similar_businesses(self, business_name: str, threshold: float = 0.7) -> List[Dict]:
-        """מציאת עסקים דומים"""
-        business_lower = business_name.lower()
+    def suggest_categories(self, business_names: List[str], amounts: List[float]) -> List[Tuple[str, float]]:
+        """הצעות לאצווה - במנוע naive_bayes כל האצווה בחישוב אחד"""
+        if self.engine == 'naive_bayes' and self.naive_bayes.trained:
+            categories, confidences = self.naive_bayes.predict_batch(business_names, amounts)
+            return [(category, min(float(confidence), 0.95)) if category is not None
+                    else self._suggest_by_keywords(name, amount)
+                    for name, amount, category, confidence in zip(business_names, amounts, categories, confidences)]
         
-        # שליפת כל העסקים
-        result = self.db.supabase.table('transactions').select('''
-            id, business_name, normalized_business, category_id,
-            categories(name, color)
-        ''').execute()
+        return [self.suggest_category(name, amount) for name, amount in zip(business_names, amounts)]
+    
+    def find_similar_businesses(self, business_name: str, threshold: float = 0.7) -> List[Dict]:
+        """מציאת עסקים דומים - שמות מהאינדקס, ועסקאות רק לשמות שנמצאו"""
+        self._refresh_similarity_index()
+        hits = self.similarity_index.search(business_name, threshold)
         
         similar = []
-        for transaction in result.data:
-            other_business = transaction['business_name'].lower()
+        # שמות באותו דמיון - לפי סדר העסקאות ביניהם, עד 10 תוצאות
+        for similarity, group in itertools.groupby(hits, key=lambda hit: hit[1]):
+            remaining = 10 - len(similar)  # מקסימום 10 תוצאות
+            if remaining <= 0:
+                break
             
-            # חישוב דמיון
-            similarity = difflib.SequenceMatcher(None, business_lower, other_business).ratio()
+            names = [original for name, _ in group for original in self.similarity_index.originals(name)]
+            result = self.db.supabase.table('transactions').select('''
+                id, business_name, categories(name)
+            ''').in_('business_name', names).order('id').limit(remaining).execute()
             
-            if similarity >= threshold and business_lower != other_business:
+            for transaction in result.data:
                 similar.append({
                     'id': transaction['id'],
                     'business_name': transaction['business_name'],
@@ -148,9 +495,14 @@ class SmartCategorizer:
                     'current_category': transaction['categories']['name'] if transaction['categories'] else None
                 })
         
-        # מיון לפי דמיון
-        similar.sort(key=lambda x: x['similarity'], reverse=True)
-        return similar[:10]  # מקסימום 10 תוצאות
+        return similar
+    
+    def _refresh_similarity_index(self):
+        """עסקאות שנוספו מאז ה-id האחרון באינדקס - לכל היותר פעם ב-refresh_seconds"""
+        index = self.similarity_index
+        if index.is_stale():
+            index.add_rows(self.db.iter_rows('transactions', 'id, business_name',
+                                             filters=[('gt', 'id', index.last_id)]))
     
     def update_similar_businesses(self, business_name: str, new_category_id: int, threshold: float = 0.8):
         """עדכון עסקים דומים לקטגוריה חדשה"""
@@ -168,15 +520,37 @@ class SmartCategorizer:
                 except Exception as e:
                     print(f"   ⚠️ שגיאה בעדכון {similar_business['business_name']}: {e}")
         
+        # עדכון שלא עובר דרך record_transactions - הסטטיסטיקות נטענות מחדש
+        if updated_count:
+            self.db.stats_cache.invalidate()
+        
         return updated_count
     
-    def retrain_on_correction(self, business_name: str, old_category: str, new_category: str):
-        """למידה מתיקון משתמש"""
+    def retrain_on_correction(self, business_name: str, old_category: str, new_category: str,
+                              transaction_id: Optional[int] = None, amount: Optional[float] = None):
+        """למידה מתיקון משתמש - נשמר בגרסה הבאה יחד עם שאר התיקונים (schedule_save)"""
+        with self._model_lock:
+            self._retrain_on_correction(business_name, old_category, new_category, transaction_id, amount)
+        self.schedule_save()
+    
+    def _retrain_on_correction(self, business_name: str, old_category: str, new_category: str,
+                               transaction_id: Optional[int], amount: Optional[float]):
         print(f"📚 לומד מתיקון: {business_name} מ-{old_category} ל-{new_category}")
         
         # הוספת המילים מהעסק לקטגוריה החדשה
         business_words = re.findall(r'[א-תa-z]{2,}', business_name.lower())
         
+        # העסקה עצמה עוברת קטגוריה במונים, במילות המפתח, באינדקס וב-naive Bayes - כמו שורה ששונתה,
+        # כך שכשהשורה המעודכנת תגיע בלמידה מצטברת היא לא תיספר פעמיים. המונים הם המקור היחיד -
+        # ה-+1/-1 הישן למטה היה מתקן את אותה שורה פעם שנייה
+        if transaction_id is not None:
+            self._learn_rows([{'id': transaction_id, 'business_name': business_name, 'amount': amount,
+                               'categories': {'name': new_category}}], incremental=True, quiet=True)
+            self.model_dirty = True
+            print(f"   ✅ התיקון נלמד ({len(business_words)} מילים)")
+            return
+        
+        # בלי מזהה עסקה - תיקון ישיר של משקלי מילות המפתח
         if new_category not in self.category_keywords:
             self.category_keywords[new_category] = {}
         
@@ -194,19 +568,23 @@ class SmartCategorizer:
                         self.category_keywords[old_category][word] - 1, 0
                     )
         
+        # עדכון מצטבר של האינדקס - רק המשקלים שהשתנו
+        for category in {new_category, old_category} & self.category_keywords.keys():
+            for word in business_words:
+                if word in self.category_keywords[category]:
+                    self.keyword_index.set_weight(category, word, self.category_keywords[category][word])
+        
+        # התיקון נשמר בגרסה הבאה - הפעלה מחדש לא חוזרת למודל שלפניו
+        self.model_dirty = True
         print(f"   ✅ נלמדו {len(business_words)} מילות מפתח חדשות")
     
-    def bulk_retrain_all(self):
-        """אימון מחדש על כל הנתונים"""
-        print("🔄 מתחיל אימון מחדש על כל הנתונים...")
+    def bulk_retrain_all(self, full: bool = False):
+        """אימון על הנתונים - מצטבר (עסקאות חדשות ומעודכנות) מאז הלמידה הקודמת, או מאפס (full) אחרי מחיקת עסקאות"""
+        print("🔄 מתחיל אימון מחדש על כל הנתונים..." if full else "🔄 מעדכן את הלמידה מעסקאות חדשות ומעודכנות...")
         
-        # איפוס ידע קיים
-        self.business_patterns = {}
-        self.category_keywords = {}
-        self.amount_patterns = {}
-        
-        # למידה מחדש
-        transactions_count = self.learn_from_existing_data()
+        # למידה - מחדש או רק מה שנוסף
+        transactions_count = self.learn_from_existing_data(incremental=not full)
+        self.flush_model()
         
         # הצעות שיפור אוטומטיות
         suggestions = self.get_improvement_suggestions()
@@ -215,7 +593,8 @@ class SmartCategorizer:
             'transactions_processed': transactions_count,
             'suggestions_count': len(suggestions),
             'categories_learned': len(self.category_keywords),
-            'keywords_total': sum(len(words) for words in self.category_keywords.values())
+            'keywords_total': sum(len(words) for words in self.category_keywords.values()),
+            'model_version': self.model_version
         }
     
     def get_improvement_suggestions(self, limit: int = 20) -> List[Dict]:
@@ -228,13 +607,13 @@ class SmartCategorizer:
             categories(name, color)
         ''').lt('confidence_score', 0.7).limit(limit).execute()
         
-        for transaction in result.data:
-            # הצעת קטגוריה חדשה
-            suggested_category, confidence = self.suggest_category(
-                transaction['business_name'], 
-                transaction['amount']
-            )
-            
+        # הצעות לכל העסקאות בבת אחת
+        suggested = self.suggest_categories(
+            [transaction['business_name'] for transaction in result.data],
+            [transaction['amount'] for transaction in result.data]
+        )
+        
+        for transaction, (suggested_category, confidence) in zip(result.data, suggested):
             current_category = transaction['categories']['name'] if transaction['categories'] else 'לא מוגדר'
             
             # רק אם ההצעה שונה מהנוכחית ויש ביטחון גבוה
@@ -252,21 +631,28 @@ class SmartCategorizer:
     
     def get_stats(self) -> Dict:
         """סטטיסטיקות AI"""
-        # ספירת עסקאות לפי רמת ביטחון
-        high_confidence = self.db.supabase.table('transactions').select('id').gte('confidence_score', 0.8).execute()
-        medium_confidence = self.db.supabase.table('transactions').select('id').gte('confidence_score', 0.5).lt('confidence_score', 0.8).execute()
-        low_confidence = self.db.supabase.table('transactions').select('id').lt('confidence_score', 0.5).execute()
+        # ספירת עסקאות לפי רמת ביטחון - מהסטטיסטיקות המצטברות
+        db_stats = self.db.stats_cache.get()
         
         return {
             'total_categories': len(self.category_keywords),
             'total_keywords': sum(len(words) for words in self.category_keywords.values()),
-            'high_confidence_transactions': len(high_confidence.data),
-            'medium_confidence_transactions': len(medium_confidence.data),
-            'low_confidence_transactions': len(low_confidence.data),
-            'learned_patterns': len(self.amount_patterns)
+            'high_confidence_transactions': db_stats.get('high_confidence', 0),
+            'medium_confidence_transactions': db_stats.get('medium_confidence', 0),
+            'low_confidence_transactions': db_stats.get('low_confidence', 0),
+            'learned_patterns': len(self.amount_patterns),
+            'engine': self.engine,
+            'model_version': self.model_version
         }
 
 
+def _pack_rows(rows: Dict[int, Optional[Tuple]]) -> List[List]:
+    """{id: (category, business_name, amount) או None} -> רשימה ל-JSON ([id] לשורה שלא נלמדה)"""
+    return [[row_id] if row is None else [row_id, *row] for row_id, row in rows.items()]
+
+def _unpack_rows(packed: List[List]) -> Dict[int, Optional[Tuple]]:
+    return {row[0]: tuple(row[1:]) if len(row) > 1 else None for row in packed}
+
 def main():
     """בדיקת המערכת"""
     # ייבוא הגדרות מרכזיות
@@ -1,186 +1,336 @@
 """
 smart_parsers.py - פרסר מושלם על בסיס ניתוח 3 חברות האשראי
 """
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterator, Iterable
+from itertools import islice
 import re
+from transaction_model import Transaction, TransactionBatch
+from issuer_layouts import IssuerLayout, ISRACARD_LAYOUT, DINERS_CAL_LAYOUT, COLUMN_ROLE_KEYWORDS
+from issuer_layouts import detect_company_from_filename, resolve_layout
 
-def parse_file(filepath) -> List[Dict]:
-    """פונקציה ראשית לפרסור קובץ - נקודת כניסה יחידה"""
-    company = detect_company_from_filename(filepath.name)
-    print(f"   🏢 חברה: {company}")
-    
-    try:
-        df = pd.read_excel(filepath)
-        
-        if df.empty:
-            print(f"   ⚠️ הקובץ ריק")
-            return []
-        
-        print(f"   📊 נטען קובץ עם {len(df)} שורות ו-{len(df.columns)} עמודות")
-        
-        # בחירת אסטרטגיית פרסור לפי חברה
-        if company == 'ישראכרט':
-            return parse_isracard(df, company)
-        else:  # דיינרס או כאל
-            return parse_diners_cal(df, company)
-            
-    except Exception as e:
-        print(f"   ❌ שגיאה בפרסור: {e}")
-        return []
+# גרסת הפרסור - להעלות בכל שינוי בפרסרים או במבני החברות שמשנה את התוצאה (מבטל את מטמון הפרסור)
+PARSER_VERSION = 1
+
+# מילות מפתח לזיהוי שורת כותרות
+HEADER_KEYWORDS = ['תאריך', 'שם', 'עסק', 'סכום', 'חיוב']
+
+# פורמטים מועמדים להסקה - לפי סדר עדיפות (יום לפני חודש, כמו בדפי החיוב)
+DATE_FORMAT_CANDIDATES = ['%d.%m.%y', '%d.%m.%Y', '%d/%m/%y', '%d/%m/%Y', '%d-%m-%Y',
+                          '%Y-%m-%d', '%Y-%m-%d %H:%M:%S']
+
+# מספר הערכים שנבדקים בהסקת פורמט
+DATE_SAMPLE_SIZE = 50
+
+# פורמטים שהוסקו לכל מבנה - נשמרים בין קבצים
+_inferred_date_formats: Dict[str, str] = {}
 
-def parse_isracard(df: pd.DataFrame, company: str) -> List[Dict]:
-    """פרסר ייעודי לישראכרט - 2 קבוצות נתונים"""
+def parse_layout(df: pd.DataFrame, layout: IssuerLayout, company: str) -> TransactionBatch:
+    """פרסור גיליון לפי מבנה רשום - כל הקטעים (כרטיס לכל קבוצה בישראכרט)"""
+    
+    # זיהוי כל הקטעים בסריקה אחת, ובהיעדר כותרות - השורות הקבועות של המבנה
+    sections = detect_sections(df, layout.stop_at_blank, layout.columns, layout.column_keywords)
+    if not sections:
+        header_rows = [row for row in layout.header_rows if row < len(df)]
+        if not header_rows:
+            print(f"   ❌ שורת הכותרות לא נמצאה")
+            return TransactionBatch.empty()
+        
+        stop_mask = None
+        if layout.stop_at_blank:
+            stop_mask = _group_stop_mask(df)
+            stop_mask[header_rows] = True  # קבוצות לא חופפות
+        sections = [_fixed_section(df, header_row, layout.columns, stop_mask) for header_row in header_rows]
     
-    transactions = []
+    transactions = TransactionBatch.concat([
+        _parse_section(df, section, f"{layout.section_label} {section_idx}", company, layout)
+        for section_idx, section in enumerate(sections, 1)
+    ])
     
-    # קבוצה 1: שורה 9
-    group1 = parse_isracard_group(df, 8, "קבוצה 1", company)  # שורה 9 = אינדקס 8
-    transactions.extend(group1)
+    print(f"   ✅ נמצאו {len(transactions)} עסקאות")
+    return transactions
+
+def parse_isracard(df: pd.DataFrame, company: str) -> TransactionBatch:
+    """פרסר ייעודי לישראכרט - כל קבוצות הנתונים (כרטיס לכל קבוצה)"""
+    return parse_layout(df, ISRACARD_LAYOUT, company)
+
+def parse_isracard_group(df: pd.DataFrame, header_row: int, group_name: str, company: str,
+                         stop_mask: Optional[np.ndarray] = None) -> TransactionBatch:
+    """פרסור קבוצת נתונים אחת של ישראכרט לפי שורת כותרות ידועה"""
     
-    # קבוצה 2: שורה 26  
-    group2 = parse_isracard_group(df, 25, "קבוצה 2", company)  # שורה 26 = אינדקס 25
-    transactions.extend(group2)
+    if stop_mask is None:
+        stop_mask = _group_stop_mask(df)
     
-    print(f"   ✅ סה\"כ עסקאות ישראכרט: {len(transactions)}")
-    return transactions
+    section = _fixed_section(df, header_row, ISRACARD_LAYOUT.columns, stop_mask)
+    return _parse_section(df, section, group_name, company, ISRACARD_LAYOUT)
+
+def parse_diners_cal(df: pd.DataFrame, company: str) -> TransactionBatch:
+    """פרסר ייעודי לדיינרס וכאל - מבנה פשוט"""
+    return parse_layout(df, DINERS_CAL_LAYOUT, company)
 
-def parse_isracard_group(df: pd.DataFrame, header_row: int, group_name: str, company: str) -> List[Dict]:
-    """פרסור קבוצת נתונים אחת של ישראכרט"""
+def detect_sections(df: pd.DataFrame, stop_at_blank: bool = True,
+                    default_columns: Tuple[int, int, int] = DINERS_CAL_LAYOUT.columns,
+                    column_keywords: Dict[str, List[str]] = COLUMN_ROLE_KEYWORDS) -> List[Dict]:
+    """סריקה אחת של הגיליון - כל שורות הכותרות, גבולות הקטעים ומיפוי עמודות לכל קטע"""
+    text = _sheet_text(df)
+    header_score = _header_scores(text)
+    
+    # קטע נגמר בכותרת הבאה, ובמבנה קבוצות גם בשורה ריקה ברובה
+    stop_mask = header_score >= 3
+    if stop_at_blank:
+        stop_mask |= _non_empty_counts(df, text) < 3
+    
+    # שמות העמודות עצמם יכולים להיות שורת הכותרות
+    header_rows = list(np.flatnonzero(header_score >= 3))
+    column_names = [str(name).lower().strip() for name in df.columns]
+    if _header_score(column_names) >= 3:
+        header_rows.insert(0, -1)
+    
+    sections = []
+    for header_row in header_rows:
+        start = int(header_row) + 1
+        end = _group_end(stop_mask, start)
+        if end <= start:
+            continue
+        
+        header_cells = column_names if header_row < 0 else text[header_row]
+        sections.append({
+            'header_row': int(header_row),
+            'start': start,
+            'end': end,
+            'columns': map_columns(header_cells, default_columns, column_keywords)
+        })
+    
+    return sections
+
+def map_columns(header_cells: List[str], default_columns: Tuple[int, int, int],
+                column_keywords: Dict[str, List[str]] = COLUMN_ROLE_KEYWORDS) -> Dict[str, int]:
+    """מיפוי תפקידי עמודות (תאריך/עסק/סכום) לפי תאי שורת הכותרות"""
+    defaults = dict(zip(('date', 'business', 'amount'), default_columns))
+    columns = {}
+    
+    for role, keywords in column_keywords.items():
+        for keyword in keywords:
+            matches = [col for col, cell in enumerate(header_cells)
+                       if isinstance(cell, str) and keyword in cell and col not in columns.values()]
+            if matches:
+                columns[role] = matches[0]
+                break
+        else:
+            columns[role] = defaults[role]
     
-    if header_row >= len(df):
-        return []
+    return columns
+
+def _fixed_section(df: pd.DataFrame, header_row: int, default_columns: Tuple[int, int, int],
+                   stop_mask: Optional[np.ndarray] = None) -> Dict:
+    """קטע בשורת כותרות קבועה - לקבצים שבהם הכותרות לא זוהו"""
+    start = header_row + 1
+    end = _group_end(stop_mask, start) if stop_mask is not None else len(df)
+    
+    return {
+        'header_row': header_row,
+        'start': min(start, len(df)),
+        'end': max(min(end, len(df)), min(start, len(df))),
+        'columns': dict(zip(('date', 'business', 'amount'), default_columns))
+    }
+
+def _parse_section(df: pd.DataFrame, section: Dict, section_name: str, company: str, layout: IssuerLayout) -> TransactionBatch:
+    """פרסור קטע אחד - עיבוד עמודתי של כל השורות בבת אחת"""
     
-    print(f"   📋 מעבד {group_name} (שורת כותרות {header_row + 1})")
+    if section['start'] >= len(df):
+        return TransactionBatch.empty()
     
-    # עמודות קבועות לישראכרט
-    date_col = 0  # תאריך רכישה
-    business_col = 1  # שם בית עסק
-    amount_col = 4  # סכום חיוב
+    print(f"   📋 מעבד {section_name} (שורת כותרות {section['header_row'] + 1})")
     
-    transactions = []
-    data_start = header_row + 1
+    columns = section['columns']
+    data = df.iloc[section['start']:section['end']]
     
-    # עיבוד נתונים עד שנגמרים או נמצאת כותרת חדשה
-    for row_idx in range(data_start, len(df)):
-        
-        # בדיקה אם השורה ריקה ברובה (סוף קבוצה)
-        non_empty_count = sum(1 for col in range(len(df.columns)) 
-                            if not pd.isna(df.iloc[row_idx, col]) and str(df.iloc[row_idx, col]).strip())
-        
-        if non_empty_count < 3:
-            break
-        
-        # בדיקה אם זו כותרת חדשה
-        if is_header_row(df, row_idx):
-            break
-        
-        # פרסור השורה
-        transaction = parse_isracard_row(df, row_idx, date_col, business_col, amount_col, company)
-        if transaction:
-            transactions.append(transaction)
+    date_values = data.iloc[:, columns['date']]
+    dates, failed = parse_date_column(date_values, layout)
+    valid = date_values.notna().to_numpy() & ~failed
     
-    print(f"      ✅ נמצאו {len(transactions)} עסקאות ב{group_name}")
+    rows = _valid_rows(data, valid, columns['business'], columns['amount'])
+    transactions = _build_transactions(
+        data, rows, dates.iloc[rows], columns['business'], columns['amount'], company
+    )
+    
+    print(f"      ✅ נמצאו {len(transactions)} עסקאות ב{section_name}")
     return transactions
 
-def parse_diners_cal(df: pd.DataFrame, company: str) -> List[Dict]:
-    """פרסר ייעודי לדיינרס וכאל - מבנה פשוט"""
+def parse_date_column(values: pd.Series, layout: IssuerLayout) -> Tuple[pd.Series, np.ndarray]:
+    """המרת עמודת תאריכים שלמה בקריאה אחת - מחזיר תאריכים ומסכת השורות שנכשלו"""
+    present = values.notna().to_numpy()
     
-    transactions = []
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, np.zeros(len(values), dtype=bool)
     
-    # שורת כותרות קבועה: שורה 3 (אינדקס 2)
-    header_row = 2
+    text = values.astype(str).str.strip()
+    date_format = infer_date_format(text[present], layout)
     
-    if header_row >= len(df):
-        print(f"   ❌ שורת הכותרות לא נמצאה")
-        return []
+    if date_format:
+        dates = pd.to_datetime(text, format=date_format, errors='coerce')
+    else:
+        dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    failed = present & dates.isna().to_numpy()
     
-    print(f"   📋 מעבד נתונים מחל בשורה {header_row + 1}")
+    if layout.date_format:
+        return dates, failed
+
+    # מבנה ללא פורמט קבוע - רק השורות שנכשלו עוברות לפורמטים האחרים ואז לפרסור גמיש
+    for candidate in DATE_FORMAT_CANDIDATES + ['mixed']:
+        if not failed.any():
+            break
+        if candidate == date_format:
+            continue
+
+        source = values if candidate == 'mixed' else text
+        retry = pd.to_datetime(source[failed], format=candidate, errors='coerce')
+        dates = dates.where(~failed, retry.reindex(values.index))
+        failed = present & dates.isna().to_numpy()
+
+    return dates, failed
+
+def infer_date_format(sample: pd.Series, layout: IssuerLayout) -> Optional[str]:
+    """פורמט התאריך של מבנה - קבוע, מהמטמון, או הסקה מדגימה של ערכי העמודה"""
+    if layout.date_format:
+        return layout.date_format
+    
+    sample = sample.head(DATE_SAMPLE_SIZE)
+    if not len(sample):
+        return _inferred_date_formats.get(layout.key)
+    
+    # פורמט שהוסק בקובץ קודם - כל עוד הוא מתאים לרוב הדגימה
+    cached_format = _inferred_date_formats.get(layout.key)
+    if cached_format and _format_hits(sample, cached_format) * 2 >= len(sample):
+        return cached_format
+    
+    best_format, best_hits = None, 0
+    for date_format in DATE_FORMAT_CANDIDATES:
+        hits = _format_hits(sample, date_format)
+        if hits > best_hits:
+            best_format, best_hits = date_format, hits
+    
+    if best_format:
+        _inferred_date_formats[layout.key] = best_format
+    return best_format
+
+def _format_hits(sample: pd.Series, date_format: str) -> int:
+    """מספר הערכים בדגימה שמתאימים לפורמט"""
+    return int(pd.to_datetime(sample, format=date_format, errors='coerce').notna().sum())
+
+def _sheet_text(df: pd.DataFrame) -> np.ndarray:
+    """תצוגת מחרוזות של כל הגיליון (lower/strip) - מחושבת פעם אחת"""
+    if not len(df.columns):
+        return np.empty((len(df), 0), dtype=object)
+    
+    return np.column_stack([
+        df.iloc[:, col].astype(str).str.strip().str.lower().to_numpy(dtype=object)
+        for col in range(len(df.columns))
+    ])
+
+def _non_empty_counts(df: pd.DataFrame, text: np.ndarray) -> np.ndarray:
+    """מספר התאים הלא ריקים בכל שורה"""
+    return (df.notna().to_numpy() & (text != '')).sum(axis=1)
+
+def _header_scores(text: np.ndarray) -> np.ndarray:
+    """ניקוד כותרות לכל שורה - תא אחד לכל היותר לכל עמודה"""
+    header_pattern = '|'.join(re.escape(keyword) for keyword in HEADER_KEYWORDS)
+    header_score = np.zeros(text.shape[0], dtype=int)
     
-    # עמודות קבועות
-    date_col = 0  # תאריך עסקה
-    business_col = 1  # שם בית עסק  
-    amount_col = 3  # סכום חיוב
+    for col in range(text.shape[1]):
+        header_score += pd.Series(text[:, col], dtype=object).str.contains(
+            header_pattern, regex=True, na=False
+        ).to_numpy(dtype=bool)
     
-    # עיבוד נתונים מהשורה שאחרי הכותרות
-    data_start = header_row + 1
+    return header_score
+
+def _group_stop_mask(df: pd.DataFrame) -> np.ndarray:
+    """מסכת שורות שמסיימות קבוצה - שורה ריקה ברובה או שורת כותרות"""
+    text = _sheet_text(df)
+    return (_non_empty_counts(df, text) < 3) | (_header_scores(text) >= 3)
+
+def _group_end(stop_mask: np.ndarray, start: int) -> int:
+    """אינדקס השורה הראשונה שמסיימת את הקבוצה"""
+    hits = np.flatnonzero(stop_mask[start:])
+    return start + int(hits[0]) if len(hits) else len(stop_mask)
+
+def _valid_rows(data: pd.DataFrame, valid: np.ndarray, business_col: int, amount_col: int) -> np.ndarray:
+    """מיקומי השורות התקינות - שם עסק באורך 2+ וסכום חיובי"""
+    business_values = data.iloc[:, business_col]
+    valid = valid & business_values.notna().to_numpy()
+    valid &= business_values.astype(str).str.strip().str.len().to_numpy() >= 2
     
-    for row_idx in range(data_start, len(df)):
-        transaction = parse_simple_row(df, row_idx, date_col, business_col, amount_col, company)
-        if transaction:
-            transactions.append(transaction)
+    amounts = pd.to_numeric(data.iloc[:, amount_col], errors='coerce').abs()
+    valid &= (amounts > 0).to_numpy()
     
-    print(f"   ✅ נמצאו {len(transactions)} עסקאות")
-    return transactions
+    return np.flatnonzero(valid)
 
-def parse_isracard_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col: int, amount_col: int, company: str) -> Optional[Dict]:
+def _build_transactions(data: pd.DataFrame, rows: np.ndarray, dates: Iterable, business_col: int,
+                        amount_col: int, company: str) -> TransactionBatch:
+    """בניית אצוות עסקאות עמודתית מהשורות התקינות"""
+    selected = data.iloc[rows]
+    businesses = selected.iloc[:, business_col].astype(str).str.strip().tolist()
+    amounts = pd.to_numeric(selected.iloc[:, amount_col], errors='coerce').abs().astype(float)
+    
+    return TransactionBatch.from_columns(dates, businesses, amounts, company, raw_rows=selected)
+
+def parse_isracard_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col: int, amount_col: int, company: str) -> Optional[Transaction]:
     """פרסור שורה של ישראכרט"""
+    return _parse_row_values(df.iloc[row_idx].tolist(), df.columns, date_col, business_col, amount_col,
+                             company, ISRACARD_LAYOUT)
+
+def parse_simple_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col: int, amount_col: int, company: str) -> Optional[Transaction]:
+    """פרסור שורה של דיינרס/כאל"""
+    return _parse_row_values(df.iloc[row_idx].tolist(), df.columns, date_col, business_col, amount_col,
+                             company, DINERS_CAL_LAYOUT)
+
+def parse_date_value(date_val, layout: IssuerLayout) -> Optional[datetime]:
+    """תאריך בודד (קריאה זורמת) - אותם פורמטים של המבנה, pd.to_datetime רק כמוצא אחרון"""
+    fixed_format = layout.date_format
+    if not fixed_format and isinstance(date_val, datetime):
+        return date_val
+    
+    text = str(date_val).strip()
+    cached_format = _inferred_date_formats.get(layout.key)
+    if fixed_format:
+        formats = [fixed_format]
+    else:
+        formats = ([cached_format] if cached_format else []) + DATE_FORMAT_CANDIDATES
     
-    try:
-        # תאריך (פורמט dd.mm.yy)
-        date_val = df.iloc[row_idx, date_col]
-        if pd.isna(date_val):
-            return None
-        
-        date_str = str(date_val).strip()
-        try:
-            # פורמט ישראכרט: dd.mm.yy
-            transaction_date = datetime.strptime(date_str, '%d.%m.%y')
-        except:
-            return None
-        
-        # עסק
-        business_val = df.iloc[row_idx, business_col]
-        if pd.isna(business_val):
-            return None
-        
-        business_name = str(business_val).strip()
-        if len(business_name) < 2:
-            return None
-        
-        # סכום
-        amount_val = df.iloc[row_idx, amount_col]
-        if pd.isna(amount_val):
-            return None
-        
+    for date_format in formats:
         try:
-            amount = abs(float(amount_val))
-            if amount <= 0:
-                return None
-        except:
-            return None
-        
-        return {
-            'date': transaction_date,
-            'business': business_name,
-            'amount': amount,
-            'company': company,
-            'raw_data': df.iloc[row_idx].to_dict()
-        }
-        
+            parsed = datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+        if not fixed_format and not cached_format:
+            _inferred_date_formats[layout.key] = date_format
+        return parsed
+    
+    if fixed_format:
+        return None
+    try:
+        return pd.to_datetime(date_val).to_pydatetime()
     except Exception:
         return None
 
-def parse_simple_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col: int, amount_col: int, company: str) -> Optional[Dict]:
-    """פרסור שורה של דיינרס/כאל"""
+def _parse_row_values(values: List, columns, date_col: int, business_col: int, amount_col: int,
+                      company: str, layout: IssuerLayout) -> Optional[Transaction]:
+    """פרסור שורה בודדת מתוך רשימת ערכים"""
     
     try:
-        # תאריך (datetime object)
-        date_val = df.iloc[row_idx, date_col]
+        # תאריך
+        date_val = values[date_col]
         if pd.isna(date_val):
             return None
         
-        if isinstance(date_val, datetime):
-            transaction_date = date_val
-        else:
-            try:
-                transaction_date = pd.to_datetime(date_val)
-            except:
-                return None
+        transaction_date = parse_date_value(date_val, layout)
+        if transaction_date is None:
+            return None
         
         # עסק
-        business_val = df.iloc[row_idx, business_col]
+        business_val = values[business_col]
         if pd.isna(business_val):
             return None
         
@@ -189,7 +339,7 @@ def parse_simple_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col
             return None
         
         # סכום
-        amount_val = df.iloc[row_idx, amount_col]
+        amount_val = values[amount_col]
         if pd.isna(amount_val):
             return None
         
@@ -200,13 +350,8 @@ def parse_simple_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col
         except:
             return None
         
-        return {
-            'date': transaction_date,
-            'business': business_name,
-            'amount': amount,
-            'company': company,
-            'raw_data': df.iloc[row_idx].to_dict()
-        }
+        return Transaction(transaction_date, business_name, amount, company,
+                           raw_data=dict(zip(columns, values)))
         
     except Exception:
         return None
@@ -214,36 +359,18 @@ def parse_simple_row(df: pd.DataFrame, row_idx: int, date_col: int, business_col
 def is_header_row(df: pd.DataFrame, row_idx: int) -> bool:
     """בדיקה אם השורה היא כותרת חדשה"""
     
-    header_keywords = ['תאריך', 'שם', 'עסק', 'סכום', 'חיוב']
+    return _header_score(df.iloc[row_idx].tolist()) >= 3
+
+def _header_score(values: List) -> int:
+    """ניקוד מילות כותרת - תא אחד לכל היותר לכל עמודה"""
     score = 0
     
-    for col_idx in range(len(df.columns)):
-        cell_value = str(df.iloc[row_idx, col_idx]).lower().strip()
-        for keyword in header_keywords:
-            if keyword in cell_value:
-                score += 1
-                break
+    for value in values:
+        cell_value = str(value).lower().strip()
+        if any(keyword in cell_value for keyword in HEADER_KEYWORDS):
+            score += 1
     
-    return score >= 3
-
-def detect_company_from_filename(filename: str) -> str:
-    """זיהוי חברת כרטיס אשראי מתוך שם הקובץ"""
-    filename_lower = filename.lower()
-    
-    if 'דיינרס' in filename_lower or 'diners' in filename_lower:
-        return 'דיינרס'
-    elif 'ישראכרט' in filename_lower or 'isracard' in filename_lower:
-        return 'ישראכרט'
-    elif 'כאל' in filename_lower or 'cal' in filename_lower:
-        return 'כאל'
-    elif 'ויזה' in filename_lower or 'visa' in filename_lower:  # ✅ הוספתי ויזה
-        return 'ויזה'
-    elif 'מסטרקארד' in filename_lower or 'mastercard' in filename_lower:
-        return 'מסטרקארד'
-    elif 'אמריקן' in filename_lower or 'american' in filename_lower:
-        return 'אמריקן_אקספרס'
-    else:
-        return 'לא_ידוע'
+    return score
 
 # פונקציות Legacy לתאימות לאחור (אם נדרש)
 def find_header_row(df: pd.DataFrame) -> Optional[int]:
@@ -254,11 +381,11 @@ def detect_columns_smart(df: pd.DataFrame, header_row: int) -> Tuple[str, str, s
     """Legacy function - לתאימות עם קוד קיים"""
     return df.columns[0], df.columns[1], df.columns[3]
 
-def parse_transaction_row(row: pd.Series, date_col: str, business_col: str, amount_col: str) -> Optional[Dict]:
+def parse_transaction_row(row: pd.Series, date_col: str, business_col: str, amount_col: str) -> Optional[Transaction]:
     """Legacy function - לתאימות עם קוד קיים"""
     return None
 
-def parse_excel_smart(filepath, company: str) -> List[Dict]:
+def parse_excel_smart(filepath, company: str) -> TransactionBatch:
     """Legacy function - מפנה לפונקציה החדשה"""
     return parse_file(filepath)
 
@@ -283,37 +410,169 @@ def extract_card_number(filename: str) -> str:
 
 # עדכן את הפונקציה parse_file:
 
-def parse_file(filepath) -> List[Dict]:
-    """פונקציה ראשית לפרסור קובץ - עם מספר כרטיס"""
+def parse_file(filepath, source=None) -> TransactionBatch:
+    """פונקציה ראשית לפרסור קובץ - עם מספר כרטיס (source: buffer פתוח של אותו קובץ)"""
     company = detect_company_from_filename(filepath.name)
     card_number = extract_card_number(filepath.name)  # ← חדש!
     
     print(f"   🏢 חברה: {company}")
     
+    # זיהוי המבנה לפני טעינה מלאה - קובץ לא מוכר נדחה מיד
+    layout = resolve_layout(company, source if source is not None else filepath)
+    if layout is None:
+        print(f"   ❌ מבנה קובץ לא מוכר - מדלג")
+        return TransactionBatch.empty()
+    
     try:
-        df = pd.read_excel(filepath)
+        df = pd.read_excel(source if source is not None else filepath)
         
         if df.empty:
             print(f"   ⚠️ הקובץ ריק")
-            return []
+            return TransactionBatch.empty()
         
         print(f"   📊 נטען קובץ עם {len(df)} שורות ו-{len(df.columns)} עמודות")
         
-        # בחירת אסטרטגיית פרסור לפי חברה
-        if company == 'ישראכרט':
-            transactions = parse_isracard(df, company)
-        else:  # דיינרס או כאל
-            transactions = parse_diners_cal(df, company)
+        transactions = parse_layout(df, layout, company)
         
         # הוספת מספר כרטיס לכל עסקה
-        for transaction in transactions:
-            transaction['card_last_four'] = card_number  # ← חדש!
+        transactions.set_card(card_number)
             
         return transactions
             
     except Exception as e:
         print(f"   ❌ שגיאה בפרסור: {e}")
-        return []
+        return TransactionBatch.empty()
+
+# ==========================================
+# קריאה זורמת (read-only) לקבצים גדולים
+# ==========================================
+def iter_file_transactions(filepath, source=None) -> Iterator[Transaction]:
+    """קריאה זורמת של קובץ - מחזיר עסקאות אחת אחת בלי לטעון את כל הגיליון"""
+    company = detect_company_from_filename(filepath.name)
+    card_number = extract_card_number(filepath.name)
+    
+    print(f"   🏢 חברה: {company} (קריאה זורמת)")
+    
+    layout = resolve_layout(company, source if source is not None else filepath)
+    if layout is None:
+        print(f"   ❌ מבנה קובץ לא מוכר - מדלג")
+        return
+    
+    # openpyxl קורא רק xlsx - קבצי xls נטענים בדרך הרגילה
+    if filepath.suffix.lower() != '.xlsx':
+        print(f"   ⚠️ קריאה זורמת נתמכת רק ב-xlsx - טוען את כל הקובץ")
+        yield from parse_file(filepath, source)
+        return
+    
+    try:
+        from openpyxl import load_workbook
+        workbook = load_workbook(source if source is not None else filepath, read_only=True, data_only=True)
+    except Exception as e:
+        print(f"   ❌ שגיאה בפתיחת הקובץ: {e}")
+        return
+    
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        
+        # השורה הראשונה היא שמות העמודות (כמו ב-pd.read_excel)
+        header = next(rows, None)
+        if header is None:
+            print(f"   ⚠️ הקובץ ריק")
+            return
+        
+        width = max(len(header), sheet.max_column or 0)
+        columns = _excel_column_names(header, width)
+        rows = (_pad_row(values, width) for values in rows)
+        
+        transactions = _stream_sections(rows, columns, company, layout)
+        
+        count = 0
+        for transaction in transactions:
+            transaction['card_last_four'] = card_number
+            count += 1
+            yield transaction
+        
+        print(f"   ✅ נקראו {count} עסקאות")
+        
+    except Exception as e:
+        print(f"   ❌ שגיאה בפרסור: {e}")
+    finally:
+        workbook.close()
+
+def iter_batches(transactions: Iterable[Transaction], batch_size: int) -> Iterator[List[Transaction]]:
+    """חלוקת זרם עסקאות לאצוות בגודל קבוע"""
+    iterator = iter(transactions)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _stream_sections(rows: Iterator[List], columns: List, company: str,
+                     layout: IssuerLayout) -> Iterator[Transaction]:
+    """מכונת מצבים לקטעים - כל שורת כותרות פותחת קטע עם מיפוי עמודות משלו"""
+    column_names = [str(name).lower().strip() for name in columns]
+    default_columns = layout.columns
+    
+    # קטע פתוח - מיפוי העמודות שלו, או None מחוץ לקטע
+    section = None
+    if _header_score(column_names) >= 3:
+        section = map_columns(column_names, default_columns, layout.column_keywords)
+    found_header = section is not None
+    
+    for row_idx, values in enumerate(rows):
+        if _header_score(values) >= 3:
+            section = map_columns([str(value).lower().strip() for value in values], default_columns,
+                                  layout.column_keywords)
+            found_header = True
+            continue
+        
+        # קובץ בלי כותרות מזוהות - שורות הכותרות הקבועות
+        if not found_header and row_idx in layout.header_rows:
+            section = dict(zip(('date', 'business', 'amount'), default_columns))
+            continue
+        
+        if section is None:
+            continue
+        
+        if layout.stop_at_blank and _is_group_stop(values):
+            section = None
+            continue
+        
+        transaction = _parse_row_values(values, columns, section['date'], section['business'],
+                                        section['amount'], company, layout)
+        if transaction:
+            yield transaction
+
+def _is_group_stop(values: List) -> bool:
+    """שורה שמסיימת קבוצה - ריקה ברובה או כותרת חדשה"""
+    non_empty_count = sum(1 for value in values if not pd.isna(value) and str(value).strip())
+    return non_empty_count < 3 or _header_score(values) >= 3
+
+def _excel_column_names(header, width: int) -> List:
+    """שמות עמודות בסגנון pd.read_excel - Unnamed לתא ריק ו-.1 לכפילויות"""
+    names = []
+    seen = {}
+    
+    for col_idx in range(width):
+        value = header[col_idx] if col_idx < len(header) else None
+        name = f"Unnamed: {col_idx}" if value is None else value
+        
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    
+    return names
+
+def _pad_row(values, width: int) -> List:
+    """השלמת שורה לרוחב הגיליון - תאים חסרים כ-NaN"""
+    row = [np.nan if value is None else value for value in values[:width]]
+    row.extend([np.nan] * (width - len(row)))
+    return row
     
 if __name__ == "__main__":
     # בדיקה של הפרסר
@@ -0,0 +1,128 @@
+"""
+stats_cache.py
+סטטיסטיקות מחושבות בשרת (פונקציית get_transaction_stats) עם מטמון שמתעדכן בכל הכנסה
+"""
+import time
+from typing import Dict, Optional, Iterable
+
+# שם פונקציית ה-SQL (ראה README) שמחזירה את כל הסטטיסטיקות בשאילתה אחת
+STATS_RPC = 'get_transaction_stats'
+
+# גבולות רמות הביטחון - זהים לשאילתות ב-SmartCategorizer
+HIGH_CONFIDENCE = 0.8
+MEDIUM_CONFIDENCE = 0.5
+
+STATS_KEYS = ('total_transactions', 'total_amount', 'high_confidence', 'medium_confidence',
+              'low_confidence', 'total_categories', 'processed_files')
+
+class StatsCache:
+    """מונים מצטברים - נטענים מהשרת פעם אחת ומתעדכנים מקומית בכל הכנסה"""
+
+    def __init__(self, supabase, ttl_seconds: float = 300):
+        self.supabase = supabase
+        self.ttl_seconds = ttl_seconds
+        self.stats: Optional[Dict] = None
+        self.loaded_at = 0.0
+        self.rpc_available = True
+
+    def get(self, refresh: bool = False) -> Dict:
+        """הסטטיסטיקות - מהמטמון, או טעינה מהשרת אם פג תוקפן"""
+        expired = time.monotonic() - self.loaded_at > self.ttl_seconds
+        if refresh or self.stats is None or expired:
+            self.refresh()
+        return dict(self.stats or {})
+
+    def refresh(self):
+        """טעינה מחדש מהשרת - צבירה בצד השרת, בלי להוריד שורות"""
+        stats = self._load_rpc() if self.rpc_available else None
+        if stats is None:
+            stats = self._load_counts()
+        if stats is None:
+            return
+
+        self.stats = {key: stats.get(key) or 0 for key in STATS_KEYS}
+        # None - הסכום לא זמין בלי צבירה בשרת (ראה _load_counts)
+        self.stats['total_amount'] = None if stats.get('total_amount') is None else float(stats['total_amount'])
+        self.loaded_at = time.monotonic()
+
+    def record_transactions(self, rows: Iterable[Dict]):
+        """עדכון מצטבר אחרי הכנסת עסקאות - O(שורות חדשות)"""
+        if self.stats is None:
+            return
+
+        for row in rows:
+            self.stats['total_transactions'] += 1
+            if self.stats['total_amount'] is not None:
+                self.stats['total_amount'] += float(row.get('amount') or 0)
+
+            confidence = row.get('confidence_score')
+            if confidence is None:
+                continue
+            if confidence >= HIGH_CONFIDENCE:
+                self.stats['high_confidence'] += 1
+            elif confidence >= MEDIUM_CONFIDENCE:
+                self.stats['medium_confidence'] += 1
+            else:
+                self.stats['low_confidence'] += 1
+
+    def record_processed_file(self):
+        if self.stats is not None:
+            self.stats['processed_files'] += 1
+
+    def record_categories(self, count: int):
+        if self.stats is not None:
+            self.stats['total_categories'] += count
+
+    def invalidate(self):
+        """שינוי שלא עובר כאן (עדכון קטגוריה, מחיקה) - טעינה מחדש בפעם הבאה"""
+        self.stats = None
+
+    def _load_rpc(self) -> Optional[Dict]:
+        try:
+            response = self.supabase.rpc(STATS_RPC).execute()
+        except Exception as e:
+            # הפונקציה לא הותקנה במסד - ספירות בשאילתות count בלבד
+            print(f"   ⚠️ {STATS_RPC} לא זמינה ({e}) - סטטיסטיקות בשאילתות נפרדות")
+            self.rpc_available = False
+            return None
+
+        data = response.data
+        if isinstance(data, list):
+            data = data[0] if data else {}
+        return data or {}
+
+    def _load_counts(self) -> Optional[Dict]:
+        """גיבוי ללא הפונקציה - ספירות ב-count='exact' בלי שורות, וסכום מצטבר בשרת (amount.sum())
+        אם הצבירה לא מופעלת ב-PostgREST הסכום לא זמין (None) - לא מורידים את כל העמודה"""
+        try:
+            stats = {
+                'total_transactions': self._count('transactions'),
+                'high_confidence': self._count('transactions', ('gte', HIGH_CONFIDENCE)),
+                'medium_confidence': self._count('transactions', ('gte', MEDIUM_CONFIDENCE), ('lt', HIGH_CONFIDENCE)),
+                'low_confidence': self._count('transactions', ('lt', MEDIUM_CONFIDENCE)),
+                'total_categories': self._count('categories'),
+                'processed_files': self._count('processed_files'),
+            }
+        except Exception as e:
+            print(f"❌ שגיאה בקבלת סטטיסטיקות: {e}")
+            return None
+
+        stats['total_amount'] = self._sum_amount()
+        return stats
+
+    def _sum_amount(self) -> Optional[float]:
+        try:
+            response = self.supabase.table('transactions').select('amount.sum()').execute()
+            row = response.data[0] if response.data else {}
+            return float(row.get('sum') or 0)
+        except Exception as e:
+            print(f"   ❌ סכום העסקאות לא זמין - יש להתקין את {STATS_RPC} מה-README "
+                  f"או להפעיל צבירות ב-PostgREST ({e})")
+            return None
+
+    def _count(self, table: str, *confidence_filters) -> int:
+        """ספירת שורות בלי להוריד אותן (head) - סינון לפי confidence_score"""
+        query = self.supabase.table(table).select('id', count='exact', head=True)
+        for operator, value in confidence_filters:
+            query = getattr(query, operator)('confidence_score', value)
+        return query.execute().count or 0
@@ -0,0 +1,115 @@
+"""
+test_local_store.py
+בדיקות לעותק המקומי - ממשק השאילתות בסגנון Supabase, סנכרון מצטבר ומצב mirror
+"""
+import time
+import pytest
+from local_store import LocalStore, LocalQuery, MirrorClient, LocalStoreError
+
+class RemoteQuery(LocalQuery):
+    """שאילתת "שרת" עם מתודה שאין בעותק המקומי"""
+
+    def text_search(self, column, query):
+        return self.ilike(column, f'*{query}*')
+
+class RemoteStore(LocalStore):
+    """LocalStore נוסף בתפקיד Supabase"""
+
+    def table(self, name):
+        super().table(name)
+        return RemoteQuery(self, name)
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalStore(tmp_path / 'local.db')
+    store.table('categories').insert([{'name': 'מזון'}, {'name': 'תחבורה'}]).execute()
+    store.table('transactions').insert([
+        {'business_name': 'רמי לוי', 'amount': 120.5, 'category_id': 1},
+        {'business_name': 'Paz Yellow', 'amount': 200, 'category_id': 2},
+        {'business_name': 'קפה גרג', 'amount': 30, 'category_id': 1},
+        {'business_name': 'לא מסווג', 'amount': 15, 'category_id': None},
+    ]).execute()
+    return store
+
+@pytest.fixture
+def mirror(tmp_path):
+    remote = RemoteStore(tmp_path / 'remote.db')
+    remote.table('categories').insert([{'name': 'מזון'}]).execute()
+    remote.table('transactions').insert([{'business_name': 'רמי לוי', 'amount': 50, 'category_id': 1}]).execute()
+    client = MirrorClient(remote, LocalStore(tmp_path / 'mirror.db'), page_size=2)
+    client.sync()
+    return client
+
+def test_select_filters_and_embedding(store):
+    rows = store.table('transactions').select('id, business_name, categories(name)') \
+        .eq('category_id', 1).order('amount', desc=True).execute().data
+    assert [row['business_name'] for row in rows] == ['רמי לוי', 'קפה גרג']
+    assert rows[0]['categories'] == {'name': 'מזון'}
+    assert set(rows[0]) == {'id', 'business_name', 'categories'}
+
+    response = store.table('transactions').select('id', count='exact').is_('category_id', 'null').execute()
+    assert response.count == 1 and len(response.data) == 1
+
+def test_not_like_and_in(store):
+    query = store.table('transactions').select('business_name')
+    assert len(query.not_.eq('category_id', 1).execute().data) == 1
+    assert store.table('transactions').select('id').ilike('business_name', '*paz*').execute().data == [{'id': 2}]
+    assert store.table('transactions').select('id').like('business_name', '*paz*').execute().data == []
+    assert len(store.table('transactions').select('id').in_('category_id', [1, 2]).execute().data) == 3
+
+def test_or_keyset(store):
+    rows = store.table('transactions').select('id').order('id').execute().data
+    stamp = store.table('transactions').select('updated_at').eq('id', 2).single().execute().data['updated_at']
+
+    after = store.table('transactions').select('id') \
+        .or_(f'updated_at.gt."{stamp}",and(updated_at.eq."{stamp}",id.gt.2)').order('id').execute().data
+    assert [row['id'] for row in after] == [row['id'] for row in rows if row['id'] > 2]
+
+    either = store.table('transactions').select('id').or_('amount.lt.20,business_name.eq."קפה גרג"').execute().data
+    assert sorted(row['id'] for row in either) == [3, 4]
+
+def test_unknown_column_fails_at_execute(store):
+    query = store.table('transactions').select('id').eq('no_such_column', 1).order('also_missing')
+    with pytest.raises(LocalStoreError):
+        query.execute()
+
+def test_update_touches_updated_at(store):
+    before = store.table('transactions').select('updated_at').eq('id', 1).single().execute().data['updated_at']
+    time.sleep(0.001)
+    updated = store.table('transactions').update({'category_id': 2}).eq('id', 1).execute().data
+    assert updated[0]['category_id'] == 2 and updated[0]['updated_at'] > before
+
+def test_incremental_sync_picks_up_updates(tmp_path):
+    remote = LocalStore(tmp_path / 'remote.db')
+    remote.table('transactions').insert([{'business_name': f'עסק {i}', 'amount': i} for i in range(5)]).execute()
+    local = LocalStore(tmp_path / 'local.db')
+    assert local.sync(remote, page_size=2)['transactions'] == 5
+
+    remote.table('transactions').update({'amount': 99}).eq('id', 2).execute()
+    remote.table('transactions').insert({'business_name': 'חדש', 'amount': 1}).execute()
+    assert local.sync(remote, page_size=2)['transactions'] == 2
+    assert local.table('transactions').select('amount').eq('id', 2).single().execute().data['amount'] == 99
+    assert local.table('transactions').select('id', count='exact').execute().count == 6
+
+def test_mirror_writes_reach_both(mirror):
+    mirror.table('transactions').insert({'business_name': 'פז', 'amount': 180, 'category_id': 1}).execute()
+    mirror.table('transactions').update({'amount': 60}).eq('business_name', 'רמי לוי').execute()
+
+    for store in (mirror.remote, mirror.store):
+        rows = store.table('transactions').select('business_name, amount').order('id').execute().data
+        assert rows == [{'business_name': 'רמי לוי', 'amount': 60}, {'business_name': 'פז', 'amount': 180}]
+
+def test_mirror_replays_modifiers_and_falls_back(mirror):
+    rows = mirror.table('transactions').select('business_name').not_.eq('amount', 50).execute().data
+    assert rows == []
+
+    # מתודה שאין בעותק - השרת עונה
+    rows = mirror.table('transactions').select('business_name').text_search('business_name', 'לוי').execute().data
+    assert rows == [{'business_name': 'רמי לוי'}]
+
+def test_mirror_resyncs_writes_from_other_processes(mirror):
+    mirror.remote.table('transactions').insert({'business_name': 'נכתב בתהליך אחר', 'amount': 10}).execute()
+    assert len(mirror.table('transactions').select('id').execute().data) == 1
+
+    mirror.synced_at -= mirror.sync_seconds
+    assert len(mirror.table('transactions').select('id').execute().data) == 2
@@ -0,0 +1,34 @@
+"""
+test_naive_bayes.py
+בדיקות למסווג naive Bayes - ביטחון מכויל ושמות שהמודל לא מכיר
+"""
+import random
+from naive_bayes import NaiveBayesCategorizer, MIN_TEMPERATURE
+
+def _separable_model() -> NaiveBayesCategorizer:
+    """מודל על נתונים מופרדים לגמרי - המקרה שבו הכיול נדחף לטמפרטורה הנמוכה ביותר"""
+    rng = random.Random(1)
+    examples = [(rng.choice(['קפה גרג', 'ארומה', 'מקדונלד', 'burger king']), rng.uniform(20, 80), 'food')
+                for _ in range(200)]
+    examples += [(rng.choice(['פז', 'דלק', 'סונול', 'ten']), rng.uniform(150, 300), 'fuel')
+                 for _ in range(200)]
+    rng.shuffle(examples)
+
+    model = NaiveBayesCategorizer()
+    model.fit(examples)
+    return model
+
+def test_temperature_has_floor():
+    assert _separable_model().temperature >= MIN_TEMPERATURE
+
+def test_unseen_names_get_no_category():
+    model = _separable_model()
+    for name in ['qqqq', 'ללללל', 'xyz 999']:
+        assert model.predict(name, 50) == (None, 0.0)
+        assert model.predict(name) == (None, 0.0)
+
+def test_known_names_still_categorized():
+    model = _separable_model()
+    categories, confidences = model.predict_batch(['קפה גרג רחובות', 'פז', 'qqqq'], [40, 200, 40])
+    assert categories == ['food', 'fuel', None]
+    assert confidences[0] > 0.6 and confidences[1] > 0.6 and confidences[2] == 0.0
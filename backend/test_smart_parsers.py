@@ -0,0 +1,130 @@
+"""
+test_smart_parsers.py
+בדיקות רגרסיה לפרסר - הפרסור הוקטורי והקריאה הזורמת מחזירים בדיוק את העסקאות שהפרסר הישן (שורה-שורה) החזיר
+"""
+import io
+import contextlib
+from datetime import datetime
+import openpyxl
+import pandas as pd
+import pytest
+from smart_parsers import parse_file, parse_layout, iter_file_transactions
+from issuer_layouts import ISRACARD_LAYOUT, DINERS_CAL_LAYOUT
+from transaction_model import clean_raw_record
+
+ISRACARD_HEADER = ['תאריך רכישה', 'שם בית עסק', 'סכום עסקה', 'מטבע', 'סכום חיוב', 'פירוט נוסף']
+DINERS_HEADER = ['תאריך עסקה', 'שם בית עסק', 'סכום עסקה', 'סכום חיוב', 'הערות']
+
+def _isracard_workbook(path):
+    """שתי קבוצות בשורות הקבועות (כותרות בשורות 10 ו-27 בגיליון) - עם שורות שהפרסר הישן דילג עליהן"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['פירוט עסקאות'])
+    for _ in range(8):
+        ws.append(['כרטיס 1234'])
+    ws.append(ISRACARD_HEADER)
+    ws.append(['03.01.24', 'רמי לוי', 120.5, '₪', 120.5, None])
+    ws.append(['05.01.24', '  קפה גרג ', 32, '₪', -32, 'זיכוי'])
+    ws.append(['07.01.24', 'x', 10, '₪', 10, None])          # שם קצר מדי
+    ws.append(['09.01.24', 'פז', 0, '₪', 0, None])           # סכום אפס
+    ws.append(['bad', 'שופרסל', 15, '₪', 15, None])           # תאריך לא תקין
+    ws.append(['11.01.24', 'Wolt', 89.9, '₪', 89.9, 'הוראת קבע'])
+    ws.append([])
+    ws.append(['סה"כ', None, None, None, 242.4])
+    while ws.max_row < 26:
+        ws.append(['-'])
+    ws.append(ISRACARD_HEADER)
+    ws.append(['15.01.24', 'AMAZON', 250, '$', 912.3, 'חו"ל'])
+    ws.append(['16.01.24', 'סופר פארם', 45.6, '₪', 45.6, None])
+    ws.append([])
+    ws.append(['סה"כ', None, None, None, 957.9])
+    wb.save(path)
+
+def _diners_workbook(path):
+    """כותרות בשורה 4 בגיליון - תאריכים כ-datetime וכטקסט, עם שורות שהפרסר הישן דילג עליהן"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['פירוט עסקאות'])
+    ws.append(['כרטיס 5678'])
+    ws.append([])
+    ws.append(DINERS_HEADER)
+    ws.append([datetime(2024, 2, 1), 'שופרסל דיל', 100, 100, None])
+    ws.append([datetime(2024, 2, 3), 'חניון אחוזות', 18, 18, 'תשלום 1 מ-3'])
+    ws.append([datetime(2024, 2, 4), 'ק', 5, 5, None])        # שם קצר מדי
+    ws.append([None, 'ללא תאריך', 7, 7, None])
+    ws.append([datetime(2024, 2, 6), 'בזק', -59.9, -59.9, 'זיכוי'])
+    ws.append(['2024-02-08', 'Netflix', 39.9, 39.9, None])
+    ws.append([])
+    ws.append([None, 'סה"כ', None, 258.4])
+    wb.save(path)
+
+def _isracard_raw(date, business, amount, currency, charge, details):
+    return {'פירוט עסקאות': date, 'Unnamed: 1': business, 'Unnamed: 2': amount, 'Unnamed: 3': currency,
+            'Unnamed: 4': charge, 'Unnamed: 5': details}
+
+def _diners_raw(date, business, amount, charge, notes):
+    return {'פירוט עסקאות': date, 'Unnamed: 1': business, 'Unnamed: 2': amount, 'Unnamed: 3': charge,
+            'Unnamed: 4': notes}
+
+# הפלט של הפרסר הישן (parse_isracard_row / parse_simple_row) על אותם קבצים - raw_data אחרי clean_raw_record
+EXPECTED = {
+    'ישראכרט_1234_01_2024.xlsx': (ISRACARD_LAYOUT, [
+        {'date': datetime(2024, 1, 3), 'business': 'רמי לוי', 'amount': 120.5, 'company': 'ישראכרט',
+         'card_last_four': '1234', 'raw_data': _isracard_raw('03.01.24', 'רמי לוי', 120.5, '₪', 120.5, None)},
+        {'date': datetime(2024, 1, 5), 'business': 'קפה גרג', 'amount': 32.0, 'company': 'ישראכרט',
+         'card_last_four': '1234', 'raw_data': _isracard_raw('05.01.24', '  קפה גרג ', 32, '₪', -32, 'זיכוי')},
+        {'date': datetime(2024, 1, 11), 'business': 'Wolt', 'amount': 89.9, 'company': 'ישראכרט',
+         'card_last_four': '1234', 'raw_data': _isracard_raw('11.01.24', 'Wolt', 89.9, '₪', 89.9, 'הוראת קבע')},
+        {'date': datetime(2024, 1, 15), 'business': 'AMAZON', 'amount': 912.3, 'company': 'ישראכרט',
+         'card_last_four': '1234', 'raw_data': _isracard_raw('15.01.24', 'AMAZON', 250, '$', 912.3, 'חו"ל')},
+        {'date': datetime(2024, 1, 16), 'business': 'סופר פארם', 'amount': 45.6, 'company': 'ישראכרט',
+         'card_last_four': '1234', 'raw_data': _isracard_raw('16.01.24', 'סופר פארם', 45.6, '₪', 45.6, None)},
+    ]),
+    'דיינרס_5678_02_2024.xlsx': (DINERS_CAL_LAYOUT, [
+        {'date': datetime(2024, 2, 1), 'business': 'שופרסל דיל', 'amount': 100.0, 'company': 'דיינרס',
+         'card_last_four': '5678', 'raw_data': _diners_raw('2024-02-01 00:00:00', 'שופרסל דיל', 100, 100, None)},
+        {'date': datetime(2024, 2, 3), 'business': 'חניון אחוזות', 'amount': 18.0, 'company': 'דיינרס',
+         'card_last_four': '5678', 'raw_data': _diners_raw('2024-02-03 00:00:00', 'חניון אחוזות', 18, 18, 'תשלום 1 מ-3')},
+        {'date': datetime(2024, 2, 6), 'business': 'בזק', 'amount': 59.9, 'company': 'דיינרס',
+         'card_last_four': '5678', 'raw_data': _diners_raw('2024-02-06 00:00:00', 'בזק', -59.9, -59.9, 'זיכוי')},
+        {'date': datetime(2024, 2, 8), 'business': 'Netflix', 'amount': 39.9, 'company': 'דיינרס',
+         'card_last_four': '5678', 'raw_data': _diners_raw('2024-02-08', 'Netflix', 39.9, 39.9, None)},
+    ]),
+}
+
+BUILDERS = {'ישראכרט_1234_01_2024.xlsx': _isracard_workbook, 'דיינרס_5678_02_2024.xlsx': _diners_workbook}
+
+@pytest.fixture(params=sorted(EXPECTED))
+def statement(request, tmp_path):
+    """קובץ דוגמה בתיקייה זמנית, המבנה שלו והעסקאות שהפרסר הישן החזיר"""
+    path = tmp_path / request.param
+    BUILDERS[request.param](path)
+    layout, expected = EXPECTED[request.param]
+    return path, layout, expected
+
+def _normalized(transactions):
+    """מילונים בפורמט הישן - raw_data מנוקה ותאריך כ-datetime, להשוואה בלי תלות בטיפוסי pandas"""
+    return [{**transaction, 'date': pd.Timestamp(transaction['date']).to_pydatetime(),
+             'raw_data': clean_raw_record(transaction['raw_data'])} for transaction in transactions]
+
+def _quiet(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+def test_parse_file_matches_old_parser(statement):
+    path, _, expected = statement
+    transactions = _quiet(parse_file, path)
+    assert _normalized(transactions.to_list()) == expected
+    assert all(type(transaction['date']) is datetime for transaction in transactions)
+
+def test_parse_layout_matches_old_parser(statement):
+    path, layout, expected = statement
+    company = expected[0]['company']
+    transactions = _quiet(parse_layout, pd.read_excel(path), layout, company)
+    # parse_layout לא קובע מספר כרטיס - זה תפקיד parse_file
+    assert _normalized(transactions.to_list()) == [{**row, 'card_last_four': None} for row in expected]
+
+def test_streaming_matches_old_parser(statement):
+    path, _, expected = statement
+    transactions = _quiet(lambda: [transaction.to_dict() for transaction in iter_file_transactions(path)])
+    assert _normalized(transactions) == expected
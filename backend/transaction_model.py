@@ -0,0 +1,222 @@
+"""
+transaction_model.py
+ייצוג קומפקטי לעסקאות - Transaction עם __slots__ ו-TransactionBatch עמודתי
+"""
+from datetime import datetime
+from typing import List, Dict, Optional, Iterable, Iterator, Union
+import numpy as np
+import pandas as pd
+
+TRANSACTION_FIELDS = ('date', 'business', 'amount', 'company', 'card_last_four', 'raw_data')
+
+# פורמט תאריכים בשורות המקוריות הנשמרות
+RAW_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class Transaction:
+    """עסקה בודדת - ללא __dict__, עם גישה בסגנון מילון לתאימות לאחור"""
+    __slots__ = TRANSACTION_FIELDS
+
+    def __init__(self, date: datetime, business: str, amount: float, company: str,
+                 card_last_four: Optional[str] = None, raw_data: Optional[Dict] = None):
+        self.date = date
+        self.business = business
+        self.amount = amount
+        self.company = company
+        self.card_last_four = card_last_four
+        self.raw_data = raw_data
+
+    def __getitem__(self, key: str):
+        if key not in TRANSACTION_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in TRANSACTION_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None) if key in TRANSACTION_FIELDS else None
+        return default if value is None else value
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in TRANSACTION_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.date:%Y-%m-%d}, {self.business!r}, {self.amount})"
+
+
+class TransactionBatch:
+    """אצוות עסקאות בייצוג עמודתי - מערך לכל שדה במקום מילון לכל שורה"""
+    __slots__ = ('dates', 'businesses', 'amounts', 'companies', 'cards', 'raw_rows')
+
+    def __init__(self, dates: np.ndarray, businesses: np.ndarray, amounts: np.ndarray,
+                 companies: np.ndarray, cards: np.ndarray,
+                 raw_rows: Union[pd.DataFrame, List[Dict], None] = None):
+        self.dates = dates
+        self.businesses = businesses
+        self.amounts = amounts
+        self.companies = companies
+        self.cards = cards
+        self.raw_rows = raw_rows
+
+    @classmethod
+    def from_columns(cls, dates: Iterable, businesses: Iterable, amounts: Iterable, company: str,
+                     raw_rows: Union[pd.DataFrame, List[Dict], None] = None) -> 'TransactionBatch':
+        """בניית אצווה מעמודות של חברה אחת"""
+        businesses = np.asarray(list(businesses), dtype=object)
+        size = len(businesses)
+
+        return cls(
+            _to_datetime_array(dates),
+            businesses,
+            np.asarray(list(amounts), dtype=np.float64),
+            np.full(size, company, dtype=object),
+            np.full(size, None, dtype=object),
+            raw_rows
+        )
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable) -> 'TransactionBatch':
+        """בניית אצווה מרשימת מילונים או Transaction"""
+        if isinstance(transactions, TransactionBatch):
+            return transactions
+
+        transactions = list(transactions)
+
+        return cls(
+            _to_datetime_array([t['date'] for t in transactions]),
+            np.asarray([t['business'] for t in transactions], dtype=object),
+            np.asarray([t['amount'] for t in transactions], dtype=np.float64),
+            np.asarray([t['company'] for t in transactions], dtype=object),
+            np.asarray([t.get('card_last_four') for t in transactions], dtype=object),
+            [t.get('raw_data') or {} for t in transactions]
+        )
+
+    @classmethod
+    def empty(cls) -> 'TransactionBatch':
+        return cls.from_transactions([])
+
+    @classmethod
+    def concat(cls, batches: List['TransactionBatch']) -> 'TransactionBatch':
+        """איחוד מספר אצוות לאצווה אחת"""
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        if all(isinstance(batch.raw_rows, pd.DataFrame) for batch in batches):
+            raw_rows = pd.concat([batch.raw_rows for batch in batches])
+        else:
+            raw_rows = [row for batch in batches for row in batch.raw_records()]
+
+        return cls(
+            np.concatenate([batch.dates for batch in batches]),
+            np.concatenate([batch.businesses for batch in batches]),
+            np.concatenate([batch.amounts for batch in batches]),
+            np.concatenate([batch.companies for batch in batches]),
+            np.concatenate([batch.cards for batch in batches]),
+            raw_rows
+        )
+
+    def set_card(self, card_last_four: Optional[str]):
+        """קביעת מספר כרטיס לכל העסקאות באצווה"""
+        self.cards = np.full(len(self), card_last_four, dtype=object)
+
+    def raw_records(self) -> List[Dict]:
+        """השורות המקוריות כרשימת מילונים - נבנות רק כשצריך"""
+        if self.raw_rows is None:
+            return [{} for _ in range(len(self))]
+        if isinstance(self.raw_rows, pd.DataFrame):
+            return self.raw_rows.to_dict('records')
+        return list(self.raw_rows)
+
+    def serialized_raw_records(self) -> List[Dict]:
+        """השורות המקוריות מוכנות ל-JSON - המרה עמודתית לפי dtype"""
+        if isinstance(self.raw_rows, pd.DataFrame):
+            return serialize_raw_frame(self.raw_rows)
+        return [clean_raw_record(raw_data) for raw_data in self.raw_records()]
+
+    def python_dates(self) -> List[datetime]:
+        return self.dates.astype('datetime64[us]').astype(object).tolist()
+
+    def __len__(self) -> int:
+        return len(self.businesses)
+
+    def __iter__(self) -> Iterator[Transaction]:
+        for transaction_date, business, amount, company, card, raw_data in zip(
+                self.python_dates(), self.businesses, self.amounts.tolist(),
+                self.companies, self.cards, self.raw_records()):
+            yield Transaction(transaction_date, business, amount, company, card, raw_data)
+
+    def __getitem__(self, index: int) -> Transaction:
+        if isinstance(self.raw_rows, pd.DataFrame):
+            raw_data = self.raw_rows.iloc[index].to_dict()
+        else:
+            raw_data = self.raw_rows[index] if self.raw_rows is not None else {}
+
+        return Transaction(
+            self.dates[index].astype('datetime64[us]').astype(object),
+            self.businesses[index],
+            float(self.amounts[index]),
+            self.companies[index],
+            self.cards[index],
+            raw_data
+        )
+
+    def to_list(self) -> List[Dict]:
+        """המרה לרשימת מילונים (הפורמט הישן)"""
+        return [transaction.to_dict() for transaction in self]
+
+
+def _to_datetime_array(dates: Iterable) -> np.ndarray:
+    """מערך datetime64 מרשימת תאריכים"""
+    dates = list(dates)
+    if not dates:
+        return np.array([], dtype='datetime64[us]')
+    return pd.to_datetime(dates).to_numpy(dtype='datetime64[us]')
+
+
+def serialize_raw_frame(frame: pd.DataFrame) -> List[Dict]:
+    """המרת טבלת שורות מקוריות לרשומות JSON - עמודה שלמה בכל פעם"""
+    column_values = []
+
+    for position in range(len(frame.columns)):
+        values = frame.iloc[:, position]
+        missing = values.isna()
+
+        if pd.api.types.is_datetime64_any_dtype(values):
+            converted = values.dt.strftime(RAW_DATETIME_FORMAT).astype(object)
+        elif pd.api.types.is_numeric_dtype(values):
+            # bool/int/float - astype(object) מחזיר טיפוסי Python
+            converted = values.astype(object)
+        else:
+            converted = values.map(clean_raw_value, na_action='ignore').astype(object)
+
+        column_values.append(converted.where(~missing, None).tolist())
+
+    keys = list(frame.columns)
+    return [dict(zip(keys, row)) for row in zip(*column_values)] if keys else [{} for _ in range(len(frame))]
+
+
+def clean_raw_record(raw_data: Dict) -> Dict:
+    """ניקוי רשומה מקורית בודדת מ-objects שלא ניתנים לserialization"""
+    return {key: clean_raw_value(value) for key, value in (raw_data or {}).items()}
+
+
+def clean_raw_value(value):
+    """המרת ערך בודד לטיפוס JSON - ללא ניסיון json.dumps"""
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        return None if value != value else float(value)  # NaN / np.float64
+    if pd.isna(value):
+        return None
+    # המרת datetime לstring
+    if hasattr(value, 'strftime'):
+        return value.strftime(RAW_DATETIME_FORMAT)
+    # המרת numpy scalar לטיפוס Python
+    if isinstance(value, np.generic):
+        return clean_raw_value(value.item())
+    return str(value)
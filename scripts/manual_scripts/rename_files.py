@@ -4,8 +4,13 @@ rename_files_fixed.py
 """
 import os
 import re
+import sys
 from pathlib import Path
 
+# זיהוי החברה משותף עם הפרסר
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from issuer_layouts import detect_company_from_filename
+
 # נתיב התיקייה
 BASE_FOLDER = r"C:\Users\user1\OneDrive - Open University of Israel\שולחן העבודה\Siton\פיננסים\הוצאות\ניהול הוצאות 06_25\כאל_6298"
 
@@ -46,25 +51,6 @@ def extract_card_and_date_from_filename(filename: str) -> tuple:
     
     return card_number, month, year
 
-def detect_company_from_filename(filename: str) -> str:
-    """זיהוי חברת כרטיס אשראי מתוך שם הקובץ"""
-    filename_lower = filename.lower()
-    
-    if 'דיינרס' in filename_lower or 'diners' in filename_lower:
-        return 'דיינרס'
-    elif 'ישראכרט' in filename_lower or 'isracard' in filename_lower:
-        return 'ישראכרט'
-    elif 'כאל' in filename_lower or 'cal' in filename_lower:
-        return 'כאל'
-    elif 'ויזה' in filename_lower or 'visa' in filename_lower:
-        return 'ויזה'
-    elif 'מסטרקארד' in filename_lower or 'mastercard' in filename_lower:
-        return 'מסטרקארד'
-    elif 'אמריקן' in filename_lower or 'american' in filename_lower:
-        return 'אמריקן_אקספרס'
-    else:
-        return 'לא_ידוע'
-
 def rename_files_in_main_folder():
     """שינוי שמות קבצים בתיקייה הראשית"""
     